@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# -------------------------------------------------------------------------
+# [설정] 동화별 자산 매니페스트 ({동화 폴더}/manifest.json)
+# -------------------------------------------------------------------------
+# 형식: {"artifacts": {자산 키: {"path": 동화 폴더 기준 경로, "hash": 입력 전체 해시,
+#                                "inputs": {입력 이름: 입력별 해시}, "updated": 시각}}}
+# 자산 키 예: "line/S01_000"(대사 음성), "image/S01"(장면 그림), "audio/intro"(제목 음성),
+#             "segment/seg_001_scene"(장면 영상 구간), "video/final"(최종 영상)
+ASSET_MANIFEST = "manifest.json"
+
+_lock = threading.Lock()
+
+
+def line_key(scene_num, idx):
+    return f"line/S{scene_num:02d}_{idx:03d}"
+
+
+def image_key(scene_num):
+    return f"image/S{scene_num:02d}"
+
+
+def segment_key(name):
+    return f"segment/{name}"
+
+
+INTRO_AUDIO_KEY = "audio/intro"
+FINAL_VIDEO_KEY = "video/final"
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 입력 해시
+# -------------------------------------------------------------------------
+def _digest(value):
+    raw = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def input_hashes(inputs):
+    """{입력 이름: 값} -> {입력 이름: 값의 해시} (무엇이 바뀌었는지 항목별로 비교할 수 있게)"""
+    return {name: _digest(value)[:16] for name, value in inputs.items()}
+
+
+def asset_hash(inputs):
+    """자산을 만든 입력 전체의 해시 (이 값이 같으면 다시 만들 필요 없음)"""
+    return _digest(input_hashes(inputs))
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 읽기 / 조회
+# -------------------------------------------------------------------------
+def manifest_path(story_dir):
+    return os.path.join(story_dir, ASSET_MANIFEST)
+
+
+def load_asset_manifest(story_dir):
+    """자산 키 -> 항목 (매니페스트가 없으면 빈 딕셔너리)"""
+    path = manifest_path(story_dir)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("artifacts", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_path(manifest, key, story_dir):
+    """매니페스트에 기록된 자산 파일 경로 (기록이 없거나 파일이 지워졌으면 None)"""
+    entry = manifest.get(key)
+    if entry is None:
+        return None
+    path = os.path.join(story_dir, entry["path"])
+    return path if os.path.exists(path) else None
+
+
+def fresh_asset(manifest, key, inputs, story_dir, path=None):
+    """
+    같은 입력으로 만든 자산이 그대로 있으면 그 경로, 아니면 None
+    path를 주면 기록된 경로도 같아야 최신으로 봄 (파일 이름 규칙이 바뀐 경우 대비)
+    """
+    entry = manifest.get(key)
+    if entry is None or entry.get("hash") != asset_hash(inputs):
+        return None
+    if path is not None and os.path.normpath(entry["path"]) != os.path.normpath(os.path.relpath(path, story_dir)):
+        return None
+    return asset_path(manifest, key, story_dir)
+
+
+def changed_inputs(manifest, key, inputs):
+    """기록된 입력과 비교해 바뀐 입력 이름 목록 (처음 만드는 자산이면 ["new"])"""
+    entry = manifest.get(key)
+    if entry is None:
+        return ["new"]
+    recorded = entry.get("inputs", {})
+    return [name for name, h in input_hashes(inputs).items() if recorded.get(name) != h] or ["missing"]
+
+
+# -------------------------------------------------------------------------
+# [함수 3] 기록 (단계마다 자기 자산만 합쳐서 원자적으로 저장)
+# -------------------------------------------------------------------------
+def asset_entry(path, inputs, story_dir):
+    return {
+        "path": os.path.relpath(path, story_dir).replace("\\", "/"),
+        "hash": asset_hash(inputs),
+        "inputs": input_hashes(inputs),
+        "updated": time.time(),
+    }
+
+
+def update_asset_manifest(story_dir, entries, prune_prefix=None, keep=()):
+    """
+    entries(자산 키 -> asset_entry)를 기존 매니페스트에 합쳐서 저장합니다.
+    - 같은 키의 파일 이름이 바뀌었으면 예전 파일을 지움 (예: 대사 화자가 바뀐 음성)
+    - prune_prefix를 주면 그 종류의 자산 중 keep에 없는 것(대본에서 빠진 대사/장면)을 파일과 함께 지움
+    (음성/그림 단계가 같은 동화를 동시에 기록하므로 잠금 안에서 읽고-합치고-씀)
+    """
+    if not entries and prune_prefix is None:
+        return
+    path = manifest_path(story_dir)
+    with _lock:
+        artifacts = load_asset_manifest(story_dir)
+        stale = []
+        for key, entry in entries.items():
+            old = artifacts.get(key)
+            if old is not None and old["path"] != entry["path"]:
+                stale.append(old["path"])
+        if prune_prefix is not None:
+            keep = set(keep) | set(entries)
+            for key in [k for k in artifacts if k.startswith(prune_prefix) and k not in keep]:
+                stale.append(artifacts.pop(key)["path"])
+        artifacts.update(entries)
+
+        os.makedirs(story_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"artifacts": dict(sorted(artifacts.items()))}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    in_use = {entry["path"] for entry in artifacts.values()}
+    for rel_path in stale:
+        if rel_path in in_use:
+            continue
+        try:
+            os.remove(os.path.join(story_dir, rel_path))
+        except OSError:
+            pass
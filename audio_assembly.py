@@ -0,0 +1,391 @@
+import json
+import multiprocessing
+import os
+import struct
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from audio_io import AUDIO_BUFFERS, is_wav, parse_wav
+from asset_manifest import asset_entry, fresh_asset, load_asset_manifest, update_asset_manifest
+import telemetry
+
+# -------------------------------------------------------------------------
+# [설정] 동화 오디오 트랙 조립 (대사 디코딩 1회 -> 무음 정리 -> 화자별 음량 맞춤 -> 트랙 1개)
+# -------------------------------------------------------------------------
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "24000"))  # TTS 원본(24kHz 모노) 그대로 -> 리샘플링 없음
+
+AUDIO_LINE_GAP = float(os.getenv("AUDIO_LINE_GAP", "0.15"))    # 같은 장면 대사 사이 쉬는 시간(초)
+AUDIO_SCENE_GAP = float(os.getenv("AUDIO_SCENE_GAP", "0.5"))   # 장면 끝 여유 시간(초) (기존 SCENE_PADDING 자리)
+AUDIO_INTRO_GAP = float(os.getenv("AUDIO_INTRO_GAP", "2.0"))   # 제목 음성 뒤 여유 시간(초)
+
+TRIM_THRESHOLD_DB = float(os.getenv("AUDIO_TRIM_DB", "-45"))   # 이보다 작은 소리는 앞뒤 무음으로 봄
+TRIM_KEEP = 0.04      # 자른 뒤에도 앞뒤로 남겨 둘 여유(초) (말소리 시작/끝이 잘리지 않게)
+FRAME_SECONDS = 0.01  # 무음/음량 분석 단위 (10ms)
+
+TARGET_LOUDNESS_DB = float(os.getenv("AUDIO_TARGET_DB", "-20"))  # 화자별 목표 음량 (말소리 구간 RMS, dBFS)
+MAX_GAIN_DB = 12.0
+PEAK_CEILING_DB = -1.0
+
+# 이보다 긴 동화는 디코딩 버퍼를 메모리 대신 디스크 매핑(np.memmap)으로 잡음
+MEMMAP_SECONDS = float(os.getenv("AUDIO_MEMMAP_SECONDS", "600"))
+DECODE_WORKERS = int(os.getenv("AUDIO_DECODE_WORKERS", str(multiprocessing.cpu_count())))
+
+STORY_TRACK = "story_track.wav"
+STORY_TRACK_LAYOUT = "story_track.json"
+STORY_TRACK_KEY = "audio/story_track"
+
+
+def _db_to_gain(db):
+    return 10.0 ** (db / 20.0)
+
+
+def _gain_to_db(gain):
+    return 20.0 * np.log10(max(gain, 1e-12))
+
+
+def assembly_settings():
+    return {
+        "sample_rate": AUDIO_SAMPLE_RATE, "line_gap": AUDIO_LINE_GAP, "scene_gap": AUDIO_SCENE_GAP,
+        "intro_gap": AUDIO_INTRO_GAP, "trim_db": TRIM_THRESHOLD_DB, "target_db": TARGET_LOUDNESS_DB,
+        "max_gain_db": MAX_GAIN_DB, "ceiling_db": PEAK_CEILING_DB,
+    }
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 디코딩 (대사마다 1회, 공용 PCM 버퍼의 자기 칸에 바로 씀)
+# -------------------------------------------------------------------------
+def _warn_overflow(samples, name):
+    print(f"    ⚠️ 디코딩 칸 부족으로 {samples}샘플을 버렸습니다: {name}")
+
+
+def _read_pcm(data, out, sample_rate, name="<memory>"):
+    """같은 샘플레이트의 16비트 모노 WAV면 디코딩 없이 복사. 반환: 채운 샘플 수 (형식이 다르면 None)"""
+    info = parse_wav(data)
+    if (info["sample_rate"], info["channels"], info["bits"]) != (sample_rate, 1, 16):
+        return None
+    pcm = np.frombuffer(data, dtype="<i2", count=info["size"] // 2, offset=info["offset"])
+    n = min(len(pcm), len(out))
+    out[:n] = pcm[:n]
+    if len(pcm) > n:
+        _warn_overflow(len(pcm) - n, name)
+    return n
+
+
+def decode_into(source, out, sample_rate=AUDIO_SAMPLE_RATE):
+    """
+    source(파일 경로 또는 오디오 바이트)를 16비트 모노 PCM으로 out(int16 배열 조각)에 채웁니다. 반환: 채운 샘플 수
+    - WAV(TTS 출력 형식 wav)는 헤더만 읽고 바로 복사 / MP3·Opus는 FFmpeg로 디코딩 (바이트는 stdin으로 넘김)
+    - 칸보다 길면 나머지는 버림 (칸은 타이밍 매니페스트 길이 + 여유로 잡음)
+    """
+    in_memory = not isinstance(source, str)
+    name = "<memory>" if in_memory else os.path.basename(source)
+    if in_memory and is_wav(source):
+        data = source
+    elif not in_memory and source.lower().endswith(".wav"):
+        with open(source, "rb") as f:
+            data = f.read()
+    else:
+        data = None
+    if data is not None:
+        filled = _read_pcm(data, out, sample_rate, name)
+        if filled is not None:
+            return filled
+
+    cmd = [FFMPEG_BIN, "-v", "error", "-i", "pipe:0" if in_memory else source,
+           "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-"]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if in_memory else subprocess.DEVNULL, stdout=subprocess.PIPE)
+    if in_memory:
+        # stdout을 읽는 동안 막히지 않도록 입력은 다른 스레드에서 씀
+        def feed():
+            try:
+                proc.stdin.write(source)
+            except OSError:
+                pass
+            finally:
+                proc.stdin.close()
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+    view = memoryview(out).cast("B")
+    filled = 0
+    while filled < len(view):
+        n = proc.stdout.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    overflow = len(proc.stdout.read())
+    if in_memory:
+        writer.join()
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    if overflow:
+        _warn_overflow(overflow // 2, name)
+    return filled // 2
+
+
+def line_source(line):
+    """대사 오디오: 같은 프로세스의 TTS 단계가 남긴 메모리 버퍼가 있으면 그것, 없으면 파일 경로"""
+    return AUDIO_BUFFERS.get(line.get("dep")) or line["audio"]
+
+
+def _decode_buffer(n_samples, work_dir):
+    """공용 디코딩 버퍼 (긴 동화는 디스크 매핑). 반환: (버퍼, 임시 파일 경로 또는 None)"""
+    if n_samples <= MEMMAP_SECONDS * AUDIO_SAMPLE_RATE:
+        return np.zeros(n_samples, dtype=np.int16), None
+    path = os.path.join(work_dir, "decode_buffer.pcm")
+    return np.memmap(path, dtype=np.int16, mode="w+", shape=(n_samples,)), path
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 분석 (앞뒤 무음 / 말소리 구간 에너지 / 최대 진폭) - 10ms 프레임 단위 벡터 연산
+# -------------------------------------------------------------------------
+def analyze_pcm(pcm, sample_rate=AUDIO_SAMPLE_RATE, threshold_db=TRIM_THRESHOLD_DB):
+    """
+    반환: {"lead", "tail"(샘플 수, 자를 앞/뒤 길이), "energy"(말소리 프레임 제곱합), "active"(말소리 샘플 수), "peak"}
+    말소리가 전혀 없으면 자르지 않음
+    """
+    frame = max(1, int(sample_rate * FRAME_SECONDS))
+    n_frames = len(pcm) // frame
+    if n_frames == 0:
+        return {"lead": 0, "tail": 0, "energy": 0.0, "active": 0, "peak": 0.0}
+
+    frames = pcm[:n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+    frames /= 32768.0
+    peaks = np.abs(frames).max(axis=1)
+    active = peaks > _db_to_gain(threshold_db)
+    if not active.any():
+        return {"lead": 0, "tail": 0, "energy": 0.0, "active": 0, "peak": float(peaks.max())}
+
+    keep = int(TRIM_KEEP * sample_rate)
+    first = int(np.argmax(active))
+    last = n_frames - int(np.argmax(active[::-1]))  # 마지막 말소리 프레임 다음
+    lead = max(0, first * frame - keep)
+    tail = max(0, len(pcm) - min(len(pcm), last * frame + keep))
+    voiced = frames[active]
+    return {
+        "lead": lead,
+        "tail": tail,
+        "energy": float(np.einsum("ij,ij->", voiced, voiced)),
+        "active": int(voiced.size),
+        "peak": float(peaks.max()),
+    }
+
+
+def voice_gains(stats):
+    """
+    stats: [(보이스, analyze_pcm 결과), ...] -> {보이스: 배율}
+    보이스마다 말소리 구간 전체의 RMS를 목표 음량에 맞추되, 최대 배율과 피크 상한을 넘지 않게 함
+    """
+    totals = {}
+    for voice, s in stats:
+        energy, active, peak = totals.get(voice, (0.0, 0, 0.0))
+        totals[voice] = (energy + s["energy"], active + s["active"], max(peak, s["peak"]))
+
+    gains = {}
+    for voice, (energy, active, peak) in totals.items():
+        if not active:
+            gains[voice] = 1.0
+            continue
+        rms = np.sqrt(energy / active)
+        gain = _db_to_gain(TARGET_LOUDNESS_DB) / max(rms, 1e-9)
+        gain = min(gain, _db_to_gain(MAX_GAIN_DB), _db_to_gain(PEAK_CEILING_DB) / max(peak, 1e-9))
+        gains[voice] = max(gain, _db_to_gain(-MAX_GAIN_DB))
+    return gains
+
+
+# -------------------------------------------------------------------------
+# [함수 3] WAV 트랙 (헤더를 쓰고 데이터 영역을 np.memmap으로 열어 바로 채움)
+# -------------------------------------------------------------------------
+def _open_wav(path, n_samples, sample_rate=AUDIO_SAMPLE_RATE):
+    data_bytes = n_samples * 2
+    header = b"RIFF" + struct.pack("<I", 36 + data_bytes) + b"WAVE"
+    header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    header += b"data" + struct.pack("<I", data_bytes)
+    with open(path, "wb") as f:
+        f.write(header)
+        f.truncate(len(header) + data_bytes)  # 나머지는 0(무음)으로 채워짐
+    return np.memmap(path, dtype="<i2", mode="r+", offset=len(header), shape=(n_samples,))
+
+
+# -------------------------------------------------------------------------
+# [메인 로직] 타임라인의 대사 음성 -> 동화 트랙 1개 + 구간/대사 위치
+# -------------------------------------------------------------------------
+def _segments(timeline):
+    segments = []
+    if timeline["intro"]:
+        intro = timeline["intro"]
+        segments.append({"kind": "intro", "scene_num": None,
+                         "lines": [{"audio": intro["audio"], "voice": intro.get("voice"), "duration": intro["audio_duration"]}],
+                         "gap": 0.0, "tail": AUDIO_INTRO_GAP})
+    for scene in timeline["scenes"]:
+        segments.append({"kind": "scene", "scene_num": scene["scene_num"], "lines": scene["lines"],
+                         "gap": AUDIO_LINE_GAP, "tail": AUDIO_SCENE_GAP})
+    return segments
+
+
+@telemetry.traced("audio.assemble", attrs=lambda timeline, *a, **k: {"story": timeline["title"]})
+def assemble_story_audio(timeline, decode=decode_into):
+    """
+    1. 대사마다 한 번씩 공용 PCM 버퍼로 디코딩 (동시에 여러 개, 칸은 매니페스트 길이로 미리 나눔)
+       TTS 단계의 메모리 버퍼가 있으면 파일 대신 그 바이트를 씀 (decode는 경로/바이트 둘 다 받음)
+    2. 앞뒤 무음 길이와 말소리 음량을 10ms 프레임 단위로 분석
+    3. 보이스별 배율을 정해서 (무음을 자른) 대사를 간격을 두고 트랙에 바로 씀
+    반환: 레이아웃 {"track", "sample_rate", "duration", "gains", "segments": [{"kind", "scene_num", "start",
+          "duration", "lines": [{"start", "duration", "trim"}]}]} (start는 트랙 기준, 대사 start는 구간 기준)
+    """
+    sr = AUDIO_SAMPLE_RATE
+    story_dir = timeline["paths"]["story_dir"]
+    audio_dir = timeline["paths"]["audio_dir"]
+    work_dir = os.path.join(story_dir, ".render")
+    os.makedirs(work_dir, exist_ok=True)
+    segments = _segments(timeline)
+    lines = [line for seg in segments for line in seg["lines"]]
+
+    # 1. 디코딩 칸 나누기 (매니페스트 길이 + 5% + 0.25초)
+    slots = []
+    offset = 0
+    for line in lines:
+        size = int(line["duration"] * sr * 1.05) + sr // 4
+        slots.append((offset, size))
+        offset += size
+    buffer, buffer_path = _decode_buffer(offset, work_dir)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, DECODE_WORKERS)) as executor:
+            lengths = list(executor.map(
+                lambda job: decode(line_source(job[0]), buffer[job[1][0]:job[1][0] + job[1][1]], sr),
+                zip(lines, slots)))
+
+        # 2. 분석
+        stats = [analyze_pcm(buffer[start:start + n], sr) for (start, _), n in zip(slots, lengths)]
+        gains = voice_gains([(line.get("voice"), s) for line, s in zip(lines, stats)])
+
+        # 3. 트랙 길이 계산 -> WAV 열기 -> 대사 복사(배율 적용)
+        kept = [n - s["lead"] - s["tail"] for n, s in zip(lengths, stats)]
+        layout_segments = []
+        pos = 0
+        i = 0
+        for seg in segments:
+            seg_lines = []
+            t = 0
+            for j, _ in enumerate(seg["lines"]):
+                if j:
+                    t += int(seg["gap"] * sr)
+                seg_lines.append({"index": i, "start": t, "samples": kept[i]})
+                t += kept[i]
+                i += 1
+            t += int(seg["tail"] * sr)
+            layout_segments.append({"seg": seg, "start": pos, "samples": t, "lines": seg_lines})
+            pos += t
+
+        track_path = os.path.join(audio_dir, STORY_TRACK)
+        track = _open_wav(f"{track_path}.tmp", pos, sr)
+        ceiling = 32767.0
+        for ls in layout_segments:
+            for line in ls["lines"]:
+                k = line["index"]
+                start, _ = slots[k]
+                src = buffer[start + stats[k]["lead"]:start + stats[k]["lead"] + kept[k]].astype(np.float32)
+                src *= gains.get(lines[k].get("voice"), 1.0)
+                np.clip(src, -ceiling, ceiling, out=src)
+                dst = ls["start"] + line["start"]
+                track[dst:dst + kept[k]] = np.rint(src)
+        track.flush()
+        del track
+        os.replace(f"{track_path}.tmp", track_path)
+    finally:
+        del buffer
+        if buffer_path:
+            os.remove(buffer_path)
+
+    layout = {
+        "track": os.path.relpath(track_path, story_dir).replace("\\", "/"),
+        "sample_rate": sr,
+        "duration": pos / sr,
+        "settings": assembly_settings(),
+        "gains": {str(voice): round(float(_gain_to_db(g)), 2) for voice, g in gains.items()},
+        "segments": [{
+            "kind": ls["seg"]["kind"],
+            "scene_num": ls["seg"]["scene_num"],
+            "start": ls["start"] / sr,
+            "duration": ls["samples"] / sr,
+            "lines": [{"start": l["start"] / sr, "duration": l["samples"] / sr,
+                       "trim": stats[l["index"]]["lead"] / sr} for l in ls["lines"]],
+        } for ls in layout_segments],
+    }
+    telemetry.count("bytes_written_total", pos * 2, stage="audio")
+    return layout
+
+
+def apply_layout(timeline, layout):
+    """
+    레이아웃대로 타임라인을 고칩니다. (대사 위치/길이, 자막 시각, 구간 길이, 트랙 위치)
+    자막은 원래 대사 안에서의 위치를 유지하되 앞 무음을 자른 만큼 당기고 대사 길이 안으로 자름
+    """
+    timeline["audio_track"] = os.path.join(timeline["paths"]["story_dir"], layout["track"])
+    timeline["audio_settings"] = layout["settings"]
+    gains = layout["gains"]
+    segs = iter(layout["segments"])
+    if timeline["intro"]:
+        seg = next(segs)
+        intro = timeline["intro"]
+        intro["duration"] = seg["duration"]
+        intro["audio_start"] = seg["start"]
+        intro["gains"] = {str(intro.get("voice")): gains.get(str(intro.get("voice")))}
+
+    for scene, seg in zip(timeline["scenes"], segs):
+        old_lines = scene["lines"]
+        new_lines = seg["lines"]
+        subtitles = []
+        for sub in scene["subtitles"]:
+            k = sub.get("line")
+            if k is None or k >= len(new_lines):
+                continue
+            old, new = old_lines[k], new_lines[k]
+            start = sub["start"] - old["start"] - new["trim"]
+            end = start + sub["duration"]
+            start, end = max(start, 0.0), min(end, new["duration"])
+            if end <= start:
+                continue
+            subtitles.append({**sub, "start": new["start"] + start, "duration": end - start})
+        for line, new in zip(old_lines, new_lines):
+            line["start"], line["duration"] = new["start"], new["duration"]
+        scene["subtitles"] = subtitles
+        scene["duration"] = seg["duration"]
+        scene["audio_start"] = seg["start"]
+        # 구간 렌더링 입력용: 이 장면에 나오는 보이스의 보정값만 (다른 장면 대사가 바뀌어도 영향 없게)
+        scene["gains"] = {v: gains.get(v) for v in sorted({str(line.get("voice")) for line in old_lines})}
+    return timeline
+
+
+def story_audio(timeline, decode=decode_into):
+    """
+    자산 매니페스트로 확인해서 대사 음성/설정이 그대로면 저장된 레이아웃을, 아니면 새로 조립한 레이아웃을 적용
+    """
+    story_dir = timeline["paths"]["story_dir"]
+    layout_path = os.path.join(timeline["paths"]["audio_dir"], STORY_TRACK_LAYOUT)
+    track_path = os.path.join(timeline["paths"]["audio_dir"], STORY_TRACK)
+    inputs = {
+        "intro": timeline["intro"].get("dep") if timeline["intro"] else None,
+        "lines": [[scene["scene_num"]] + [line.get("dep") for line in scene["lines"]] for scene in timeline["scenes"]],
+        "settings": assembly_settings(),
+    }
+
+    layout = None
+    if fresh_asset(load_asset_manifest(story_dir), STORY_TRACK_KEY, inputs, story_dir, track_path):
+        try:
+            with open(layout_path, "r", encoding="utf-8") as f:
+                layout = json.load(f)
+        except (OSError, ValueError):
+            layout = None
+    if layout is None:
+        layout = assemble_story_audio(timeline, decode=decode)
+        tmp_path = f"{layout_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(layout, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, layout_path)
+        update_asset_manifest(story_dir, {STORY_TRACK_KEY: asset_entry(track_path, inputs, story_dir)})
+        db = list(layout["gains"].values())
+        print(f"  🔊 오디오 트랙 조립: {layout['duration']:.1f}초, 보이스 {len(db)}개 음량 보정 {min(db):+.1f}~{max(db):+.1f}dB")
+    return apply_layout(timeline, layout)
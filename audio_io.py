@@ -0,0 +1,161 @@
+import os
+import struct
+import threading
+from collections import OrderedDict
+from mp3_split import mp3_duration, split_mp3
+
+# -------------------------------------------------------------------------
+# [설정] TTS 출력 형식별 처리 (파일 확장자 기준) + 메모리 오디오 버퍼
+# -------------------------------------------------------------------------
+# .mp3: 프레임 경계에서 자름 / .wav: 샘플 경계에서 자름(무손실, 영상 단계에서 디코딩 없이 바로 읽음)
+# .ogg(Opus): 페이지 구조라 자르지 않음 -> 대사마다 따로 합성
+SPLITTABLE_EXTENSIONS = (".mp3", ".wav")
+
+# 같은 프로세스 안에서 TTS 단계가 방금 만든 대사 오디오를 영상 단계가 파일 대신 바로 쓰도록 보관
+AUDIO_BUFFER_MB = int(os.getenv("AUDIO_BUFFER_MB", "256"))
+
+
+# -------------------------------------------------------------------------
+# [함수 1] WAV (RIFF PCM)
+# -------------------------------------------------------------------------
+def is_wav(data):
+    return len(data) >= 12 and bytes(data[:4]) == b"RIFF" and bytes(data[8:12]) == b"WAVE"
+
+
+def parse_wav(data):
+    """
+    반환: {"sample_rate", "channels", "bits", "offset", "size"} (offset/size는 PCM 데이터 위치)
+    스트리밍 헤더처럼 data 청크 크기가 0이거나 실제보다 크면 남은 바이트 전체를 데이터로 봄
+    """
+    if not is_wav(data):
+        raise ValueError("WAV(RIFF) 형식이 아닙니다.")
+    pos = 12
+    info = {}
+    while pos + 8 <= len(data):
+        tag, size = bytes(data[pos:pos + 4]), struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        body = pos + 8
+        if tag == b"fmt ":
+            _, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", data[body:body + 16])
+            info.update(sample_rate=sample_rate, channels=channels, bits=bits)
+        elif tag == b"data":
+            if size == 0 or body + size > len(data):
+                size = len(data) - body
+            info.update(offset=body, size=size)
+            break
+        pos = body + size + (size & 1)
+    if "sample_rate" not in info or "offset" not in info:
+        raise ValueError("WAV 헤더에 fmt/data 청크가 없습니다.")
+    return info
+
+
+def wav_bytes(pcm, sample_rate, channels=1, bits=16):
+    """PCM 바이트 -> 44바이트 헤더를 붙인 WAV 바이트"""
+    block = channels * bits // 8
+    header = b"RIFF" + struct.pack("<I", 36 + len(pcm)) + b"WAVE"
+    header += b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block, block, bits)
+    header += b"data" + struct.pack("<I", len(pcm))
+    return header + bytes(pcm)
+
+
+def wav_duration(data):
+    info = parse_wav(data)
+    return info["size"] / (info["sample_rate"] * info["channels"] * info["bits"] // 8)
+
+
+def split_wav(data, boundaries):
+    """boundaries(초, 오름차순)에서 샘플 단위로 잘라 len(boundaries) + 1개의 WAV를 반환"""
+    info = parse_wav(data)
+    block = info["channels"] * info["bits"] // 8
+    start, end = info["offset"], info["offset"] + info["size"]
+    cuts = [start + min(int(t * info["sample_rate"]) * block, info["size"] // block * block)
+            for t in boundaries]
+    edges = [start] + [max(c, start) for c in cuts] + [end]
+    pieces = []
+    for a, b in zip(edges, edges[1:]):
+        pcm = data[a:max(a, b)]
+        pieces.append(wav_bytes(pcm, info["sample_rate"], info["channels"], info["bits"]) if pcm else b"")
+    return pieces
+
+
+# -------------------------------------------------------------------------
+# [함수 2] Ogg Opus (길이만 계산: 마지막 페이지의 granule position - pre-skip, 단위는 항상 48kHz)
+# -------------------------------------------------------------------------
+def ogg_opus_duration(data):
+    last = bytes(data).rfind(b"OggS")
+    head = bytes(data).find(b"OpusHead")
+    if last < 0 or head < 0:
+        raise ValueError("Ogg Opus 형식이 아닙니다.")
+    granule = struct.unpack("<q", data[last + 6:last + 14])[0]
+    pre_skip = struct.unpack("<H", data[head + 10:head + 12])[0]
+    return max(0, granule - pre_skip) / 48000
+
+
+# -------------------------------------------------------------------------
+# [함수 3] 형식 공용 (확장자로 구분)
+# -------------------------------------------------------------------------
+def audio_duration(data, extension=".mp3"):
+    """헤더만 읽어 재생 시간(초)을 계산합니다. (디코딩 없음)"""
+    if extension == ".wav":
+        return wav_duration(data)
+    if extension == ".ogg":
+        return ogg_opus_duration(data)
+    return mp3_duration(data)
+
+
+def can_split(extension):
+    return extension in SPLITTABLE_EXTENSIONS
+
+
+def split_audio(data, boundaries, extension=".mp3"):
+    """여러 대사를 한 번에 합성한 오디오를 대사별로 자름 (각 조각은 그대로 재생 가능한 파일)"""
+    if extension == ".wav":
+        return split_wav(data, boundaries)
+    if extension == ".mp3":
+        return split_mp3(data, boundaries)
+    raise ValueError(f"{extension} 오디오는 대사별로 자를 수 없습니다.")
+
+
+# -------------------------------------------------------------------------
+# [클래스] 메모리 오디오 버퍼 (프로세스 공용, 오래 안 쓴 것부터 비움)
+# -------------------------------------------------------------------------
+class AudioBufferPool:
+    """
+    자산 해시 -> 오디오 바이트. TTS 단계가 넣고 오디오 조립 단계가 꺼내 씀
+    (main.py처럼 한 프로세스에서 음성 -> 영상이 이어질 때 파일을 다시 읽고 디코딩하지 않게)
+    """
+
+    def __init__(self, max_bytes=AUDIO_BUFFER_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, key, data):
+        if key is None or not data or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+AUDIO_BUFFERS = AudioBufferPool()
@@ -0,0 +1,341 @@
+import argparse
+import json
+import os
+import time
+from story_store import CRAWLED_STORE, PROCESSED_STORE, crawled_store, processed_store, select_seqs, story_text
+import telemetry
+
+# -------------------------------------------------------------------------
+# [설정] 배치 API 각색 (요청 파일 -> 제출/대기 -> 결과 반영)
+# -------------------------------------------------------------------------
+# 배치 API는 동기 호출보다 싸고 처리량이 크지만 결과가 최대 24시간 뒤에 나옴 -> 전체 목록을 한꺼번에 각색할 때 사용
+BATCH_DIR = os.getenv("BATCH_DIR", ".batch")
+BATCH_REQUESTS_FILE = os.path.join(BATCH_DIR, "batch_requests.jsonl")
+BATCH_RESULTS_FILE = os.path.join(BATCH_DIR, "batch_results.jsonl")
+BATCH_ERRORS_FILE = os.path.join(BATCH_DIR, "batch_errors.jsonl")
+BATCH_STATE_FILE = os.path.join(BATCH_DIR, "batch_state.json")  # 제출한 배치 ID (중단 후 이어서 기다리기용)
+
+# Azure는 배치 전용(Global Batch) 배포를 따로 만듦 (없으면 동기 호출과 같은 배포)
+BATCH_DEPLOYMENT_NAME = os.getenv("AZURE_BATCH_DEPLOYMENT_NAME") or os.getenv("AZURE_DEPLOYMENT_NAME")
+BATCH_ENDPOINT = "/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))  # 파일 하나에 넣을 최대 요청 수 (나머지는 다음 배치)
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+BATCH_TERMINAL = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchItemError(Exception):
+    """배치 결과 한 줄을 각색 결과로 쓸 수 없을 때 (HTTP 오류, 잘린 응답, JSON 형식 오류 등)"""
+
+
+# -------------------------------------------------------------------------
+# [클래스] 배치 API 클라이언트 (Azure OpenAI) - 로컬 대체품은 fake_services.LocalBatchClient
+# -------------------------------------------------------------------------
+class AzureBatchClient:
+    """
+    submit(요청 파일) -> 배치 ID, status(배치 ID) -> 상태 딕셔너리, download(파일 ID, 경로)
+    상태: {"status", "total", "completed", "failed", "output_file_id", "error_file_id"}
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            from story_processor import client
+        self.client = client
+
+    def submit(self, input_path):
+        with open(input_path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window=BATCH_COMPLETION_WINDOW)
+        return batch.id
+
+    def status(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": batch.status,
+            "total": counts.total if counts else None,
+            "completed": counts.completed if counts else None,
+            "failed": counts.failed if counts else None,
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id,
+        }
+
+    def download(self, file_id, path):
+        content = self.client.files.content(file_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content.content)
+        os.replace(tmp_path, path)
+        return path
+
+
+def get_batch_client(name="azure", scenarios=None, failure_ratio=0.0):
+    """name: "azure"(실제 배치 API) 또는 "local"(scenarios로 응답하는 로컬 대체품, 테스트용)"""
+    if name == "local":
+        from fake_services import LocalBatchClient
+        from story_stream import iter_stories
+        return LocalBatchClient(list(iter_stories(scenarios or "processed_stories.json")), failure_ratio=failure_ratio)
+    return AzureBatchClient()
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 각색할 동화를 배치 요청 파일(JSONL)로 내보내기
+# -------------------------------------------------------------------------
+def export_batch_requests(input_store=CRAWLED_STORE, output_store=PROCESSED_STORE, path=BATCH_REQUESTS_FILE,
+                          ids=None, titles=None, since=None, limit=None, max_requests=BATCH_MAX_REQUESTS):
+    """
+    아직 각색되지 않았거나 원문이 바뀐 동화를 한 줄에 요청 하나씩 씁니다. (custom_id = original_seq)
+    LLM 캐시에 응답이 있는 동화는 요청 없이 바로 각색 저장소에 기록합니다.
+    반환: {seq: 원문 해시} (결과를 반영할 때 그 사이 원문이 바뀐 동화를 걸러내는 데 사용)
+    """
+    from story_processor import LLM_CACHE, build_chat_request, is_adapted, llm_cache_key, save_adapted
+
+    source = crawled_store(input_store)
+    target = processed_store(output_store)
+    selected = select_seqs(source, ids=ids, titles=titles, since=since, limit=limit, changed_in=[target])
+    pending = [seq for seq in selected if not is_adapted(source, target, seq)]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    exported = {}
+    cached = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for seq in pending:
+            story = source.get(seq)
+            full_text = story_text(story)
+            hit = LLM_CACHE.get_json(llm_cache_key(full_text, BATCH_DEPLOYMENT_NAME))
+            if hit is not None:
+                save_adapted(source, target, seq, hit)
+                cached += 1
+                continue
+            if len(exported) >= max_requests:
+                continue
+            request = {
+                "custom_id": str(seq),
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": build_chat_request(full_text, BATCH_DEPLOYMENT_NAME),
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            exported[str(seq)] = source.entry(seq).get('source_hash')
+    os.replace(tmp_path, path)
+
+    left = len(pending) - cached - len(exported)
+    print(f"📤 배치 요청 {len(exported)}건 -> {path} (캐시 사용 {cached}편"
+          + (f", 다음 배치로 미룬 {left}편)" if left else ")"))
+    return exported
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 제출 / 완료까지 기다리기
+# -------------------------------------------------------------------------
+def _save_state(state, path=BATCH_STATE_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load_state(path=BATCH_STATE_FILE):
+    """제출했지만 아직 결과를 반영하지 않은 배치 (없으면 None)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def clear_state(path=BATCH_STATE_FILE):
+    """결과를 반영한 배치 기록을 지움 (다음 run이 같은 배치를 다시 반영하지 않도록)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def submit_batch(client, requests_path, sources, state_path=BATCH_STATE_FILE):
+    with telemetry.span("batch.submit", requests=len(sources)):
+        batch_id = client.submit(requests_path)
+    state = {"batch_id": batch_id, "requests": requests_path, "sources": sources, "submitted_at": time.time()}
+    _save_state(state, state_path)
+    print(f"🚚 배치 제출: {batch_id} ({len(sources)}건)")
+    return state
+
+
+def wait_for_batch(client, batch_id, poll_seconds=BATCH_POLL_SECONDS):
+    """배치가 끝날 때까지 상태를 확인합니다. 반환: 마지막 상태"""
+    started = time.time()
+    last = None
+    while True:
+        status = client.status(batch_id)
+        progress = (status["status"], status.get("completed"), status.get("failed"))
+        if progress != last:
+            print(f"  ⏳ {batch_id}: {status['status']} "
+                  f"(완료 {status.get('completed') or 0} / 실패 {status.get('failed') or 0} / 전체 {status.get('total') or '?'})")
+            last = progress
+        if status["status"] in BATCH_TERMINAL:
+            telemetry.observe("batch_wait_seconds", time.time() - started, status=status["status"])
+            return status
+        time.sleep(poll_seconds)
+
+
+# -------------------------------------------------------------------------
+# [함수 3] 결과 반영 (한 줄씩 검사해서 성공한 동화만 각색 저장소에 기록)
+# -------------------------------------------------------------------------
+def parse_batch_item(item):
+    """배치 결과 한 줄 -> 각색 결과 딕셔너리 (쓸 수 없으면 BatchItemError)"""
+    if item.get("error"):
+        error = item["error"]
+        raise BatchItemError(f"{error.get('code')}: {error.get('message')}")
+    response = item.get("response") or {}
+    body = response.get("body") or {}
+    if response.get("status_code") != 200:
+        message = (body.get("error") or {}).get("message", "")
+        raise BatchItemError(f"HTTP {response.get('status_code')}: {message}")
+    try:
+        choice = body["choices"][0]
+        content = choice["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        raise BatchItemError("응답에 choices가 없습니다.")
+    if choice.get("finish_reason") == "length":
+        raise BatchItemError("응답이 최대 토큰에서 잘렸습니다.")
+    try:
+        analyzed = json.loads(content)
+    except (TypeError, ValueError) as e:
+        raise BatchItemError(f"JSON 형식 오류: {e}")
+    if not isinstance(analyzed, dict) or not isinstance(analyzed.get("scenes"), list) or not analyzed.get("title"):
+        raise BatchItemError("title/scenes가 없는 응답입니다.")
+    return analyzed
+
+
+def ingest_batch_results(results_paths, input_store=CRAWLED_STORE, output_store=PROCESSED_STORE,
+                         sources=None, on_story=None):
+    """
+    결과(및 오류) JSONL을 읽어 각색 저장소에 반영합니다.
+    - 실패한 항목은 건너뛰고 이유를 모아서 돌려줌 (각색 저장소에 없으므로 다음 export에 다시 포함됨)
+    - sources({seq: 원문 해시})를 주면 요청 후 원문이 바뀐 동화의 결과는 버림
+    - 성공한 응답은 LLM 캐시에도 넣어서 동기 경로에서도 재사용
+    반환: {"ingested": [seq, ...], "failed": {seq: 이유}}
+    """
+    from story_processor import LLM_CACHE, llm_cache_key, save_adapted
+
+    source = crawled_store(input_store)
+    target = processed_store(output_store)
+    ingested, failed = [], {}
+
+    for path in ([results_paths] if isinstance(results_paths, str) else results_paths):
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                seq = f"{os.path.basename(path)}:{line_no}"
+                try:
+                    item = json.loads(line)
+                    seq = str(item.get("custom_id"))
+                    entry = source.entry(seq)
+                    if entry is None:
+                        raise BatchItemError("크롤링 저장소에 없는 seq입니다.")
+                    if sources is not None and sources.get(seq) not in (None, entry.get('source_hash')):
+                        raise BatchItemError("요청 후 원문이 바뀌었습니다.")
+                    analyzed = parse_batch_item(item)
+                except (BatchItemError, ValueError) as e:
+                    failed[seq] = str(e)
+                    telemetry.count("batch_items_total", status="failed")
+                    continue
+
+                LLM_CACHE.put_json(llm_cache_key(story_text(source.get(seq)), BATCH_DEPLOYMENT_NAME), analyzed)
+                save_adapted(source, target, seq, analyzed)
+                ingested.append(seq)
+                telemetry.count("batch_items_total", status="ok")
+                if on_story:
+                    on_story(analyzed)
+
+    print(f"📥 배치 결과 반영: 성공 {len(ingested)}편 / 실패 {len(failed)}편 -> {target.root}")
+    for seq, reason in list(failed.items())[:20]:
+        print(f"  ❌ {seq}: {reason}")
+    if len(failed) > 20:
+        print(f"  ... 외 {len(failed) - 20}건")
+    return {"ingested": ingested, "failed": failed}
+
+
+# -------------------------------------------------------------------------
+# [메인 로직] 내보내기 -> 제출 -> 대기 -> 결과 반영 (중단되면 저장된 배치 ID로 이어서 기다림)
+# -------------------------------------------------------------------------
+def run_batch(client, input_store=CRAWLED_STORE, output_store=PROCESSED_STORE, poll_seconds=BATCH_POLL_SECONDS,
+              on_story=None, **selection):
+    state = load_state()
+    if state is not None and not getattr(client, "resumable", True):
+        # 로컬 대체품의 배치는 프로세스가 끝나면 사라지므로 처음부터 다시 제출
+        print(f"⚠️ 이어서 기다릴 수 없는 배치({state['batch_id']})라 다시 제출합니다.")
+        state = None
+    if state is None:
+        sources = export_batch_requests(input_store, output_store, **selection)
+        if not sources:
+            print("✅ 배치로 보낼 동화가 없습니다.")
+            return None
+        state = submit_batch(client, BATCH_REQUESTS_FILE, sources)
+    else:
+        print(f"🔁 이전에 제출한 배치를 이어서 기다립니다: {state['batch_id']}")
+
+    status = wait_for_batch(client, state["batch_id"], poll_seconds)
+    downloaded = []
+    for key, path in (("output_file_id", BATCH_RESULTS_FILE), ("error_file_id", BATCH_ERRORS_FILE)):
+        if status.get(key):
+            downloaded.append(client.download(status[key], path))
+    if status["status"] != "completed":
+        print(f"⚠️ 배치가 '{status['status']}' 상태로 끝났습니다. 받은 결과만 반영합니다.")
+
+    result = ingest_batch_results(downloaded, input_store, output_store, sources=state["sources"], on_story=on_story)
+    clear_state()
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="배치 API로 동화를 한꺼번에 각색합니다.")
+    parser.add_argument("command", choices=["export", "run", "status", "ingest"],
+                        help="export: 요청 파일만 작성, run: 제출부터 반영까지, status: 제출한 배치 상태, "
+                             "ingest: 결과 파일 반영")
+    parser.add_argument("results", nargs="*", help="ingest할 결과 JSONL (기본: 받아 둔 결과/오류 파일)")
+    parser.add_argument("--client", choices=["azure", "local"], default="azure")
+    parser.add_argument("--scenarios", help="local 클라이언트가 돌려줄 시나리오 (JSON 파일 또는 각색 저장소)")
+    parser.add_argument("--failure-ratio", type=float, default=0.0, help="local 클라이언트의 실패 비율")
+    parser.add_argument("--input-store", default=CRAWLED_STORE)
+    parser.add_argument("--output-store", default=PROCESSED_STORE)
+    parser.add_argument("--ids", help="처리할 seq (예: 12,40-45)")
+    parser.add_argument("--title", dest="titles", action="append")
+    parser.add_argument("--since")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--poll", type=float, default=BATCH_POLL_SECONDS, help="상태 확인 간격(초)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    selection = {"ids": args.ids, "titles": args.titles, "since": args.since, "limit": args.limit}
+    if args.command == "export":
+        export_batch_requests(args.input_store, args.output_store, **selection)
+    elif args.command == "ingest":
+        state = load_state()
+        ingest_batch_results(args.results or [BATCH_RESULTS_FILE, BATCH_ERRORS_FILE], args.input_store,
+                             args.output_store, sources=state["sources"] if state else None)
+        if state is not None:
+            clear_state()
+            print(f"🧹 반영을 마친 배치 기록을 지웠습니다: {state['batch_id']}")
+    elif args.command == "status":
+        state = load_state()
+        if state is None:
+            print("제출한 배치가 없습니다.")
+        else:
+            client = get_batch_client(args.client, args.scenarios, args.failure_ratio)
+            print(json.dumps(client.status(state["batch_id"]), ensure_ascii=False, indent=1))
+    else:
+        client = get_batch_client(args.client, args.scenarios, args.failure_ratio)
+        run_batch(client, args.input_store, args.output_store, poll_seconds=args.poll, **selection)
+
+
+if __name__ == "__main__":
+    main()
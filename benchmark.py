@@ -0,0 +1,242 @@
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from story_store import CRAWLED_STORE, iter_selected
+
+# -------------------------------------------------------------------------
+# [설정] 벤치마크 기본값
+# -------------------------------------------------------------------------
+DEFAULT_SCENARIO_FILE = "processed_stories.json"  # 가짜 LLM 응답 (JSON 파일 또는 각색 저장소 폴더)
+DEFAULT_WORK_DIR = ".bench"
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 측정 도구 (지연 시간 백분위 / 최대 메모리)
+# -------------------------------------------------------------------------
+def percentile(values, q):
+    """nearest-rank 백분위 (값이 없으면 None)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def peak_rss_mb():
+    """이 프로세스(+ 끝난 자식 프로세스 중 최대)의 최대 메모리 사용량(MB). 측정할 수 없으면 None"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        # 리눅스는 KB, macOS는 바이트 단위
+        scale = 1 if sys.platform == "darwin" else 1024
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        return max(own, children) / (1024 * 1024)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+
+class StageTimer:
+    """단계 함수를 감싸서 동화별 소요 시간과 성공 여부를 모읍니다."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, name, fn, succeeded=None):
+        """succeeded(결과)가 False면 실패로 셈 (예외는 항상 실패)"""
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = succeeded(result) if succeeded else True
+                return result
+            finally:
+                with self._lock:
+                    self.samples.setdefault(name, []).append((time.perf_counter() - started, ok))
+        return timed
+
+    def report(self):
+        rows = {}
+        for name, samples in self.samples.items():
+            durations = [d for d, _ in samples]
+            rows[name] = {
+                "count": len(samples),
+                "failed": sum(1 for _, ok in samples if not ok),
+                "p50": percentile(durations, 50),
+                "p95": percentile(durations, 95),
+                "total": sum(durations),
+            }
+        return rows
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 환경 준비 (모듈을 import 하기 전에 가짜 서비스 주소/캐시 위치를 지정)
+# -------------------------------------------------------------------------
+def configure_environment(endpoint, work_dir):
+    cache_dir = os.path.join(work_dir, ".cache")
+    os.environ.update({
+        "AZURE_ENDPOINT": endpoint,
+        "AZURE_API_KEY": "fake",
+        "AZURE_API_VERSION": "2024-10-21",
+        "AZURE_DEPLOYMENT_NAME": "fake-chat",
+        "AZURE_IMAGE_DEPLOYMENT_NAME": "fake-image",
+        "SPEECH_KEY": "fake",
+        "SPEECH_REGION": "local",
+        "LLM_CACHE_DIR": os.path.join(cache_dir, "llm"),
+        "TTS_CACHE_DIR": os.path.join(cache_dir, "tts"),
+        "TTS_TIMING_CACHE_DIR": os.path.join(cache_dir, "tts_timing"),
+        "IMAGE_CACHE_DIR": os.path.join(cache_dir, "images"),
+    })
+
+
+def reset_work_dir(work_dir, keep_cache):
+    """이전 결과물 삭제 (keep_cache면 캐시는 남겨서 재실행(warm) 성능을 잼)"""
+    import shutil
+    if not os.path.exists(work_dir):
+        return
+    for name in os.listdir(work_dir):
+        if keep_cache and name == ".cache":
+            continue
+        path = os.path.join(work_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+# -------------------------------------------------------------------------
+# [메인 로직] 가짜 서비스로 전체 파이프라인 실행 후 처리량 보고
+# -------------------------------------------------------------------------
+def run_benchmark(args):
+    scenarios = list(iter_selected(args.scenarios))
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    reset_work_dir(args.work_dir, keep_cache=args.warm)
+
+    from fake_services import ServiceProfile, FakeAzureServer
+    api_profile = ServiceProfile(
+        latency=args.latency, jitter=args.jitter, rate_limit_ratio=args.rate_limit,
+        retry_after=args.retry_after, image_mode=args.image_mode, image_kb=args.image_kb,
+        generation_seconds=args.llm_gen_seconds,
+    )
+    tts_profile = ServiceProfile(
+        latency=args.tts_latency, jitter=args.jitter, rate_limit_ratio=args.rate_limit,
+        retry_after=args.retry_after, realtime_factor=args.tts_rtf,
+    )
+
+    with FakeAzureServer(api_profile, scenarios) as server:
+        configure_environment(server.url, args.work_dir)
+
+        # 환경변수가 정해진 뒤에 파이프라인 모듈을 불러옴 (모듈 설정이 import 시점에 읽히므로)
+        import story_processor
+        import speech_engine
+        from fake_services import FakeSpeechEngine
+        from tts_generator import generate_tts_for_story
+        from image_generator import generate_images_for_story
+        from pipeline_scheduler import StoryScheduler
+
+        speech_engine.set_engine(FakeSpeechEngine(tts_profile))
+        timer = StageTimer()
+        story_processor.analyze_story_with_gpt = timer.wrap(
+            "adapt", story_processor.analyze_story_with_gpt, succeeded=lambda result: result is not None)
+
+        assets_dir = os.path.join(args.work_dir, "output_assets")
+        video_fn = None
+        if not args.no_video:
+            from video_generator import create_video_for_story
+            # 영상 단계는 실패하면 None을 반환 (음성/그림 단계는 실패하면 예외를 던지므로 예외로 셈)
+            video_fn = timer.wrap("video", lambda story: create_video_for_story(story, assets_dir, backend=args.backend),
+                                  succeeded=lambda path: path is not None)
+
+        scene_fns = None
+        if args.stream:
+            scene_fns = [lambda story: generate_tts_for_story(story, assets_dir, prune=False),
+                         lambda story: generate_images_for_story(story, assets_dir, prune=False)]
+        scheduler = StoryScheduler(
+            tts_fn=timer.wrap("tts", lambda story: generate_tts_for_story(story, assets_dir)),
+            image_fn=timer.wrap("images", lambda story: generate_images_for_story(story, assets_dir)),
+            video_fn=video_fn,
+            scene_fns=scene_fns,
+        )
+
+        print(f"🏁 벤치마크 시작: 동화 {args.stories}편 (가짜 서비스 {server.url})")
+        started = time.perf_counter()
+        try:
+            story_processor.process_crawled_data(
+                args.crawl, os.path.join(args.work_dir, "stories", "processed"),
+                limit=args.stories, ids=args.ids, on_story=scheduler.submit,
+                on_scene=scheduler.submit_scene if args.stream else None, on_discard=scheduler.discard,
+            )
+        finally:
+            summary = scheduler.finish()
+        elapsed = time.perf_counter() - started
+        requests = dict(server.counts)
+
+    report = {
+        "stories": summary["completed"],
+        "elapsed": elapsed,
+        "stories_per_hour": summary["completed"] / elapsed * 3600 if elapsed else None,
+        "stages": timer.report(),
+        "requests": requests,
+        "peak_rss_mb": peak_rss_mb(),
+        "settings": vars(args),
+    }
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 결과 저장: {args.report}")
+    return report
+
+
+def print_report(report):
+    fmt = lambda v: "-" if v is None else f"{v:.2f}"
+    print("=" * 60)
+    print(f"📊 완료 {report['stories']}편 / {report['elapsed']:.1f}초 -> {fmt(report['stories_per_hour'])} 편/시간")
+    for name, row in report["stages"].items():
+        print(f"   {name:<7} {row['count']:>4}회 (실패 {row['failed']})  "
+              f"p50 {fmt(row['p50'])}초  p95 {fmt(row['p95'])}초")
+    print(f"   요청 수: {report['requests']}")
+    print(f"   최대 메모리: {fmt(report['peak_rss_mb'])} MB")
+    print("=" * 60)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="로컬 가짜 Azure 서비스로 파이프라인 처리량을 측정합니다.")
+    parser.add_argument("--stories", type=int, default=10, help="처리할 동화 수")
+    parser.add_argument("--crawl", default=CRAWLED_STORE, help="크롤링 저장소 (각색 입력)")
+    parser.add_argument("--ids", help="처리할 seq (예: 12,40-45)")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIO_FILE, help="가짜 LLM이 돌려줄 시나리오")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR)
+    parser.add_argument("--warm", action="store_true", help="이전 실행의 캐시를 그대로 사용")
+    parser.add_argument("--latency", type=float, default=1.0, help="LLM/이미지 응답 지연(초)")
+    parser.add_argument("--llm-gen-seconds", type=float, default=0.0, help="LLM 응답 전체 생성 시간(초)")
+    parser.add_argument("--stream", action="store_true", help="각색 응답을 스트리밍으로 받아 완성된 장면부터 미리 처리")
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="TTS 요청 지연(초)")
+    parser.add_argument("--tts-rtf", type=float, default=0.05, help="TTS 오디오 1초당 추가 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="429 응답 비율 (0~1)")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--image-mode", choices=["b64", "url"], default="b64")
+    parser.add_argument("--image-kb", type=int, default=2048, help="이미지 응답 크기(KB)")
+    parser.add_argument("--no-video", action="store_true", help="영상 렌더링 단계 생략")
+    parser.add_argument("--backend", default=os.getenv("RENDER_BACKEND", "ffmpeg"),
+                        choices=["moviepy", "ffmpeg", "segments"])
+    parser.add_argument("--report", help="결과를 JSON으로 저장할 경로")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run_benchmark(parse_args())
@@ -0,0 +1,77 @@
+import argparse
+import os
+from dotenv import load_dotenv
+from story_store import PROCESSED_STORE, iter_selected
+
+# -------------------------------------------------------------------------
+# [설정] 증분 빌드 (자산 매니페스트 기준으로 바뀐 것만 다시 만들기)
+# -------------------------------------------------------------------------
+load_dotenv()
+
+DEFAULT_OUTPUT_DIR = "output_assets"
+# 장면별 구간 렌더링이어야 바뀐 장면만 다시 인코딩하고 나머지는 스트림 복사로 이어 붙일 수 있음
+BUILD_BACKEND = os.getenv("BUILD_BACKEND", "segments")
+
+
+# -------------------------------------------------------------------------
+# [함수] 동화 한 편 빌드
+# -------------------------------------------------------------------------
+def build_story(story_data, output_dir=DEFAULT_OUTPUT_DIR, backend=BUILD_BACKEND, render_video=True, renditions=None):
+    """
+    음성 -> 그림 -> 영상 순서로 실행합니다. 각 단계는 {동화 폴더}/manifest.json의 입력 해시를 보고
+    - 음성: 텍스트/보이스/출력 형식이 바뀐 대사만 합성, 대본에서 빠진 대사 파일은 삭제
+    - 그림: 화풍/장면 묘사/크기/품질이 바뀐 장면만 생성
+    - 영상: 바뀐 자산을 쓰는 장면 구간만 다시 렌더링한 뒤 전체를 다시 이어 붙임 (바뀐 게 없으면 건너뜀)
+            renditions의 출력본(가로/쇼츠/미리보기)은 구간마다 한 번의 합성에서 함께 인코딩
+    음성/그림 중 하나라도 실패하면 빠진 대사/장면으로 영상을 만들지 않음 (None 반환)
+    """
+    from speech_engine import SynthesisError
+    from tts_generator import generate_tts_for_story
+    from image_generator import ImageGenerationError, generate_images_for_story
+    from video_generator import create_video_for_story
+
+    errors = []
+    for step in (generate_tts_for_story, generate_images_for_story):
+        try:
+            step(story_data, output_dir)
+        except (SynthesisError, ImageGenerationError) as e:
+            errors.append(str(e))
+    if errors:
+        print(f"  ⚠️ 자산 생성 실패로 영상 단계를 건너뜁니다. ({'; '.join(errors)})")
+        return None
+    if render_video:
+        return create_video_for_story(story_data, output_dir, backend=backend, renditions=renditions)
+    return None
+
+
+def main(source=PROCESSED_STORE, ids=None, titles=None, since=None, limit=None,
+         output_dir=DEFAULT_OUTPUT_DIR, backend=BUILD_BACKEND, render_video=True, renditions=None):
+    if not os.path.exists(source):
+        print("❌ 각색 저장소(또는 JSON 파일)가 없습니다.")
+        return
+    built = 0
+    for story in iter_selected(source, ids=ids, titles=titles, since=since, limit=limit):
+        build_story(story, output_dir, backend=backend, render_video=render_video, renditions=renditions)
+        built += 1
+    print(f"🏗️ 빌드 완료: {built}편 (바뀐 자산만 다시 만들었습니다)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="각색된 동화의 음성/그림/영상을 바뀐 것만 다시 만듭니다.")
+    parser.add_argument("--source", default=PROCESSED_STORE, help="각색 저장소 (또는 JSON 파일)")
+    parser.add_argument("--ids", help="처리할 seq (예: 12,40-45)")
+    parser.add_argument("--title", dest="titles", action="append", help="처리할 동화 제목 (여러 번 지정 가능)")
+    parser.add_argument("--since", help="이 시각 이후 바뀐 동화만 (예: 6h, 2026-10-01)")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--backend", default=BUILD_BACKEND, choices=["moviepy", "ffmpeg", "segments"])
+    parser.add_argument("--renditions", help="함께 만들 출력본 (예: main,shorts,preview / 기본: VIDEO_RENDITIONS)")
+    parser.add_argument("--no-video", action="store_true", help="음성/그림만 갱신")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.source, ids=args.ids, titles=args.titles, since=args.since, limit=args.limit,
+         output_dir=args.output_dir, backend=args.backend, render_video=not args.no_video,
+         renditions=args.renditions)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+
+# -------------------------------------------------------------------------
+# [클래스] 내용 주소 기반(Content-addressed) 디스크 캐시
+# -------------------------------------------------------------------------
+class ContentCache:
+    """
+    입력값들의 해시를 키로 결과 파일을 보관하는 디스크 캐시입니다.
+    - 항목은 root/<키 앞 2자리>/<키><suffix> 에 저장됩니다.
+    - 조회할 때마다 수정 시각을 갱신하므로 evict()는 오래 안 쓴 항목부터 지웁니다. (LRU)
+    - max_age(초)가 지난 항목, max_bytes를 넘는 만큼의 항목이 정리 대상입니다.
+    """
+
+    def __init__(self, root, suffix="", max_bytes=None, max_age=None):
+        self.root = root
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts):
+        """입력값들을 정규화(JSON)해서 sha256 키를 만듭니다."""
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def with_suffix(self, suffix):
+        """같은 폴더/정리 기준에 확장자만 다른 캐시 (확장자가 같으면 자기 자신)"""
+        if suffix == self.suffix:
+            return self
+        return ContentCache(self.root, suffix=suffix, max_bytes=self.max_bytes, max_age=self.max_age)
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], f"{key}{self.suffix}")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_path(self, key):
+        """캐시에 있으면 파일 경로, 없거나 만료되었으면 None"""
+        path = self.path_for(key)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            self._count(False)
+            return None
+        if self.max_age is not None and time.time() - mtime > self.max_age:
+            self._remove(path)
+            self._count(False)
+            return None
+        try:
+            os.utime(path)  # LRU용 사용 시각 갱신
+        except OSError:
+            pass
+        self._count(True)
+        return path
+
+    def get_bytes(self, key):
+        path = self.get_path(key)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def get_json(self, key):
+        data = self.get_bytes(key)
+        return json.loads(data.decode('utf-8')) if data is not None else None
+
+    def put_bytes(self, key, data):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def put_json(self, key, value):
+        return self.put_bytes(key, json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+    def put_file(self, key, src_path):
+        """이미 만들어진 파일을 캐시에 복사해 넣습니다."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def materialize(self, key, dest_path):
+        """
+        캐시 항목을 dest_path에 하드링크로 연결합니다. (다른 디스크 등으로 실패하면 복사)
+        캐시에 없으면 False
+        """
+        path = self.get_path(key)
+        if path is None:
+            return False
+        self.link_file(path, dest_path)
+        return True
+
+    @staticmethod
+    def link_file(src_path, dest_path):
+        tmp_path = f"{dest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.link(src_path, tmp_path)
+        except OSError:
+            shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def _entries(self):
+        if not os.path.isdir(self.root):
+            return []
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """만료 항목과 용량 초과분(오래 안 쓴 순)을 지우고, 지운 개수를 반환합니다."""
+        entries = sorted(self._entries())
+        now = time.time()
+        removed = 0
+        kept = []
+        for mtime, size, path in entries:
+            if self.max_age is not None and now - mtime > self.max_age:
+                self._remove(path)
+                removed += 1
+            else:
+                kept.append((mtime, size, path))
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in kept)
+            for _, size, path in kept:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                removed += 1
+        return removed
+
+    def stats(self):
+        entries = self._entries()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
@@ -1,74 +1,249 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+import threading
 import re
 import json
+import os
 import time
 import random
+from story_store import CRAWLED_STORE, crawled_store, source_hash
 
 
-# 1. 목록 페이지에서 첫 번째 숫자만 추출 (중복 제거)
+# -------------------------------------------------------------------------
+# [설정] 크롤링 대상 URL 및 동작 옵션
+# -------------------------------------------------------------------------
 base_list_url = "http://18children.president.pa.go.kr/mobile/our_space/fairy_tales.php?srh%5Bcategory%5D=07&srh%5Bpage%5D={}"
-pattern = re.compile(r'board\.goDetail\((\d+),\s*(\d+)\)')
-
-
-coords_set = set()
-
-
-for page in range(1, 21):
-    url = base_list_url.format(page)
-    response = requests.get(url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        for a_tag in soup.find_all('a', href=True):
-            match = pattern.search(a_tag['href'])
-            if match:
-                num1, _ = match.groups()
-                coords_set.add(int(num1))
-    else:
-        print(f"Page {page} 요청 실패: {response.status_code}")
-    
-
-
-coords_list = sorted(coords_set)
-
-
-# 2. 상세 페이지에서 제목과 문단 추출
 base_detail_url = "http://18children.president.pa.go.kr/mobile/our_space/fairy_tales.php?srh%5Bcategory%5D=07&srh%5Bpage%5D=1&srh%5Bview_mode%5D=detail&srh%5Bseq%5D={}"
+pattern = re.compile(r'board\.goDetail\((\d+),\s*(\d+)\)')
 
-
-result_data = {}
-
-
-for seq in coords_list:
-    detail_url = base_detail_url.format(seq)
-    response = requests.get(detail_url)
+# 동화 1편 = 파일 1개로 저장 (stories/crawled, 기존 fairy_tales.json은 처음 한 번 옮겨 옴)
+OUTPUT_STORE = CRAWLED_STORE
+# ETag / Last-Modified 및 목록 페이지 결과를 보관하는 조건부 요청용 메타 파일
+HTTP_META_FILE = "fairy_tales_http_meta.json"
+
+LIST_PAGES = 20
+MAX_WORKERS = 8             # 동시에 진행할 요청 수
+REQUESTS_PER_SECOND = 4.0   # 호스트당 초당 최대 요청 수 (서버 부담 방지)
+CHECKPOINT_EVERY = 10       # 상세 페이지 N개마다 메타 파일 중간 저장 (동화는 받는 즉시 저장)
+REQUEST_TIMEOUT = 15
+
+
+# -------------------------------------------------------------------------
+# [클래스] 호스트별 요청 간격 제한기
+# -------------------------------------------------------------------------
+class HostRateLimiter:
+    """호스트마다 최소 요청 간격을 보장합니다. (여러 스레드에서 공유)"""
+
+    def __init__(self, requests_per_second=REQUESTS_PER_SECOND):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if self.interval <= 0:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 연결 재사용 세션 / 조건부 요청
+# -------------------------------------------------------------------------
+def create_session(pool_size=MAX_WORKERS):
+    """Keep-Alive 연결 풀을 공유하는 requests 세션을 만듭니다."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch(session, url, limiter, validators=None):
+    """
+    조건부 GET 요청을 보냅니다.
+    validators: 이전 응답의 {"etag": ..., "last_modified": ...}
+    반환값: (response, 새 validators) - 변경 없음이면 response.status_code == 304
+    """
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    limiter.wait(url)
+    response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+    new_validators = dict(validators or {})
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 제목 추출
-        title_tag = soup.find('h3', class_='title1')
-        title_text = title_tag.get_text(strip=True) if title_tag else f"SEQ {seq}"
-        
-        # 문단 추출: style 속성에 'text-align'이 포함된 p 태그 모두
-        p_tags = soup.find_all('p', style=lambda value: value and 'text-align' in value)
-        pages_dict = {}
-        for idx, p in enumerate(p_tags, start=1):
-            text = p.get_text(strip=True)  # span 내부까지 포함해서 텍스트 추출
-            if text:
-                pages_dict[idx] = text
-        
-        result_data[seq] = {
-            "title": title_text,
-            "pages": pages_dict
+        new_validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
         }
+    return response, new_validators
+
+
+# -------------------------------------------------------------------------
+# [함수 2] HTML 파싱
+# -------------------------------------------------------------------------
+def parse_list_page(html):
+    # 목록 페이지에서 첫 번째 숫자만 추출
+    seqs = set()
+    soup = BeautifulSoup(html, 'html.parser')
+    for a_tag in soup.find_all('a', href=True):
+        match = pattern.search(a_tag['href'])
+        if match:
+            num1, _ = match.groups()
+            seqs.add(int(num1))
+    return seqs
+
+
+def parse_detail_page(html, seq):
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # 제목 추출
+    title_tag = soup.find('h3', class_='title1')
+    title_text = title_tag.get_text(strip=True) if title_tag else f"SEQ {seq}"
+
+    # 문단 추출: style 속성에 'text-align'이 포함된 p 태그 모두
+    p_tags = soup.find_all('p', style=lambda value: value and 'text-align' in value)
+    pages_dict = {}
+    for idx, p in enumerate(p_tags, start=1):
+        text = p.get_text(strip=True)  # span 내부까지 포함해서 텍스트 추출
+        if text:
+            pages_dict[str(idx)] = text
+
+    return {
+        "title": title_text,
+        "pages": pages_dict
+    }
+
+
+# -------------------------------------------------------------------------
+# [함수 3] 저장 (원자적 쓰기)
+# -------------------------------------------------------------------------
+def load_json(path, default):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return default
+
+
+def save_json_atomic(path, data):
+    # 임시 파일에 쓴 뒤 교체 -> 도중에 죽어도 기존 파일이 깨지지 않음
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# -------------------------------------------------------------------------
+# [메인] 동시/증분 크롤링
+# -------------------------------------------------------------------------
+def crawl(output_store=OUTPUT_STORE, meta_file=HTTP_META_FILE, max_workers=MAX_WORKERS,
+          requests_per_second=REQUESTS_PER_SECOND, refresh=False, checkpoint_every=CHECKPOINT_EVERY):
+    """
+    동화 목록/상세 페이지를 병렬로 수집합니다.
+    - 이미 저장소에 있는 seq는 건너뜁니다. (refresh=True면 조건부 GET으로 변경분만 다시 받음)
+    - 동화는 받는 즉시 한 편씩 저장하므로 중간에 실패해도 이어서 수집할 수 있습니다.
+    - 내용이 그대로인 동화는 다시 쓰지 않음 (저장소의 변경 시각이 실제 변경을 뜻하도록)
+    """
+    store = crawled_store(output_store)
+    meta = load_json(meta_file, {"lists": {}, "details": {}})
+    session = create_session(pool_size=max_workers)
+    limiter = HostRateLimiter(requests_per_second)
+
+    # 1. 목록 페이지 수집 (304면 이전에 저장한 seq 목록을 그대로 사용)
+    def crawl_list(page):
+        url = base_list_url.format(page)
+        cached = meta["lists"].get(str(page), {})
+        response, validators = fetch(session, url, limiter, cached.get("validators"))
+        if response.status_code == 304:
+            return page, set(cached.get("seqs", [])), cached.get("validators")
+        if response.status_code == 200:
+            return page, parse_list_page(response.text), validators
+        print(f"Page {page} 요청 실패: {response.status_code}")
+        return page, set(cached.get("seqs", [])), cached.get("validators")
+
+    coords_set = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in as_completed([executor.submit(crawl_list, p) for p in range(1, LIST_PAGES + 1)]):
+            try:
+                page, seqs, validators = future.result()
+            except requests.RequestException as e:
+                print(f"목록 페이지 요청 에러: {e}")
+                continue
+            coords_set.update(seqs)
+            meta["lists"][str(page)] = {"seqs": sorted(seqs), "validators": validators}
+
+    coords_list = sorted(coords_set)
+    if refresh:
+        targets = coords_list
     else:
+        targets = [seq for seq in coords_list if str(seq) not in store]
+
+    print(f"📚 목록 {len(coords_list)}개 중 {len(targets)}개 상세 페이지를 수집합니다.")
+
+    # 2. 상세 페이지 수집
+    def crawl_detail(seq):
+        url = base_detail_url.format(seq)
+        validators = meta["details"].get(str(seq)) if str(seq) in store else None
+        response, new_validators = fetch(session, url, limiter, validators)
+        if response.status_code == 304:
+            return seq, None, new_validators
+        if response.status_code == 200:
+            return seq, parse_detail_page(response.text, seq), new_validators
         print(f"상세 페이지 {seq} 요청 실패: {response.status_code}")
-    
-
-
-# 3. JSON 파일 저장
-with open("fairy_tales.json", "w", encoding="utf-8") as f:
-    json.dump(result_data, f, ensure_ascii=False, indent=4)
-
-
-print("fairy_tales.json 저장 완료")
\ No newline at end of file
+        return seq, None, validators
+
+    done_count = 0
+    changed_count = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(crawl_detail, seq) for seq in targets]
+        for future in as_completed(futures):
+            try:
+                seq, story, validators = future.result()
+            except requests.RequestException as e:
+                print(f"상세 페이지 요청 에러: {e}")
+                continue
+
+            done_count += 1
+            if validators:
+                meta["details"][str(seq)] = validators
+            if story is not None:
+                new_hash = source_hash(story)
+                previous = store.entry(seq)
+                if previous is None or previous.get('source_hash') != new_hash:
+                    store.put(seq, story, source_hash=new_hash)
+                    changed_count += 1
+
+            # 3. 중간 저장 (체크포인트)
+            if checkpoint_every and done_count % checkpoint_every == 0:
+                save_json_atomic(meta_file, meta)
+                print(f"  💾 체크포인트 저장 ({done_count}/{len(targets)})")
+
+    session.close()
+
+    # 4. 메타 파일 저장
+    save_json_atomic(meta_file, meta)
+
+    print(f"{store.root} 저장 완료 (신규/변경 {changed_count}개, 전체 {len(store)}개)")
+    return store
+
+
+if __name__ == "__main__":
+    crawl()
@@ -0,0 +1,449 @@
+import base64
+import hashlib
+import itertools
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from datetime import timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from xml.etree import ElementTree
+import azure.cognitiveservices.speech as speechsdk
+from speech_engine import SpeechEngine
+from audio_io import audio_duration, wav_bytes
+
+# -------------------------------------------------------------------------
+# [설정] 로컬 가짜 Azure 서비스 (네트워크 없이 파이프라인 성능 측정용)
+# -------------------------------------------------------------------------
+SSML_NS = "{http://www.w3.org/2001/10/synthesis}"
+
+# 가짜 TTS가 만드는 MP3 프레임 (MPEG-2 Layer III, 24kHz, 48kbps, 모노, 무음)
+# = 기본 출력 형식 Audio24Khz48KBitRateMonoMp3과 같은 프레임 구조
+MP3_FRAME_HEADER = bytes([0xFF, 0xF3, 0x64, 0xC0])
+MP3_FRAME_BYTES = 144
+MP3_FRAME_SECONDS = 576 / 24000
+
+CHARS_PER_SECOND = 7.0   # 한국어 낭독 속도 (공백 제외 글자/초)
+VOICE_GAP = 0.15         # SSML 안에서 화자가 바뀔 때 쉬는 시간
+
+
+class ServiceProfile:
+    """
+    가짜 서비스의 응답 특성
+    - latency/jitter: 요청마다 latency + [0, jitter) 초 대기
+    - rate_limit_ratio: 이 비율만큼 429(Retry-After 포함)로 응답
+    - image_mode: "b64" 또는 "url", image_kb: PNG 응답 크기(여분 청크로 채움)
+    - realtime_factor: TTS가 오디오 1초당 추가로 걸리는 시간(초)
+    - generation_seconds: LLM이 응답 전체를 생성하는 시간 (일반 응답은 다 만든 뒤 한 번에, 스트리밍은 조각마다 나눠서)
+    - stream_chunk_chars: 스트리밍 조각 하나의 글자 수
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, rate_limit_ratio=0.0, retry_after=1.0,
+                 image_mode="b64", image_kb=2048, image_size=(1536, 1024), realtime_factor=0.05,
+                 generation_seconds=0.0, stream_chunk_chars=16):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.image_mode = image_mode
+        self.image_kb = image_kb
+        self.image_size = image_size
+        self.realtime_factor = realtime_factor
+        self.generation_seconds = generation_seconds
+        self.stream_chunk_chars = stream_chunk_chars
+
+    def delay(self, extra=0.0):
+        time.sleep(self.latency + random.uniform(0, self.jitter) + extra)
+
+    def rate_limited(self):
+        return random.random() < self.rate_limit_ratio
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 응답 페이로드 만들기
+# -------------------------------------------------------------------------
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+@lru_cache(maxsize=16)
+def make_png(width, height, color=(200, 180, 150), total_kb=0):
+    """단색 PNG (total_kb가 있으면 tEXt 청크로 그 크기까지 채움 -> 실제 응답 크기 재현)"""
+    row = b"\x00" + bytes(color) * width
+    body = _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    body += _png_chunk(b"IDAT", zlib.compress(row * height, 6))
+    png = b"\x89PNG\r\n\x1a\n" + body
+    padding = total_kb * 1024 - len(png) - 12 - 12
+    if padding > 8:
+        png += _png_chunk(b"tEXt", b"Comment\x00" + b" " * (padding - 8))
+    return png + _png_chunk(b"IEND", b"")
+
+
+def make_silent_mp3(seconds):
+    frames = max(1, int(seconds / MP3_FRAME_SECONDS + 0.5))
+    return (MP3_FRAME_HEADER + bytes(MP3_FRAME_BYTES - 4)) * frames
+
+
+def make_silent_audio(seconds, extension=".mp3"):
+    """엔진 출력 형식에 맞춘 무음 (wav: 24kHz 16비트 모노 PCM, 그 밖의 형식은 MP3)"""
+    if extension == ".wav":
+        return wav_bytes(bytes(int(seconds * 24000) * 2), 24000)
+    return make_silent_mp3(seconds)
+
+
+def pick_scenario(scenarios, content):
+    """요청 본문 해시로 미리 준비한 시나리오를 고름 (같은 동화 -> 같은 시나리오, 제목은 동화마다 다르게)"""
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    scenario = dict(scenarios[int(digest, 16) % len(scenarios)])
+    scenario['title'] = f"{scenario['title']} {digest[:6]}"
+    scenario.pop('original_seq', None)
+    return scenario
+
+
+def fake_chat_completion(scenarios, request):
+    """chat/completions 요청 -> 시나리오를 담은 chat.completion 응답 (가짜 서버/가짜 배치 공용)"""
+    content = request.get("messages", [{}])[-1].get("content", "")
+    scenario = pick_scenario(scenarios, content)
+    return {
+        "id": f"chatcmpl-fake-{hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(scenario, ensure_ascii=False)},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": len(content), "completion_tokens": 4000, "total_tokens": len(content) + 4000},
+    }
+
+
+def fake_chat_stream(completion, chunk_chars=16, include_usage=False):
+    """chat.completion 응답 -> 스트리밍 조각(chat.completion.chunk) JSON 문자열들 + [DONE] 표시"""
+    content = completion["choices"][0]["message"]["content"]
+    base = {"id": completion["id"], "object": "chat.completion.chunk",
+            "created": completion["created"], "model": completion["model"]}
+    first = True
+    for i in range(0, len(content), chunk_chars):
+        delta = {"content": content[i:i + chunk_chars]}
+        if first:
+            delta["role"] = "assistant"
+            first = False
+        yield json.dumps({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]},
+                         ensure_ascii=False)
+    yield json.dumps({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    if include_usage:
+        yield json.dumps({**base, "choices": [], "usage": completion["usage"]})
+    yield "[DONE]"
+
+
+# -------------------------------------------------------------------------
+# [클래스 1] 가짜 Azure OpenAI (chat/completions, images/generations)
+# -------------------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-Alive (실제 서비스처럼 연결 재사용)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_stream(self, events, interval):
+        # Server-Sent Events (chunked 전송, 조각 사이에 interval초 대기)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in events:
+            data = f"data: {event}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+            if interval:
+                time.sleep(interval)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0]
+
+        if path.endswith("/chat/completions"):
+            kind = "chat"
+        elif path.endswith("/images/generations"):
+            kind = "images"
+        else:
+            self._send_json(404, {"error": {"code": "NotFound", "message": path}})
+            return
+
+        server.count(kind)
+        server.profile.delay()
+        if server.profile.rate_limited():
+            server.count(f"{kind}_429")
+            retry_ms = int(server.profile.retry_after * 1000)
+            self._send_json(429, {"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                            {"retry-after-ms": str(retry_ms), "retry-after": str(max(1, retry_ms // 1000))})
+            return
+
+        if kind == "chat" and request.get("stream"):
+            completion = server.chat_response(request)
+            chunk_chars = server.profile.stream_chunk_chars
+            pieces = -(-len(completion["choices"][0]["message"]["content"]) // chunk_chars)
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._send_stream(fake_chat_stream(completion, chunk_chars, include_usage),
+                              server.profile.generation_seconds / max(pieces, 1))
+        elif kind == "chat":
+            time.sleep(server.profile.generation_seconds)
+            self._send_json(200, server.chat_response(request))
+        else:
+            self._send_json(200, server.image_response(request))
+
+    def do_GET(self):
+        # url 모드 이미지 다운로드
+        server = self.server
+        png = server.blobs.get(self.path.split("?")[0])
+        if png is None:
+            self._send_json(404, {"error": {"code": "NotFound", "message": self.path}})
+            return
+        server.count("download")
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(png)))
+        self.end_headers()
+        self.wfile.write(png)
+
+
+class FakeAzureServer(ThreadingHTTPServer):
+    """
+    Azure OpenAI의 chat/completions, images/generations를 흉내 내는 로컬 서버입니다.
+    with FakeAzureServer(profile, scenarios) as server: -> server.url을 AZURE_ENDPOINT로 사용
+    """
+    daemon_threads = True
+
+    def __init__(self, profile, scenarios, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.profile = profile
+        self.scenarios = scenarios
+        self.blobs = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def chat_response(self, request):
+        return fake_chat_completion(self.scenarios, request)
+
+    def image_response(self, request):
+        width, height = self.profile.image_size
+        digest = hashlib.sha256(request.get("prompt", "").encode('utf-8')).digest()
+        png = make_png(width, height, tuple(digest[:3]), self.profile.image_kb)
+        if self.profile.image_mode == "url":
+            path = f"/blobs/{digest.hex()[:16]}.png"
+            with self._lock:
+                self.blobs[path] = png
+            item = {"url": f"{self.url}{path}"}
+        else:
+            item = {"b64_json": base64.b64encode(png).decode('ascii')}
+        return {"created": int(time.time()), "data": [item]}
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-azure", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+# -------------------------------------------------------------------------
+# [클래스 2] 가짜 배치 API (batch_adapter의 AzureBatchClient와 같은 모양)
+# -------------------------------------------------------------------------
+class LocalBatchClient:
+    """
+    배치 요청 파일을 백그라운드 스레드에서 처리하고, Azure 배치와 같은 형식의 결과/오류 JSONL을 만듭니다.
+    - failure_ratio: 이 비율만큼 항목을 실패시킴 (절반은 HTTP 오류, 절반은 JSON이 아닌 응답)
+    - latency: 항목 하나를 처리하는 데 걸리는 시간(초)
+    배치는 메모리에만 있으므로 다른 프로세스에서 이어서 기다릴 수 없음 (resumable = False)
+    """
+    resumable = False
+
+    def __init__(self, scenarios, failure_ratio=0.0, latency=0.0):
+        self.scenarios = scenarios
+        self.failure_ratio = failure_ratio
+        self.latency = latency
+        self.files = {}
+        self.batches = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, input_path):
+        with open(input_path, 'r', encoding='utf-8') as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        batch_id = f"batch-local-{next(self._ids)}"
+        with self._lock:
+            self.batches[batch_id] = {"status": "in_progress", "total": len(items), "completed": 0, "failed": 0,
+                                      "output_file_id": None, "error_file_id": None}
+        threading.Thread(target=self._run, args=(batch_id, items), name=batch_id, daemon=True).start()
+        return batch_id
+
+    def _run(self, batch_id, items):
+        outputs, errors = [], []
+        for item in items:
+            time.sleep(self.latency)
+            roll = random.random()
+            http_error = roll < self.failure_ratio / 2
+            if http_error:
+                errors.append({"custom_id": item["custom_id"], "response": {
+                    "status_code": 500, "body": {"error": {"code": "InternalServerError", "message": "Fake 500"}}},
+                    "error": None})
+            else:
+                body = fake_chat_completion(self.scenarios, item["body"])
+                if roll < self.failure_ratio:
+                    body["choices"][0]["message"]["content"] = "{\"title\": "  # 잘린 응답
+                outputs.append({"custom_id": item["custom_id"],
+                                "response": {"status_code": 200, "request_id": body["id"], "body": body},
+                                "error": None})
+            with self._lock:
+                # 배치 API처럼 HTTP 오류만 실패로 셈 (응답 내용이 잘못된 것은 결과를 받아 봐야 앎)
+                self.batches[batch_id]["failed" if http_error else "completed"] += 1
+
+        with self._lock:
+            batch = self.batches[batch_id]
+            for kind, lines in (("output_file_id", outputs), ("error_file_id", errors)):
+                if lines:
+                    file_id = f"file-{batch_id}-{kind.split('_')[0]}"
+                    self.files[file_id] = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+                    batch[kind] = file_id
+            batch["status"] = "completed"
+
+    def status(self, batch_id):
+        with self._lock:
+            return dict(self.batches[batch_id])
+
+    def download(self, file_id, path):
+        with self._lock:
+            content = self.files[file_id]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+
+# -------------------------------------------------------------------------
+# [클래스 3] 가짜 Speech 합성기 (SpeechEngine의 풀/재시도/캐시 로직은 그대로 사용)
+# -------------------------------------------------------------------------
+class _FakeFuture:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def get(self):
+        return self._fn()
+
+
+class _FakeSynthesizer:
+    """_PooledSynthesizer와 같은 모양 (on_bookmark/on_word_boundary 콜백, synthesizer, connection)"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.on_bookmark = None
+        self.on_word_boundary = None
+        self.synthesizer = SimpleNamespace(
+            speak_text_async=lambda text: _FakeFuture(lambda: self._speak([(None, text)])),
+            speak_ssml_async=lambda ssml: _FakeFuture(lambda: self._speak(parse_ssml(ssml))),
+        )
+        self.connection = SimpleNamespace(close=lambda: None)
+
+    def _speak(self, segments):
+        profile = self.engine.profile
+        offset = 0.0
+        events = []
+        for i, (mark, text) in enumerate(segments):
+            if i:
+                offset += VOICE_GAP
+            if mark:
+                events.append(("bookmark", SimpleNamespace(text=mark, audio_offset=int(offset * 10_000_000))))
+            for word in text.split():
+                duration = max(len(word), 1) / self.engine.chars_per_second
+                events.append(("word", SimpleNamespace(
+                    text=word, audio_offset=int(offset * 10_000_000),
+                    duration=timedelta(seconds=duration),
+                    boundary_type=speechsdk.SpeechSynthesisBoundaryType.Word,
+                )))
+                offset += duration
+
+        profile.delay(offset * profile.realtime_factor)
+        if profile.rate_limited():
+            return SimpleNamespace(
+                reason=speechsdk.ResultReason.Canceled,
+                cancellation_details=SimpleNamespace(
+                    reason=speechsdk.CancellationReason.Error,
+                    error_code=speechsdk.CancellationErrorCode.TooManyRequests,
+                    error_details="Fake 429",
+                ),
+            )
+
+        for kind, evt in events:
+            callback = self.on_bookmark if kind == "bookmark" else self.on_word_boundary
+            if callback:
+                callback(evt)
+        extension = ".wav" if self.engine.extension == ".wav" else ".mp3"
+        audio = make_silent_audio(offset, extension)
+        return SimpleNamespace(
+            reason=speechsdk.ResultReason.SynthesizingAudioCompleted,
+            audio_data=audio,
+            audio_duration=timedelta(seconds=audio_duration(audio, extension)),
+        )
+
+
+def parse_ssml(ssml):
+    """build_multivoice_ssml 형식 -> [(북마크, 대사), ...]"""
+    root = ElementTree.fromstring(ssml)
+    segments = []
+    for voice in root.iter(f"{SSML_NS}voice"):
+        bookmark = voice.find(f"{SSML_NS}bookmark")
+        if bookmark is not None:
+            segments.append((bookmark.get("mark"), (voice.text or "") + (bookmark.tail or "")))
+        else:
+            segments.append((None, "".join(voice.itertext())))
+    return segments
+
+
+class FakeSpeechEngine(SpeechEngine):
+    """
+    Azure Speech 대신 무음 MP3와 가짜 북마크/단어 경계 이벤트를 돌려주는 엔진입니다.
+    (출력 형식이 wav면 24kHz 16비트 모노 WAV, 그 밖에는 항상 24kHz 48kbps 모노 MP3)
+    """
+
+    def __init__(self, profile=None, chars_per_second=CHARS_PER_SECOND, **kwargs):
+        kwargs.setdefault("key", "fake")
+        kwargs.setdefault("region", "local")
+        super().__init__(**kwargs)
+        self.profile = profile or ServiceProfile(latency=0.3, jitter=0.1)
+        self.chars_per_second = chars_per_second
+
+    def _acquire(self, voice):
+        return _FakeSynthesizer(self)
+
+    def _release(self, voice, pooled, broken=False):
+        pooled.on_bookmark = None
+        pooled.on_word_boundary = None
@@ -0,0 +1,394 @@
+import os
+import subprocess
+import time
+from PIL import ImageColor, ImageFont
+import telemetry
+from video_timeline import (
+    FONT_PATH, SUBTITLE_FONT_SIZE, TITLE_FONT_SIZE, SUBTITLE_COLOR, SUBTITLE_BG_COLOR,
+    VIDEO_SIZE, VIDEO_FPS, INTRO_FADE_IN, SCENE_FADE_IN, build_story_timeline, render_inputs
+)
+from asset_manifest import FINAL_VIDEO_KEY, asset_entry, fresh_asset, load_asset_manifest, update_asset_manifest
+
+# -------------------------------------------------------------------------
+# [설정] FFmpeg 렌더링 옵션
+# -------------------------------------------------------------------------
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+AUDIO_SAMPLE_RATE = 48000
+X264_PRESET = "ultrafast"   # 속도 최우선
+X264_CRF = 23
+AUDIO_BITRATE = "192k"
+
+# 정지 화면 구간에서 같은 프레임을 버려 인코딩할 프레임 수를 줄임 (가변 프레임레이트)
+USE_VFR = True
+MPDECIMATE = "mpdecimate"
+
+SUBTITLE_BOTTOM_MARGIN = 100
+SUBTITLE_BOX_PADDING = 12
+
+# -------------------------------------------------------------------------
+# [설정] 출력본(rendition): 한 번 합성한 화면을 split으로 나눠 크기/자막/화질만 다르게 인코딩
+# -------------------------------------------------------------------------
+# fit: "letterbox"(비율 유지 + 검은 여백) / "crop"(가운데를 잘라 화면을 꽉 채움)
+# subtitle_scale / subtitle_margin: 출력 해상도 기준 자막(제목) 크기 배율 / 아래 여백(px)
+# maxrate / bufsize: 최대 비트레이트와 VBV 버퍼 (None이면 CRF만 사용)
+RENDITIONS = {
+    "main": {"size": VIDEO_SIZE, "fit": "letterbox", "subtitle_scale": 1.0, "subtitle_margin": SUBTITLE_BOTTOM_MARGIN,
+             "preset": X264_PRESET, "crf": X264_CRF, "maxrate": None, "bufsize": None, "suffix": "_final"},
+    "shorts": {"size": (1080, 1920), "fit": "crop", "subtitle_scale": 1.5, "subtitle_margin": 520,
+               "preset": "veryfast", "crf": 23, "maxrate": "8M", "bufsize": "16M", "suffix": "_shorts"},
+    "preview": {"size": (1080, 720), "fit": "letterbox", "subtitle_scale": 0.7, "subtitle_margin": 60,
+                "preset": "ultrafast", "crf": 32, "maxrate": "1500k", "bufsize": "3M", "suffix": "_preview"},
+}
+# 만들 출력본 (쉼표로 구분, 예: "main,shorts,preview")
+VIDEO_RENDITIONS = os.getenv("VIDEO_RENDITIONS", "main")
+
+
+def parse_renditions(names=VIDEO_RENDITIONS):
+    """"main,shorts" 또는 목록 -> 출력본 이름 목록 (알 수 없는 이름은 ValueError)"""
+    if isinstance(names, str):
+        names = [n.strip() for n in names.split(",")]
+    names = list(dict.fromkeys(n for n in names if n))
+    unknown = [n for n in names if n not in RENDITIONS]
+    if unknown or not names:
+        raise ValueError(f"알 수 없는 출력본입니다: {unknown or names} (가능: {', '.join(RENDITIONS)})")
+    return names
+
+
+def extra_renditions(names=None):
+    """main 말고 더 요청된 출력본 (None이면 VIDEO_RENDITIONS) - main만 만드는 MoviePy 렌더링에서 경고용"""
+    return [n for n in parse_renditions(VIDEO_RENDITIONS if names is None else names) if n != "main"]
+
+
+def rendition_spec(name, preset=X264_PRESET):
+    """출력본 설정 (main은 렌더러에 넘긴 preset을 따름)"""
+    spec = dict(RENDITIONS[name])
+    if name == "main":
+        spec["preset"] = preset
+    return spec
+
+
+def rendition_path(paths, name):
+    return os.path.join(paths["story_dir"], f"{paths['safe_title']}{RENDITIONS[name]['suffix']}.mp4")
+
+
+def rendition_key(name):
+    """자산 매니페스트 키 (main은 기존 최종 영상 키)"""
+    return FINAL_VIDEO_KEY if name == "main" else f"video/{name}"
+
+
+def rendition_inputs(name, spec):
+    """render_inputs에 더할 출력본 설정 (main은 크기/자막 설정이 이미 디자인에 들어 있어 추가 없음)"""
+    return {} if name == "main" else {"rendition": spec}
+
+
+# -------------------------------------------------------------------------
+# [함수 1] ASS 자막 파일 작성 (제목 + 본문 자막을 한 번에 입힘)
+# -------------------------------------------------------------------------
+def _ass_color(color, alpha=255):
+    """PIL 색상 -> ASS 색상(&HAABBGGRR). ASS 알파는 0이 불투명"""
+    r, g, b = ImageColor.getrgb(color)[:3] if isinstance(color, str) else color[:3]
+    return f"&H{255 - alpha:02X}{b:02X}{g:02X}{r:02X}"
+
+
+def _ass_time(seconds):
+    cs = int(round(max(seconds, 0) * 100))
+    h, cs = divmod(cs, 360000)
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+
+
+def _ass_text(text):
+    return text.replace("\\", "\\\\").replace("{", "\\{").replace("}", "\\}").replace("\n", "\\N")
+
+
+def font_family_name(font_path=FONT_PATH):
+    try:
+        return ImageFont.truetype(font_path, 10).getname()[0]
+    except OSError:
+        return "Malgun Gothic"
+
+
+def write_ass_subtitles(timeline, ass_path, size=VIDEO_SIZE, font_size_scale=1.0, bottom_margin=SUBTITLE_BOTTOM_MARGIN):
+    """
+    타임라인 전체의 제목/자막을 ASS 파일 하나로 씁니다.
+    반환: 구간(인트로, 장면들)별 시작 시각 목록
+    """
+    W, H = size
+    font = font_family_name()
+    side_margin = int(W * 0.075)  # 화면 너비 85% 안에서 줄바꿈
+    box_alpha = SUBTITLE_BG_COLOR[3] if len(SUBTITLE_BG_COLOR) > 3 else 255
+    box_color = _ass_color(SUBTITLE_BG_COLOR, box_alpha)
+
+    header = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {W}",
+        f"PlayResY: {H}",
+        "WrapStyle: 0",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Title,{font},{int(TITLE_FONT_SIZE * font_size_scale)},{_ass_color('white')},&H000000FF,"
+        f"&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,5,{side_margin},{side_margin},0,1",
+        f"Style: Subtitle,{font},{int(SUBTITLE_FONT_SIZE * font_size_scale)},{_ass_color(SUBTITLE_COLOR)},&H000000FF,"
+        f"{box_color},{box_color},0,0,0,0,100,100,0,0,3,{SUBTITLE_BOX_PADDING},0,2,"
+        f"{side_margin},{side_margin},{bottom_margin},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+
+    events = []
+    offsets = []
+    t = 0.0
+    intro = timeline["intro"]
+    if intro:
+        offsets.append(t)
+        fade_ms = int(INTRO_FADE_IN * 1000)
+        events.append(
+            f"Dialogue: 0,{_ass_time(0)},{_ass_time(intro['duration'])},Title,,0,0,0,,"
+            f"{{\\fad({fade_ms},0)}}{_ass_text(timeline['title'])}"
+        )
+        t += intro["duration"]
+
+    for scene in timeline["scenes"]:
+        offsets.append(t)
+        for sub in scene["subtitles"]:
+            start = t + sub["start"]
+            events.append(
+                f"Dialogue: 0,{_ass_time(start)},{_ass_time(start + sub['duration'])},Subtitle,,0,0,0,,"
+                f"{_ass_text(sub['text'])}"
+            )
+        t += scene["duration"]
+
+    with open(ass_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(header + events) + "\n")
+    return offsets
+
+
+def _escape_filter_path(path):
+    # 필터 옵션 안에서는 ':' 와 '\' 를 이스케이프해야 함 (Windows 드라이브 문자 대비)
+    path = path.replace("\\", "/").replace(":", "\\:").replace("'", "\\'")
+    return f"'{path}'"
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 입력 목록 + 필터 그래프 조립
+# -------------------------------------------------------------------------
+def _fit_filter(spec, size):
+    """합성 해상도(size) -> 출력본 해상도 (같으면 없음)"""
+    W, H = spec["size"]
+    if (W, H) == tuple(size):
+        return ""
+    if spec["fit"] == "crop":
+        return f"scale={W}:{H}:force_original_aspect_ratio=increase,crop={W}:{H},setsar=1,"
+    return (f"scale={W}:{H}:force_original_aspect_ratio=decrease:force_divisible_by=2,"
+            f"pad={W}:{H}:(ow-iw)/2:(oh-ih)/2,setsar=1,")
+
+
+def build_filter_graph(timeline, outputs, size=VIDEO_SIZE, fps=VIDEO_FPS, vfr=USE_VFR):
+    """
+    outputs: [(출력본 설정, ASS 파일 이름), ...]
+    반환: (입력 인자 목록, filter_complex 문자열, [(비디오 출력 라벨, 오디오 출력 라벨), ...])
+    구간(인트로/장면)마다 비디오 1개 + 오디오 N개를 입력으로 받아
+    페이드인 -> concat 까지 한 번만 처리하고, 출력본이 여럿이면 split/asplit으로 나눠
+    출력본마다 크기 맞춤(crop/letterbox) -> ASS 자막만 따로 입힙니다. (추가 출력본은 인코딩 비용만 듦)
+    조립된 동화 트랙(timeline["audio_track"])이 있으면 오디오는 트랙에서 이 구간들만큼 잘라 쓴 입력 1개뿐입니다.
+    """
+    W, H = size
+    inputs = []
+    filters = []
+    v_labels = []
+    a_labels = []
+    audio_format = f"aformat=sample_fmts=fltp:sample_rates={AUDIO_SAMPLE_RATE}:channel_layouts=stereo"
+
+    def add_input(args):
+        inputs.extend(args)
+        return sum(1 for a in inputs if a == "-i") - 1
+
+    segments = []
+    if timeline["intro"]:
+        segments.append(("intro", timeline["intro"]))
+    segments.extend(("scene", scene) for scene in timeline["scenes"])
+    track = timeline.get("audio_track")
+
+    for seg_idx, (kind, seg) in enumerate(segments):
+        dur = seg["duration"]
+
+        # 1. 비디오: 인트로는 검은 배경, 장면은 정지 이미지 반복
+        if kind == "intro":
+            v_in = add_input(["-f", "lavfi", "-i", f"color=c=black:s={W}x{H}:r={fps}:d={dur:.3f}"])
+            filters.append(f"[{v_in}:v]format=yuv420p,fade=t=in:st=0:d={INTRO_FADE_IN}[v{seg_idx}]")
+            audio_paths = [seg["audio"]]
+        else:
+            v_in = add_input(["-loop", "1", "-framerate", str(fps), "-t", f"{dur:.3f}", "-i", os.path.abspath(seg["image"])])
+            filters.append(
+                f"[{v_in}:v]scale={W}:{H}:force_original_aspect_ratio=decrease,"
+                f"pad={W}:{H}:(ow-iw)/2:(oh-ih)/2,setsar=1,format=yuv420p,"
+                f"fade=t=in:st=0:d={SCENE_FADE_IN}[v{seg_idx}]"
+            )
+            audio_paths = [line["audio"] for line in seg["lines"]]
+        v_labels.append(f"[v{seg_idx}]")
+        if track:
+            continue
+
+        # 2. 오디오: 대사들을 이어 붙이고 구간 길이만큼 무음으로 채움
+        line_labels = []
+        for line_idx, audio_path in enumerate(audio_paths):
+            a_in = add_input(["-i", os.path.abspath(audio_path)])
+            label = f"[a{seg_idx}_{line_idx}]"
+            filters.append(f"[{a_in}:a]{audio_format}{label}")
+            line_labels.append(label)
+        if len(line_labels) > 1:
+            filters.append(f"{''.join(line_labels)}concat=n={len(line_labels)}:v=0:a=1[ac{seg_idx}]")
+            joined = f"[ac{seg_idx}]"
+        else:
+            joined = line_labels[0]
+        filters.append(f"{joined}apad=whole_dur={dur:.3f},atrim=end={dur:.3f}[a{seg_idx}]")
+        a_labels.append(f"[a{seg_idx}]")
+
+    # 3. 구간 연결 -> 출력본별 크기 맞춤 + 자막
+    n = len(segments)
+    filters.append(f"{''.join(v_labels)}concat=n={n}:v=1:a=0[vcat]")
+    fontsdir = _escape_filter_path(os.path.dirname(FONT_PATH) or ".")
+    if len(outputs) > 1:
+        filters.append(f"[vcat]split={len(outputs)}" + "".join(f"[vs{i}]" for i in range(len(outputs))))
+        v_sources = [f"[vs{i}]" for i in range(len(outputs))]
+    else:
+        v_sources = ["[vcat]"]
+    for i, ((spec, ass_name), v_src) in enumerate(zip(outputs, v_sources)):
+        video_chain = f"{v_src}{_fit_filter(spec, size)}subtitles={ass_name}:fontsdir={fontsdir}"
+        if vfr:
+            video_chain += f",{MPDECIMATE}"
+        filters.append(f"{video_chain}[vout{i}]")
+
+    if track:
+        # 부분 타임라인(구간 렌더링)도 트랙에서 첫 구간 위치부터 구간 길이 합만큼만 읽음
+        total = sum(seg["duration"] for _, seg in segments)
+        a_in = add_input(["-ss", f"{segments[0][1]['audio_start']:.3f}", "-t", f"{total:.3f}",
+                          "-i", os.path.abspath(track)])
+        filters.append(f"[{a_in}:a]{audio_format},apad=whole_dur={total:.3f},atrim=end={total:.3f}[aout]")
+    else:
+        filters.append(f"{''.join(a_labels)}concat=n={n}:v=0:a=1[aout]")
+    if len(outputs) > 1:
+        filters.append(f"[aout]asplit={len(outputs)}" + "".join(f"[aout{i}]" for i in range(len(outputs))))
+        a_outs = [f"[aout{i}]" for i in range(len(outputs))]
+    else:
+        a_outs = ["[aout]"]
+
+    return inputs, ";\n".join(filters), [(f"[vout{i}]", a_out) for i, a_out in enumerate(a_outs)]
+
+
+def encoder_args(fps=VIDEO_FPS, vfr=USE_VFR, preset=X264_PRESET, crf=X264_CRF, maxrate=None, bufsize=None):
+    """모든 FFmpeg 출력에서 같은 인코더 설정을 쓰기 위한 인자"""
+    args = [
+        "-c:v", "libx264", "-preset", preset, "-tune", "stillimage", "-crf", str(crf),
+        "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", AUDIO_BITRATE, "-ar", str(AUDIO_SAMPLE_RATE),
+        "-movflags", "+faststart",
+    ]
+    if maxrate:
+        # CRF는 유지하되 최대 비트레이트를 넘지 않게 (VBV)
+        args += ["-maxrate", maxrate, "-bufsize", bufsize or maxrate]
+    if vfr:
+        args += ["-fps_mode", "vfr"]
+    else:
+        args += ["-r", str(fps)]
+    return args
+
+
+def render_timeline(timeline, work_dir, outputs, name="story", fps=VIDEO_FPS, vfr=USE_VFR, threads=None):
+    """
+    타임라인(전체 또는 일부 구간)을 FFmpeg 한 번으로 렌더링합니다.
+    outputs: [(출력본 설정, 출력 경로), ...] -> 합성은 한 번, 출력본마다 인코딩만 따로 (반환: 출력 경로 목록)
+    name은 작업 폴더 안의 자막/필터 파일 이름 앞부분입니다. (구간별 병렬 렌더링 시 충돌 방지)
+    """
+    # 상대 경로로 넘기면 필터 안에서 경로 이스케이프가 필요 없음 (작업 폴더에서 실행)
+    graph_outputs = []
+    for spec, _ in outputs:
+        ass_name = f"{name}{spec['suffix']}.ass"
+        write_ass_subtitles(timeline, os.path.join(work_dir, ass_name), size=spec["size"],
+                            font_size_scale=spec["subtitle_scale"], bottom_margin=spec["subtitle_margin"])
+        graph_outputs.append((spec, ass_name))
+    inputs, graph, labels = build_filter_graph(timeline, graph_outputs, fps=fps, vfr=vfr)
+
+    graph_path = os.path.join(work_dir, f"{name}_filter_graph.txt")
+    with open(graph_path, "w", encoding="utf-8") as f:
+        f.write(graph)
+
+    cmd = [FFMPEG_BIN, "-y", "-hide_banner", "-loglevel", "error", *inputs, "-filter_complex_script", graph_path]
+    for (spec, output_path), (v_out, a_out) in zip(outputs, labels):
+        cmd += ["-map", v_out, "-map", a_out,
+                *encoder_args(fps=fps, vfr=vfr, preset=spec["preset"], crf=spec["crf"],
+                              maxrate=spec.get("maxrate"), bufsize=spec.get("bufsize"))]
+        if threads:
+            cmd += ["-threads", str(threads)]
+        cmd.append(os.path.abspath(output_path))
+    presets = ",".join(spec["preset"] for spec, _ in outputs)
+    with telemetry.span("encode.ffmpeg", segment=name, vfr=vfr, preset=presets, threads=threads,
+                        renditions=len(outputs)) as s:
+        subprocess.run(cmd, cwd=work_dir, check=True)
+        output_bytes = sum(os.path.getsize(path) for _, path in outputs)
+        s.set(output_bytes=output_bytes)
+    telemetry.count("bytes_written_total", output_bytes, stage="video")
+    return [path for _, path in outputs]
+
+
+# -------------------------------------------------------------------------
+# [메인 로직] FFmpeg 한 번으로 동화 영상 렌더링
+# -------------------------------------------------------------------------
+def render_story_ffmpeg(story_data, base_dir="output_assets", output_path=None,
+                        fps=VIDEO_FPS, vfr=USE_VFR, preset=X264_PRESET, renditions=VIDEO_RENDITIONS):
+    """
+    MoviePy 대신 FFmpeg 필터 그래프 한 번으로 영상을 만듭니다.
+    (정지 이미지 + 페이드인 + ASS 자막 + 오디오 연결, 프레임 합성은 모두 FFmpeg 내부에서 처리)
+    renditions의 출력본(가로 원본/세로 쇼츠/미리보기 등)을 같은 실행에서 함께 인코딩하며,
+    output_path는 main 출력본의 경로입니다. 반환: main(없으면 첫 출력본)의 경로
+    """
+    title = story_data['title']
+    print(f"🎬 [영상 편집 시작 - FFmpeg] '{title}'")
+
+    timeline = build_story_timeline(story_data, base_dir)
+    paths = timeline["paths"]
+    if not timeline["intro"] and not timeline["scenes"]:
+        print("❌ 생성할 클립이 없습니다.")
+        return None
+
+    names = parse_renditions(renditions)
+    specs = {name: rendition_spec(name, preset) for name in names}
+    output_paths = {name: os.path.abspath(rendition_path(paths, name)) for name in names}
+    if output_path and "main" in output_paths:
+        output_paths["main"] = os.path.abspath(output_path)
+    result_path = output_paths.get("main", output_paths[names[0]])
+    work_dir = os.path.join(paths["story_dir"], ".render")
+    os.makedirs(work_dir, exist_ok=True)
+
+    # 그림/음성/자막/인코더 설정이 지난번과 같은 출력본은 다시 렌더링하지 않음
+    story_dir = os.path.abspath(paths["story_dir"])
+    assets = load_asset_manifest(story_dir)
+    inputs = {name: render_inputs(timeline, backend="ffmpeg", fps=fps, vfr=vfr, preset=specs[name]["preset"],
+                                  crf=specs[name]["crf"], **rendition_inputs(name, specs[name]))
+              for name in names}
+    stale = [name for name in names
+             if not fresh_asset(assets, rendition_key(name), inputs[name], story_dir, output_paths[name])]
+    if not stale:
+        print(f"  👉 바뀐 자산이 없어 렌더링을 건너뜁니다. ({result_path})\n")
+        return result_path
+
+    print(f"  💾 렌더링 시작... (FFmpeg, 구간 {len(timeline['scenes']) + bool(timeline['intro'])}개, "
+          f"출력본 {', '.join(stale)})")
+    started = time.time()
+    try:
+        render_timeline(timeline, work_dir, [(specs[name], output_paths[name]) for name in stale], fps=fps, vfr=vfr)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"❌ 렌더링 실패: {e}")
+        return None
+    update_asset_manifest(story_dir, {rendition_key(name): asset_entry(output_paths[name], inputs[name], story_dir)
+                                      for name in stale})
+
+    print(f"🎉 영상 제작 성공! ({time.time() - started:.1f}초) \n📁 위치: {', '.join(output_paths[n] for n in stale)}\n")
+    return result_path
@@ -1,10 +1,17 @@
-import json
 import os
 import time
 import base64
+import hashlib
+import threading
 import requests
-import random  # ★ 랜덤 선택을 위해 추가
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from rate_limiter import RateLimiter, get_retry_after
+from content_cache import ContentCache
+from story_store import PROCESSED_STORE, iter_selected
+from asset_manifest import asset_entry, changed_inputs, fresh_asset, image_key, load_asset_manifest, update_asset_manifest
+import telemetry
 
 # 1. 환경변수 로드
 load_dotenv()
@@ -15,7 +22,26 @@ DEPLOYMENT_NAME = os.getenv("AZURE_IMAGE_DEPLOYMENT_NAME", "gpt-image-1.5")
 API_VERSION = "2024-02-15-preview" 
 
 # -------------------------------------------------------------------------
-# [설정] 다양한 아트 스타일 정의 (랜덤 선택용)
+# [설정] 동시 요청 수 / 재시도
+# -------------------------------------------------------------------------
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "3"))  # 동시에 진행할 이미지 요청 수
+IMAGE_RPM = int(os.getenv("IMAGE_RPM", "0"))  # 배포의 분당 요청 한도 (0이면 제한 없음)
+MAX_RETRIES = 5
+REQUEST_TIMEOUT = 300  # high 품질 이미지는 생성에 1분 이상 걸리기도 함
+DOWNLOAD_CHUNK = 1 << 16
+
+IMAGE_SIZE = "1536x1024"
+IMAGE_QUALITY = "high"
+
+# 생성 이미지 캐시 (전체 프롬프트 + 크기 + 품질 + 배포가 같으면 재사용)
+IMAGE_CACHE = ContentCache(
+    os.getenv("IMAGE_CACHE_DIR", os.path.join(".cache", "images")),
+    suffix=".png",
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_MB", "4096")) * 1024 * 1024,
+)
+
+# -------------------------------------------------------------------------
+# [설정] 다양한 아트 스타일 정의 (동화마다 original_seq 해시로 하나를 고정 선택)
 # -------------------------------------------------------------------------
 STYLE_OPTIONS = {
     "Watercolor": (
@@ -46,22 +72,152 @@ COMMON_SUFFIX = (
     "Pure illustration only. High quality, detailed."
 )
 
+
+class ImageGenerationError(Exception):
+    pass
+
+# -------------------------------------------------------------------------
+# [함수 1] 화풍 선택 / 캐시 키
+# -------------------------------------------------------------------------
+def select_style(story_data):
+    """
+    동화의 original_seq로 화풍을 정합니다.
+    (실행할 때마다 같은 화풍이 나오므로, 폴더를 지웠다 다시 만들어도 그림체가 바뀌지 않음)
+    """
+    seed = str(story_data.get('original_seq', story_data['title']))
+    names = list(STYLE_OPTIONS.keys())
+    digest = hashlib.sha256(seed.encode('utf-8')).hexdigest()
+    return names[int(digest, 16) % len(names)]
+
+
+def image_cache_key(full_prompt, size=IMAGE_SIZE, quality=IMAGE_QUALITY, deployment=DEPLOYMENT_NAME):
+    return ContentCache.make_key("images", full_prompt, size, quality, deployment)
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 공용 HTTP 세션 (Keep-Alive 연결 재사용)
+# -------------------------------------------------------------------------
+_session = None
+_session_lock = threading.Lock()
+_limiter = RateLimiter(rpm=IMAGE_RPM or None)
+# 프로세스 전체의 동시 요청 수 (이미지 단계 워커, 장면 미리 받기 워커가 동시에 여러 동화를 처리해도 IMAGE_CONCURRENCY개까지만)
+_slots = threading.BoundedSemaphore(IMAGE_CONCURRENCY)
+
+
+def set_concurrency(max_requests):
+    """동시 요청 수를 바꿉니다. (이미 진행 중인 요청은 예전 한도로 끝남)"""
+    global _slots
+    _slots = threading.BoundedSemaphore(max(1, max_requests))
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=IMAGE_CONCURRENCY, pool_maxsize=IMAGE_CONCURRENCY * 2)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+# -------------------------------------------------------------------------
+# [함수 3] 장면 1개 생성 (429/503이면 Retry-After 만큼 쉬고 재시도)
+# -------------------------------------------------------------------------
+def _write_atomic(filepath, chunks):
+    tmp_path = f"{filepath}.tmp"
+    written = 0
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            if chunk:
+                f.write(chunk)
+                written += len(chunk)
+    os.replace(tmp_path, filepath)
+    telemetry.count("bytes_written_total", written, stage="images")
+    return written
+
+
+def request_scene_image(api_url, headers, payload, filepath, label=""):
+    """이미지 1장을 생성해 filepath에 저장합니다. 성공하면 True"""
+    session = get_session()
+    filename = os.path.basename(filepath)
+
+    for attempt in range(MAX_RETRIES + 1):
+        _limiter.acquire()
+        try:
+            with _slots, telemetry.span("api.image", file=filename, attempt=attempt) as s:
+                response = session.post(api_url, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
+                s.set(status=response.status_code, response_bytes=len(response.content))
+        except requests.RequestException as e:
+            if attempt == MAX_RETRIES:
+                print(f"  ❌ 에러: {e}")
+                break
+            telemetry.count("api_retries_total", service="images", reason="connection")
+            delay = get_retry_after(None, attempt)
+            print(f"  ❌ 에러: {e} ({delay:.1f}초 후 재시도)")
+            time.sleep(delay)
+            continue
+
+        if response.status_code in (429, 503):
+            if attempt == MAX_RETRIES:
+                break  # 마지막 시도였으면 더 기다리지 않고 포기
+            # 고정 쿨타임 대신 서비스가 알려준 시간만큼만 모든 요청을 멈춤
+            delay = get_retry_after(response.headers, attempt)
+            telemetry.count("api_retries_total", service="images", reason=str(response.status_code))
+            print(f"  ⏳ 요청 한도 초과 {label} - {delay:.1f}초 후 재시도 [{attempt+1}/{MAX_RETRIES}]")
+            _limiter.penalize(delay)
+            continue
+
+        if response.status_code != 200:
+            print(f"  ❌ API 에러 {label}: {response.text}")
+            return False
+
+        result = response.json()
+        data_item = result['data'][0]
+
+        if 'b64_json' in data_item and data_item['b64_json']:
+            _write_atomic(filepath, [base64.b64decode(data_item['b64_json'])])
+            print(f"  ✅ 저장 완료: {filename}")
+            return True
+
+        if 'url' in data_item and data_item['url']:
+            # 이미지 전체를 메모리에 올리지 않고 조금씩 받아서 저장
+            with _slots, telemetry.span("api.image_download", file=filename) as s, \
+                    session.get(data_item['url'], stream=True, timeout=REQUEST_TIMEOUT) as img_res:
+                img_res.raise_for_status()
+                s.set(bytes=_write_atomic(filepath, img_res.iter_content(chunk_size=DOWNLOAD_CHUNK)))
+            print(f"  ✅ 저장 완료: {filename}")
+            return True
+
+        print(f"  ⚠️ 이미지 데이터 없음: {result}")
+        return False
+
+    print(f"  ❌ 재시도 횟수 초과 {label}")
+    return False
+
+
 # -------------------------------------------------------------------------
-# [함수] 이미지 생성 (Raw API 사용)
+# [함수 4] 이미지 생성 (Raw API 사용)
 # -------------------------------------------------------------------------
-def generate_images_for_story(story_data, output_base_dir="output_assets"):
+@telemetry.traced("story.images", attrs=telemetry.story_attrs)
+def generate_images_for_story(story_data, output_base_dir="output_assets", max_workers=IMAGE_CONCURRENCY, prune=True):
+    """prune=False: 장면 일부만 담은 동화(각색 스트림에서 미리 받은 장면)라 다른 장면의 그림을 지우지 않음"""
     title = story_data['title']
     safe_title = "".join([c for c in title if c.isalnum() or c in (' ', '_')]).strip()
     
-    save_dir = os.path.join(output_base_dir, safe_title, "images")
+    story_dir = os.path.join(output_base_dir, safe_title)
+    save_dir = os.path.join(story_dir, "images")
     os.makedirs(save_dir, exist_ok=True)
     
-    # ★ 1. 동화별로 스타일 하나를 랜덤으로 뽑음 (여기서 뽑아야 동화 내내 통일됨)
-    selected_style_name = random.choice(list(STYLE_OPTIONS.keys()))
+    # ★ 1. 동화별로 스타일 하나를 고름 (seq 기반이라 재실행해도 같은 화풍, 동화 내내 통일됨)
+    selected_style_name = select_style(story_data)
     selected_style_prompt = STYLE_OPTIONS[selected_style_name]
     
     print(f"🎨 [이미지 생성 시작] '{title}'")
     print(f"✨ 이번 동화의 화풍: {selected_style_name}")  # 로그로 확인 가능
+
+    if not API_KEY or not ENDPOINT:
+        raise ImageGenerationError(".env 파일에 AZURE_API_KEY 또는 AZURE_ENDPOINT가 없습니다.")
     
     scenes = story_data.get('scenes', [])
     total_scenes = len(scenes)
@@ -75,66 +231,86 @@ def generate_images_for_story(story_data, output_base_dir="output_assets"):
         "Content-Type": "application/json"
     }
 
+    # 자산 매니페스트: 장면별 (화풍, 장면 묘사, 크기, 품질, 배포) 해시 -> 그대로인 장면은 건너뜀
+    manifest = load_asset_manifest(story_dir)
+    image_keys = []
+    entries = {}
+    reused = 0
+
+    jobs = []
     for scene in scenes:
         scene_num = scene['scene_num']
         visual_prompt = scene['visual_prompt']
         
-        # ★ 2. 프롬프트 조합: [랜덤 스타일] + [장면 묘사] + [글자 금지 공통]
+        # ★ 2. 프롬프트 조합: [스타일] + [장면 묘사] + [글자 금지 공통]
         full_prompt = f"{selected_style_prompt} {visual_prompt}. {COMMON_SUFFIX}"
         
         filename = f"S{scene_num:02d}.png"
         filepath = os.path.join(save_dir, filename)
+        asset_key = image_key(scene_num)
+        inputs = {
+            "style": selected_style_prompt, "visual_prompt": visual_prompt, "suffix": COMMON_SUFFIX,
+            "size": IMAGE_SIZE, "quality": IMAGE_QUALITY, "deployment": DEPLOYMENT_NAME,
+        }
+        image_keys.append(asset_key)
+        if fresh_asset(manifest, asset_key, inputs, story_dir, filepath):
+            reused += 1
+            continue
+        if asset_key in manifest:
+            print(f"  🔄 장면 {scene_num} 다시 생성 (바뀐 입력: {', '.join(changed_inputs(manifest, asset_key, inputs))})")
         
-        if os.path.exists(filepath):
+        # 프롬프트가 그대로면 캐시에서 연결만 하고 건너뜀 (바뀐 장면만 다시 생성)
+        cache_key = image_cache_key(full_prompt)
+        if IMAGE_CACHE.materialize(cache_key, filepath):
+            telemetry.count("cache_hits_total", cache="images")
+            entries[asset_key] = asset_entry(filepath, inputs, story_dir)
             # print(f"  👉 [Skip] {filename}")
             continue
 
-        print(f"  🖌️ [{selected_style_name}] 그리는 중... [장면 {scene_num}/{total_scenes}]")
-
         payload = {
             "prompt": full_prompt,
-            "size": "1536x1024",
+            "size": IMAGE_SIZE,
             "n": 1,
-            "quality": "high"  
+            "quality": IMAGE_QUALITY
         }
+        jobs.append((scene_num, payload, filepath, cache_key, asset_key, inputs))
 
+    # ★ 3. 장면들을 max_workers개씩 동시에 요청 (같은 세션의 연결 풀 공유, 전체 동시 요청 수는 _slots가 제한)
+    def run_job(scene_num, payload, filepath, cache_key, asset_key, inputs):
+        print(f"  🖌️ [{selected_style_name}] 그리는 중... [장면 {scene_num}/{total_scenes}]")
         try:
-            response = requests.post(api_url, headers=headers, json=payload)
-            
-            if response.status_code != 200:
-                print(f"  ❌ API 에러 (장면 {scene_num}): {response.text}")
-                continue
-                
-            result = response.json()
-            data_item = result['data'][0]
-            
-            if 'b64_json' in data_item and data_item['b64_json']:
-                with open(filepath, 'wb') as f:
-                    f.write(base64.b64decode(data_item['b64_json']))
-                print(f"  ✅ 저장 완료: {filename}")
-                
-            elif 'url' in data_item and data_item['url']:
-                img_res = requests.get(data_item['url'])
-                with open(filepath, 'wb') as f:
-                    f.write(img_res.content)
-                print(f"  ✅ 저장 완료: {filename}")
-                
-            else:
-                print(f"  ⚠️ 이미지 데이터 없음: {result}")
-
-            time.sleep(5) # 쿨타임
-
+            with telemetry.span("image.scene", story=title, scene=scene_num):
+                if not request_scene_image(api_url, headers, payload, filepath, label=f"(장면 {scene_num})"):
+                    return False
+            ContentCache.link_file(IMAGE_CACHE.put_file(cache_key, filepath), filepath)
+            entries[asset_key] = asset_entry(filepath, inputs, story_dir)
+            return True
         except Exception as e:
             print(f"  ❌ 에러: {e}")
-            time.sleep(5)
+            return False
 
-    print(f"🎉 '{title}' 완료! (스타일: {selected_style_name})\n")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(lambda job: run_job(*job), jobs))
+
+    # 대본에서 빠진 장면의 그림은 매니페스트와 폴더에서 지움
+    update_asset_manifest(story_dir, entries, prune_prefix="image/" if prune else None, keep=image_keys)
+    # 그림이 빠진 장면은 영상에서 통째로 빠지므로 실패로 알림 (스케줄러가 영상 단계를 건너뜀)
+    if not all(results):
+        raise ImageGenerationError(f"'{title}' 장면 {len(jobs) - sum(results)}/{len(jobs)}개 생성 실패")
+    print(f"🎉 '{title}' 완료! (스타일: {selected_style_name}, 생성 {sum(results)}/{len(jobs)}, 재사용 {reused})\n")
+
+def main(source=PROCESSED_STORE, ids=None, titles=None, since=None, limit=None):
+    if not os.path.exists(source):
+        print("❌ 각색 저장소(또는 JSON 파일)가 없습니다.")
+        return
+    # 고른 동화만 한 편씩 읽어서 처리 (전체 파일을 올리지 않음)
+    for story in iter_selected(source, ids=ids, titles=titles, since=since, limit=limit):
+        try:
+            generate_images_for_story(story)
+        except ImageGenerationError as e:
+            print(f"❌ {e}")
 
 # --- 단독 실행 테스트용 ---
 if __name__ == "__main__":
-    if os.path.exists("processed_stories.json"):
-        with open("processed_stories.json", 'r', encoding='utf-8') as f:
-            stories = json.load(f)
-            # 테스트로 1개만 돌려보기
-            for story in stories[:1]:
-                generate_images_for_story(story)
\ No newline at end of file
+    # 테스트로 1개만 돌려보기
+    main(limit=1)
\ No newline at end of file
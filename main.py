@@ -1,110 +1,234 @@
 import os
-import json
-import time
-import subprocess
+import sys
+import argparse
+from functools import partial
 from dotenv import load_dotenv
+import telemetry
+from story_store import PROCESSED_STORE
 
-# 각 모듈에서 핵심 함수들 임포트
-# (주의: 아래 파일들이 같은 폴더에 있어야 합니다)
-try:
-    from story_processor import process_crawled_data
-    from tts_generator import generate_tts_for_story
-    from image_generator import generate_images_for_story
-    from video_generator import create_video_for_story # ★ 추가됨
-except ImportError as e:
-    print(f"❌ 필수 모듈을 찾을 수 없습니다: {e}")
-    print("crawl.py, story_processor.py, tts_generator.py, image_generator.py 파일이 모두 있는지 확인해주세요.")
-    exit()
+# 무거운 모듈(MoviePy/NumPy/PIL, Speech SDK, OpenAI 클라이언트)은 해당 단계를 실행할 때만 임포트
+# (도움말 출력이나 크롤링만 할 때 몇 초씩 걸리던 임포트 시간을 없앰)
 
 # 환경변수 로드
 load_dotenv()
 
-def run_pipeline(limit=None):
+# -------------------------------------------------------------------------
+# [함수 1] 단계별 실행
+# -------------------------------------------------------------------------
+def run_crawl(workers=None, refresh=False):
+    """크롤링을 같은 프로세스에서 실행 (예전에는 python crawl.py를 subprocess로 실행)"""
+    from crawl import crawl
+    options = {"refresh": refresh}
+    if workers:
+        options["max_workers"] = workers
+    return crawl(**options)
+
+
+def run_adapt(limit=None, workers=None, ids=None, titles=None, since=None):
+    from story_processor import process_crawled_data
+    options = {"workers": workers} if workers else {}
+    process_crawled_data(limit=limit, ids=ids, titles=titles, since=since, **options)
+
+
+def iter_stories(source=PROCESSED_STORE, ids=None, titles=None, since=None, limit=None):
+    from story_store import iter_selected
+    if not os.path.exists(source):
+        print("❌ 각색 저장소(또는 JSON 파일)가 없습니다. (먼저 adapt 단계를 실행하세요)")
+        return
+    yield from iter_selected(source, ids=ids, titles=titles, since=since, limit=limit)
+
+
+def run_tts(concurrency=None, **selection):
+    from tts_generator import generate_tts_for_story
+    from speech_engine import SpeechEngine, SynthesisError, audio_cache, set_engine
+    if concurrency:
+        set_engine(SpeechEngine(max_concurrency=concurrency))
+    for story in iter_stories(**selection):
+        try:
+            generate_tts_for_story(story)
+        except SynthesisError as e:
+            print(f"❌ {e}")
+    cache = audio_cache()
+    if cache is not None:
+        cache.evict()
+
+
+def run_images(concurrency=None, **selection):
+    from image_generator import IMAGE_CONCURRENCY, ImageGenerationError, generate_images_for_story, set_concurrency
+    if concurrency:
+        set_concurrency(concurrency)
+    for story in iter_stories(**selection):
+        try:
+            generate_images_for_story(story, max_workers=concurrency or IMAGE_CONCURRENCY)
+        except ImageGenerationError as e:
+            print(f"❌ {e}")
+
+
+def run_render(backend=None, renditions=None, **selection):
+    from video_generator import RENDER_BACKEND, create_video_for_story
+    for story in iter_stories(**selection):
+        create_video_for_story(story, backend=backend or RENDER_BACKEND, renditions=renditions)
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 전체 파이프라인 (크롤링 -> 각색 -> 음성/삽화 -> 영상)
+# -------------------------------------------------------------------------
+def run_pipeline(limit=None, story_workers=None, render_video=True, ids=None, titles=None, since=None,
+                 skip_crawl=False, backend=None, renditions=None):
+    """
+    ids("12,40-45"), titles(제목 목록), since("6h", "2026-10-01")를 주면 해당 동화만 처리합니다.
+    """
+    from story_processor import LLM_STREAM, process_crawled_data
+    from tts_generator import generate_tts_for_story
+    from image_generator import generate_images_for_story
+    from pipeline_scheduler import StoryScheduler
+    from story_store import crawled_store
+
     print("="*60)
     print(f"🚀 전래동화 유튜브 자동 제작 파이프라인 가동 (Limit: {limit if limit else 'All'})")
+    if ids or titles or since:
+        print(f"   🎯 선택: seq={ids or '-'}, 제목={titles or '-'}, 변경 기준={since or '-'}")
     print("="*60)
 
     # ---------------------------------------------------------
     # [Step 1] 크롤링 (Data Crawling)
     # ---------------------------------------------------------
     print("\n[Step 1/3] 동화 데이터 크롤링 시작...")
-    
-    # crawl.py는 함수가 아니라 스크립트 형태이므로 subprocess로 실행
-    try:
-        if os.path.exists("fairy_tales.json"):
-            print("   👉 기존 'fairy_tales.json' 파일이 있어 크롤링을 건너뜁니다. (새로 하려면 파일 삭제)")
-        else:
-            subprocess.run(["python", "crawl.py"], check=True)
-            print("   ✅ 크롤링 완료!")
-    except subprocess.CalledProcessError as e:
-        print(f"   ❌ 크롤링 중 에러 발생: {e}")
-        return
 
-    # ---------------------------------------------------------
-    # [Step 2] GPT-5 시나리오 분석 (Scenario Processing)
-    # ---------------------------------------------------------
-    print("\n[Step 2/3] GPT-5 시나리오 각색 시작...")
-    
-    input_crawl_file = "fairy_tales.json"
-    output_processed_file = "processed_stories.json"
-
-    # story_processor 모듈의 함수 호출
-    process_crawled_data(input_crawl_file, output_processed_file, limit=limit)
+    store = crawled_store()
+    if skip_crawl:
+        print(f"   👉 크롤링을 건너뜁니다. (저장소 {store.root}: {len(store)}편)")
+    elif len(store):
+        print(f"   👉 크롤링 저장소({store.root})에 {len(store)}편이 있어 크롤링을 건너뜁니다. (새로 하려면 crawl 명령)")
+    else:
+        try:
+            run_crawl()
+            print("   ✅ 크롤링 완료!")
+        except Exception as e:
+            print(f"   ❌ 크롤링 중 에러 발생: {e}")
+            return
 
     # ---------------------------------------------------------
-    # [Step 3] 자산 생성 (TTS & Image Generation)
+    # [Step 2~4] 각색 -> (음성 + 삽화 동시) -> 영상, 동화 한 편 단위로 흘려보내기
     # ---------------------------------------------------------
-    print("\n[Step 3/3] 미디어 자산(음성/이미지) 생성 시작...")
-
-    if not os.path.exists(output_processed_file):
-        print(f"❌ {output_processed_file} 파일이 없어 중단합니다.")
-        return
-
-    with open(output_processed_file, 'r', encoding='utf-8') as f:
-        stories = json.load(f)
-
-    total_stories = len(stories)
-    print(f"📚 총 {total_stories}편의 동화에 대해 자산 생성을 시작합니다.\n")
-
-    for idx, story in enumerate(stories):
-        title = story.get('title', 'Untitled')
-        print(f"🎬 [{idx+1}/{total_stories}] '{title}' 제작 중...")
-
-        # 3-1. TTS 생성 (Azure Speech)
-        print(f"   🎙️ 음성(TTS) 생성 진입...")
-        generate_tts_for_story(story)
-
-        # 3-2. 이미지 생성 (DALL-E 3 / GPT-Image)
-        print(f"   🎨 삽화(Image) 생성 진입...")
-        generate_images_for_story(story)
-        
-        print(f"   ✨ '{title}' 자산 생성 완료!\n")
-        
-        # API 과부하 방지를 위한 쿨타임
-        time.sleep(2)
+    # 전체 각색이 끝나길 기다리지 않고, 시나리오가 나온 동화부터 바로 다음 단계로 넘김
+    # (단계마다 대기열/작업 수가 따로 있어서 LLM, TTS, 이미지, 렌더링이 동시에 돌아감)
+    print("\n[Step 2/3] GPT-5 시나리오 각색 + 미디어 자산(음성/이미지) + 영상 제작 시작...")
+
+    video_fn = None
+    if render_video:
+        from video_generator import RENDER_BACKEND, create_video_for_story
+        video_fn = partial(create_video_for_story, backend=backend or RENDER_BACKEND, renditions=renditions)
+
+    # 각색 응답을 스트리밍으로 받으면, 먼저 완성된 장면의 음성/그림은 각색이 끝나기 전에 만들기 시작
+    scene_fns = None
+    if LLM_STREAM:
+        scene_fns = [partial(generate_tts_for_story, prune=False), partial(generate_images_for_story, prune=False)]
+    scheduler = StoryScheduler(
+        tts_fn=generate_tts_for_story,
+        image_fn=generate_images_for_story,
+        video_fn=video_fn,
+        scene_fns=scene_fns,
+    )
+
+    # story_processor 모듈의 함수 호출 (story_workers개 동시 각색, 미지정 시 STORY_WORKERS 환경변수)
+    try:
+        selection = {"limit": limit, "ids": ids, "titles": titles, "since": since,
+                     "on_scene": scheduler.submit_scene if scene_fns else None, "on_discard": scheduler.discard}
+        if story_workers:
+            process_crawled_data(workers=story_workers, on_story=scheduler.submit, **selection)
+        else:
+            process_crawled_data(on_story=scheduler.submit, **selection)
+    finally:
+        # 이미 대기열에 들어간 동화는 끝까지 처리
+        print("\n[Step 3/3] 남은 음성/이미지/영상 작업 마무리 중...")
+        summary = scheduler.finish()
 
     print("="*60)
-    print("🎉 모든 작업이 성공적으로 완료되었습니다!")
+    print(f"🎉 총 {summary['submitted']}편 중 {summary['completed']}편 완료! ({summary['elapsed']:.0f}초)")
+    for line in summary["stages"]:
+        print(f"   ⏱️ {line}")
     print(f"📂 결과물 위치: {os.path.abspath('output_assets')}")
+    metrics_path = telemetry.export_metrics()
+    if metrics_path:
+        print(f"📈 단계별 지표: {metrics_path} (구간 기록: {telemetry.TRACE_FILE})")
     print("="*60)
+    print("🎉 대장정 종료! output_assets 폴더를 확인하세요.")
 
-    # ---------------------------------------------------------
-    # [Step 4] 영상 편집 (Video Editing)
-    # ---------------------------------------------------------
-    # print("\n[Step 4/4] 최종 동영상 편집 시작...")
-    
-    # for idx, story in enumerate(stories):
-    #     title = story.get('title', 'Untitled')
-    #     # 4-1. 비디오 생성
-    #     create_video_for_story(story)
-        
-    #     print(f"   ✨ '{title}' 모든 작업 완료!")
-    #     time.sleep(1)
+# -------------------------------------------------------------------------
+# [메인] 명령줄 (python main.py [crawl|adapt|tts|images|render|all] ...)
+# -------------------------------------------------------------------------
+def parse_args(argv=None):
+    selection = argparse.ArgumentParser(add_help=False)
+    selection.add_argument("--ids", help="처리할 seq (예: 12,40-45)")
+    selection.add_argument("--title", dest="titles", action="append", help="처리할 동화 제목 (여러 번 지정 가능)")
+    selection.add_argument("--since", help="이 시각 이후 바뀐 동화만 (예: 6h, 2026-10-01)")
+    selection.add_argument("--limit", type=int, help="최대 처리 편수")
+    source = argparse.ArgumentParser(add_help=False)
+    source.add_argument("--source", default=PROCESSED_STORE, help="각색 저장소 (또는 JSON 파일)")
+    render = argparse.ArgumentParser(add_help=False)
+    render.add_argument("--backend", choices=["moviepy", "ffmpeg", "segments"], help="렌더링 엔진 (기본: RENDER_BACKEND)")
+    render.add_argument("--renditions", help="함께 만들 출력본 (예: main,shorts,preview)")
+
+    parser = argparse.ArgumentParser(description="전래동화 유튜브 영상 자동 제작 (명령 없이 실행하면 all)")
+    commands = parser.add_subparsers(dest="command")
+
+    p = commands.add_parser("crawl", help="동화 원문 크롤링")
+    p.add_argument("--workers", type=int, help="동시 요청 수")
+    p.add_argument("--refresh", action="store_true", help="이미 받은 동화도 변경 여부를 확인해서 다시 받기")
+
+    p = commands.add_parser("adapt", parents=[selection], help="GPT 시나리오 각색")
+    p.add_argument("--workers", type=int, help="동시 각색 편수 (기본: STORY_WORKERS)")
+
+    p = commands.add_parser("tts", parents=[selection, source], help="대사 음성 생성")
+    p.add_argument("--concurrency", type=int, help="동시 합성 수 (기본: TTS_CONCURRENCY)")
+
+    p = commands.add_parser("images", parents=[selection, source], help="장면 삽화 생성")
+    p.add_argument("--concurrency", type=int, help="동시 이미지 요청 수 (기본: IMAGE_CONCURRENCY)")
+
+    commands.add_parser("render", parents=[selection, source, render], help="영상 렌더링")
+
+    p = commands.add_parser("all", parents=[selection, render], help="전체 파이프라인 (기본)")
+    p.add_argument("--workers", type=int, help="동시 각색 편수 (기본: STORY_WORKERS)")
+    p.add_argument("--skip-crawl", action="store_true", help="크롤링 단계 건너뛰기")
+    p.add_argument("--no-video", action="store_true", help="음성/삽화까지만 만들기")
+
+    # 명령 없이 옵션만 주면(python main.py --limit 1) 전체 파이프라인
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or (argv[0] not in commands.choices and argv[0] not in ("-h", "--help")):
+        argv = ["all"] + argv
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    picked = {"ids": args.ids, "titles": args.titles, "since": args.since, "limit": args.limit} \
+        if args.command != "crawl" else {}
+    try:
+        if args.command == "crawl":
+            run_crawl(workers=args.workers, refresh=args.refresh)
+        elif args.command == "adapt":
+            run_adapt(workers=args.workers, **picked)
+        elif args.command == "tts":
+            run_tts(concurrency=args.concurrency, source=args.source, **picked)
+        elif args.command == "images":
+            run_images(concurrency=args.concurrency, source=args.source, **picked)
+        elif args.command == "render":
+            run_render(backend=args.backend, renditions=args.renditions, source=args.source, **picked)
+        else:
+            run_pipeline(story_workers=args.workers, render_video=not args.no_video, skip_crawl=args.skip_crawl,
+                         backend=args.backend, renditions=args.renditions, **picked)
+    except ImportError as e:
+        # 단계마다 필요한 패키지만 임포트하므로 빠진 패키지는 그 단계를 실행할 때 알려줌
+        print(f"❌ 필수 모듈을 찾을 수 없습니다: {e}")
+        print("이 단계에 필요한 패키지(moviepy, openai, azure-cognitiveservices-speech 등)를 설치해주세요.")
+        return 1
+    except ValueError as e:
+        # 잘못된 선택 조건 (--ids 형식, 파일 소스에 --since 등)
+        print(f"❌ {e}")
+        return 1
+    return 0
 
-    print("="*60)
-    print("🎉 대장정 종료! output_assets 폴더를 확인하세요.")
 
 if __name__ == "__main__":
-    # 테스트를 위해 1개만 실행하려면 숫자를 넣으세요 (예: run_pipeline(limit=1))
-    # 전체를 다 하려면 run_pipeline() 또는 run_pipeline(limit=None)
-    run_pipeline(limit=None)
\ No newline at end of file
+    raise SystemExit(main())
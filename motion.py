@@ -0,0 +1,145 @@
+import os
+from functools import lru_cache
+import numpy as np
+from PIL import Image
+
+# -------------------------------------------------------------------------
+# [설정] 장면 카메라 움직임 (Ken Burns: 천천히 확대/축소/이동)
+# -------------------------------------------------------------------------
+MOTION_ZOOM = float(os.getenv("MOTION_ZOOM", "1.08"))  # 가장 가까이 갔을 때 배율 (1.08 = 8% 확대)
+MOTION_KINDS = ("zoom_in", "pan_right", "zoom_out", "pan_left")
+IMAGE_BUFFER_CACHE = 4  # 동시에 메모리에 올려둘 장면 이미지 수
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 이미지 디코딩 (장면당 한 번) -> 누적합 테이블
+# -------------------------------------------------------------------------
+@lru_cache(maxsize=IMAGE_BUFFER_CACHE)
+def summed_area_table(image_path):
+    """
+    RGB 이미지를 한 번만 읽어서 누적합 테이블(SAT)로 만듭니다. 반환 shape: (H+1, W+1, 3)
+    uint32로 충분함 (1536x1024x255 < 2^32), 사각형 합은 모듈러 연산이라 뺄셈이 넘쳐도 결과는 정확함
+    """
+    with Image.open(image_path) as img:
+        rgb = np.asarray(img.convert("RGB"), dtype=np.uint32)
+    h, w, _ = rgb.shape
+    sat = np.zeros((h + 1, w + 1, 3), dtype=np.uint32)
+    np.cumsum(rgb, axis=0, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    sat.setflags(write=False)  # 여러 클립이 공유하므로 읽기 전용
+    return sat
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 프레임별 잘라낼 영역 미리 계산
+# -------------------------------------------------------------------------
+def _ease(t):
+    # 시작/끝이 부드러운 smoothstep
+    return t * t * (3 - 2 * t)
+
+
+def motion_windows(src_size, out_size, n_frames, kind="zoom_in", zoom=MOTION_ZOOM):
+    """
+    프레임마다 원본에서 잘라낼 영역 (x0, y0, w, h)을 계산합니다. 반환 shape: (n_frames, 4)
+    영역의 가로세로 비율은 출력 해상도와 같게 맞춥니다.
+    """
+    src_w, src_h = src_size
+    out_w, out_h = out_size
+    # 원본 안에 들어가는 가장 큰 출력 비율 영역 (배율 1.0)
+    full_w = min(src_w, src_h * out_w / out_h)
+    full_h = full_w * out_h / out_w
+
+    t = _ease(np.linspace(0.0, 1.0, max(n_frames, 1)))
+    if kind == "zoom_in":
+        scale = 1.0 + (zoom - 1.0) * t
+    elif kind == "zoom_out":
+        scale = zoom - (zoom - 1.0) * t
+    else:
+        scale = np.full_like(t, zoom)
+
+    w = full_w / scale
+    h = full_h / scale
+    if kind == "pan_right":
+        x0 = (src_w - w) * t
+    elif kind == "pan_left":
+        x0 = (src_w - w) * (1.0 - t)
+    else:
+        x0 = (src_w - w) / 2
+    y0 = (src_h - h) / 2
+    return np.stack([x0, y0, w, h], axis=1)
+
+
+def _sample_edges(start, length, n_out, limit):
+    """출력 픽셀 n_out개가 덮는 원본 구간 [시작, 끝) (최소 1픽셀, 확대 시에는 최근접 픽셀)"""
+    pos = start + np.arange(n_out + 1) * (length / n_out)
+    begin = np.clip(np.floor(pos[:-1]).astype(np.int32), 0, limit - 1)
+    end = np.clip(np.floor(pos[1:]).astype(np.int32), 0, limit)
+    end = np.maximum(end, begin + 1)
+    return begin, end
+
+
+# -------------------------------------------------------------------------
+# [클래스] 움직이는 장면 프레임 생성기
+# -------------------------------------------------------------------------
+class KenBurns:
+    """
+    장면 이미지 1장에 카메라 움직임을 입혀 프레임을 만듭니다.
+    - 이미지는 누적합 테이블로 한 번만 디코딩 (같은 이미지는 캐시에서 공유)
+    - 프레임별 샘플링 구간(행/열 인덱스)은 생성할 때 모두 계산해 둠
+    - 프레임 1장 = 누적합 행/열 조회 + 면적 나누기 (NumPy 벡터 연산, 픽셀 단위 파이썬 루프 없음)
+    """
+
+    def __init__(self, image_path, duration, out_size, fps, kind="zoom_in", zoom=MOTION_ZOOM):
+        self.sat = summed_area_table(image_path)
+        self.out_size = out_size
+        self.fps = fps
+        self.n_frames = max(1, int(round(duration * fps)))
+
+        src_h, src_w = self.sat.shape[0] - 1, self.sat.shape[1] - 1
+        out_w, out_h = out_size
+        windows = motion_windows((src_w, src_h), out_size, self.n_frames, kind, zoom)
+
+        self.x0 = np.empty((self.n_frames, out_w), np.int32)
+        self.x1 = np.empty((self.n_frames, out_w), np.int32)
+        self.y0 = np.empty((self.n_frames, out_h), np.int32)
+        self.y1 = np.empty((self.n_frames, out_h), np.int32)
+        for i, (x, y, w, h) in enumerate(windows):
+            self.x0[i], self.x1[i] = _sample_edges(x, w, out_w, src_w)
+            self.y0[i], self.y1[i] = _sample_edges(y, h, out_h, src_h)
+        # 나누기 대신 곱하기 (면적의 역수)
+        self.inv_w = (1.0 / (self.x1 - self.x0)).astype(np.float32)
+        self.inv_h = (1.0 / (self.y1 - self.y0)).astype(np.float32)
+
+        self._last_index = None
+        self._last_frame = None
+
+    def frame(self, index):
+        """index번째 프레임 (H, W, 3) uint8"""
+        index = min(max(int(index), 0), self.n_frames - 1)
+        if index == self._last_index:
+            # 합성 과정에서 같은 시각을 여러 번 요청하는 경우 재사용
+            return self._last_frame
+
+        # 세로/가로를 나눠서 조회 (행 단위 조회는 연속 메모리 복사라 2차원 팬시 인덱싱보다 빠름)
+        rows = np.take(self.sat, self.y1[index], axis=0)
+        rows -= np.take(self.sat, self.y0[index], axis=0)
+        box = np.take(rows, self.x1[index], axis=1)
+        box -= np.take(rows, self.x0[index], axis=1)
+
+        pixels = box.astype(np.float32)
+        pixels *= self.inv_h[index][:, None, None]
+        pixels *= self.inv_w[index][None, :, None]
+        pixels += 0.5
+        frame = pixels.astype(np.uint8)
+
+        self._last_index, self._last_frame = index, frame
+        return frame
+
+    def frame_at(self, t):
+        """MoviePy make_frame 용 (t: 초)"""
+        return self.frame(t * self.fps + 1e-6)
+
+
+def motion_for_scene(scene_num):
+    """장면 번호로 움직임 종류를 돌아가며 고름 (재렌더링해도 같은 움직임)"""
+    return MOTION_KINDS[(scene_num - 1) % len(MOTION_KINDS)]
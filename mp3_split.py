@@ -0,0 +1,91 @@
+# -------------------------------------------------------------------------
+# [설정] MP3 프레임 헤더 테이블 (Layer III)
+# -------------------------------------------------------------------------
+# 비트레이트(kbps): [MPEG-1, MPEG-2/2.5]
+BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# 샘플레이트(Hz): 버전 비트(0=2.5, 2=2, 3=1) 기준
+SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+
+def _skip_id3(data):
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return 10 + size
+    return 0
+
+
+def iter_frames(data):
+    """
+    MP3(Layer III) 바이트열을 프레임 단위로 나눕니다.
+    반환: (시작 위치, 프레임 길이, 프레임 재생 시간(초)) 튜플들
+    """
+    pos = _skip_id3(data)
+    n = len(data)
+    while pos + 4 <= n:
+        b1, b2 = data[pos + 1], data[pos + 2]
+        if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+            pos += 1  # 싱크가 아니면 한 바이트씩 밀어서 다시 찾기
+            continue
+        version = (b1 >> 3) & 0x03
+        layer = (b1 >> 1) & 0x03
+        bitrate_idx = (b2 >> 4) & 0x0F
+        sr_idx = (b2 >> 2) & 0x03
+        padding = (b2 >> 1) & 0x01
+        if version == 1 or layer != 1 or bitrate_idx in (0, 15) or sr_idx == 3:
+            pos += 1
+            continue
+
+        bitrate = BITRATES[1 if version == 3 else 2][bitrate_idx] * 1000
+        sample_rate = SAMPLE_RATES[version][sr_idx]
+        samples = 1152 if version == 3 else 576
+        length = (samples // 8) * bitrate // sample_rate + padding
+        if length <= 4:
+            pos += 1
+            continue
+        yield pos, length, samples / sample_rate
+        pos += length
+
+
+def split_mp3(data, boundaries):
+    """
+    boundaries(초, 오름차순)의 가장 가까운 프레임 경계에서 MP3를 자릅니다.
+    len(boundaries) + 1 개의 조각을 반환하며, 각 조각은 그대로 재생 가능한 MP3입니다.
+    """
+    frames = list(iter_frames(data))
+    pieces = []
+    cut_points = []
+    elapsed = 0.0
+    b_idx = 0
+    for i, (start, length, duration) in enumerate(frames):
+        # 경계 시각이 이 프레임의 가운데 이전이면 여기서 자름
+        while b_idx < len(boundaries) and boundaries[b_idx] <= elapsed + duration / 2:
+            cut_points.append(i)
+            b_idx += 1
+        elapsed += duration
+    while b_idx < len(boundaries):
+        cut_points.append(len(frames))
+        b_idx += 1
+
+    prev = 0
+    for cut in cut_points + [len(frames)]:
+        chunk = frames[prev:cut]
+        if chunk:
+            begin = chunk[0][0]
+            end = chunk[-1][0] + chunk[-1][1]
+            pieces.append(data[begin:end])
+        else:
+            pieces.append(b"")
+        prev = cut
+    return pieces
+
+
+def mp3_duration(data):
+    """프레임 헤더만 읽어 재생 시간(초)을 계산합니다. (디코딩 없음)"""
+    return sum(duration for _, _, duration in iter_frames(data))
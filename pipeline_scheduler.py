@@ -0,0 +1,220 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import telemetry
+
+# -------------------------------------------------------------------------
+# [설정] 단계별 동시 작업 수 / 대기열 크기
+# -------------------------------------------------------------------------
+# 각 단계가 동시에 맡는 동화 수 (단계 안의 API 동시 요청 수는 각 모듈 설정을 따름)
+TTS_STAGE_WORKERS = int(os.getenv("TTS_STAGE_WORKERS", "2"))
+IMAGE_STAGE_WORKERS = int(os.getenv("IMAGE_STAGE_WORKERS", "2"))
+VIDEO_STAGE_WORKERS = int(os.getenv("VIDEO_STAGE_WORKERS", "1"))
+# 단계별 대기열 크기 (가득 차면 앞 단계가 기다림 -> 뒤 단계가 밀려도 메모리가 늘지 않음)
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "4"))
+# 각색이 끝나기 전에 먼저 완성된 장면의 음성/그림을 만드는 작업 수
+SCENE_PREFETCH_WORKERS = int(os.getenv("SCENE_PREFETCH_WORKERS", "4"))
+
+_STOP = object()
+
+
+def story_key(story):
+    return str(story.get('original_seq') or story.get('title'))
+
+
+# -------------------------------------------------------------------------
+# [클래스 1] 단계 (제한된 대기열 + 작업 스레드)
+# -------------------------------------------------------------------------
+class Stage:
+    """
+    대기열에 들어온 동화를 workers개 스레드가 꺼내 fn(story)를 실행합니다.
+    끝나면 on_done(story, ok)을 호출합니다. (다음 단계로 넘기는 용도)
+    fn이 예외를 던지거나 succeeded(결과)가 False면 실패로 셈
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=STAGE_QUEUE_SIZE, on_done=None, succeeded=None):
+        self.name = name
+        self.fn = fn
+        self.succeeded = succeeded
+        self.on_done = on_done
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.durations = []
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, story):
+        # 대기열이 가득 차면 자리가 날 때까지 기다림 (역압)
+        self.queue.put((story, time.perf_counter()))
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            story, enqueued = item
+            # 대기 시간이 길면 이 단계가 병목 (작업 수를 늘릴 후보)
+            telemetry.observe("queue_wait_seconds", time.perf_counter() - enqueued, stage=self.name)
+            started = time.time()
+            try:
+                result = self.fn(story)
+                ok = self.succeeded(result) if self.succeeded else True
+                if not ok:
+                    print(f"   ❌ [{self.name}] '{story.get('title', 'Untitled')}' 실패")
+            except Exception as e:
+                ok = False
+                print(f"   ❌ [{self.name}] '{story.get('title', 'Untitled')}' 에러: {e}")
+            with self._lock:
+                self.durations.append(time.time() - started)
+                if not ok:
+                    self.failed += 1
+            if self.on_done:
+                self.on_done(story, ok)
+
+    def close(self):
+        """남은 작업을 모두 처리한 뒤 스레드를 종료합니다."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def summary(self):
+        done = len(self.durations)
+        busy = sum(self.durations)
+        return f"{self.name}: {done}편 (실패 {self.failed}), 평균 {busy / done if done else 0:.1f}초"
+
+
+# -------------------------------------------------------------------------
+# [클래스 2] 동화 단위 스트리밍 스케줄러
+# -------------------------------------------------------------------------
+class StoryScheduler:
+    """
+    각색이 끝난 동화를 받자마자 TTS/이미지 단계에 동시에 넣고,
+    두 단계가 모두 성공한 동화만 영상 단계로 넘깁니다. (단계 함수는 실패하면 예외를 던짐)
+    영상 단계는 결과 경로가 None이면 실패로 보고 완료 수에 넣지 않습니다.
+    전체 소요 시간이 단계별 시간의 합이 아니라 가장 느린 단계에 가까워집니다.
+
+    scene_fns(장면 일부만 담은 동화를 받는 함수들)가 있으면 submit_scene()으로 받은 장면을 각색이 끝나기 전에
+    미리 처리합니다. 같은 동화의 TTS/이미지 단계는 그 동화의 미리 처리가 끝난 뒤 시작 (자산 매니페스트 덕분에
+    이미 만든 장면은 건너뛰고, 대본에서 빠진 자산 정리만 함)
+    """
+
+    def __init__(self, tts_fn, image_fn, video_fn=None,
+                 tts_workers=TTS_STAGE_WORKERS, image_workers=IMAGE_STAGE_WORKERS,
+                 video_workers=VIDEO_STAGE_WORKERS, queue_size=STAGE_QUEUE_SIZE,
+                 scene_fns=None, prefetch_workers=SCENE_PREFETCH_WORKERS):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.prefetched = 0
+        self.started = time.time()
+
+        self.scene_fns = scene_fns or []
+        self._prefetch = {}  # 동화 키 -> 미리 처리 중인 작업 목록
+        self._prefetch_executor = None
+        if self.scene_fns:
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=max(1, prefetch_workers),
+                                                         thread_name_prefix="prefetch")
+
+        self.video = None
+        if video_fn is not None:
+            self.video = Stage("video", video_fn, video_workers, queue_size, on_done=self._on_video_done,
+                               succeeded=lambda path: path is not None)
+        self.tts = Stage("tts", self._after_prefetch(tts_fn), tts_workers, queue_size, on_done=self._on_asset_done)
+        self.images = Stage("images", self._after_prefetch(image_fn), image_workers, queue_size,
+                            on_done=self._on_asset_done)
+
+    def submit_scene(self, partial_story):
+        """각색 스트림에서 장면 하나가 완성될 때 호출 (각색 스레드를 막지 않도록 바로 반환)"""
+        if self._prefetch_executor is None:
+            return
+        futures = [self._prefetch_executor.submit(fn, partial_story) for fn in self.scene_fns]
+        with self._lock:
+            self._prefetch.setdefault(story_key(partial_story), []).extend(futures)
+            self.prefetched += 1
+
+    def discard(self, story):
+        """
+        장면을 미리 받았지만 각색에 실패해 submit()되지 않을 동화의 미리 처리 작업을 버립니다.
+        아직 시작하지 않은 작업은 취소하고, 진행 중인 작업은 끝나도록 두되 기록은 지움
+        """
+        with self._lock:
+            futures = self._prefetch.pop(story_key(story), [])
+        if not futures:
+            return 0
+        cancelled = sum(future.cancel() for future in futures)
+        telemetry.count("prefetch_discarded_total", cancelled)
+        print(f"   🗑️ '{story.get('title', 'Untitled')}' 각색 실패로 미리 처리 작업 {cancelled}/{len(futures)}개 취소")
+        return cancelled
+
+    def _after_prefetch(self, fn):
+        def run(story):
+            with self._lock:
+                futures = self._prefetch.get(story_key(story), [])
+            if futures:
+                # 미리 처리가 실패해도 전체 동화 처리에서 다시 시도하므로 결과는 보지 않음
+                with telemetry.span("prefetch.wait", story=story.get('title'), jobs=len(futures)):
+                    wait(futures)
+            return fn(story)
+        return run
+
+    def submit(self, story):
+        """각색 단계(여러 스레드)에서 호출. 대기열이 가득 차면 기다림"""
+        with self._lock:
+            # 남은 자산 단계 수와 실패 여부
+            self._pending[story_key(story)] = {"remaining": 2, "ok": True}
+            self.submitted += 1
+        print(f"   📥 '{story.get('title', 'Untitled')}' 자산 생성 대기열에 추가")
+        self.tts.put(story)
+        self.images.put(story)
+
+    def _on_asset_done(self, story, ok):
+        key = story_key(story)
+        with self._lock:
+            state = self._pending[key]
+            state["remaining"] -= 1
+            state["ok"] = state["ok"] and ok
+            if state["remaining"] > 0:
+                return
+            del self._pending[key]
+            self._prefetch.pop(key, None)
+            ready = state["ok"]
+            if not ready or self.video is None:
+                self.completed += ready
+        if not ready:
+            print(f"   ⚠️ '{story.get('title', 'Untitled')}' 자산 생성 실패로 영상 단계를 건너뜁니다.")
+        elif self.video is not None:
+            self.video.put(story)
+        else:
+            print(f"   ✨ '{story.get('title', 'Untitled')}' 자산 생성 완료!")
+
+    def _on_video_done(self, story, ok):
+        if ok:
+            with self._lock:
+                self.completed += 1
+            print(f"   ✨ '{story.get('title', 'Untitled')}' 모든 작업 완료!")
+
+    def finish(self):
+        """들어온 동화를 모두 끝까지 처리하고 단계별 요약을 반환합니다."""
+        self.tts.close()
+        self.images.close()
+        if self.video is not None:
+            self.video.close()
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=True)
+        stages = [self.tts, self.images] + ([self.video] if self.video else [])
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "prefetched_scenes": self.prefetched,
+            "elapsed": time.time() - self.started,
+            "stages": [stage.summary() for stage in stages],
+        }
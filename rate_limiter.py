@@ -0,0 +1,107 @@
+import threading
+import time
+import random
+
+
+# -------------------------------------------------------------------------
+# [클래스 1] 토큰 버킷
+# -------------------------------------------------------------------------
+class TokenBucket:
+    """
+    capacity만큼 쌓이고 초당 refill_rate만큼 다시 채워지는 토큰 버킷입니다.
+    acquire()는 토큰이 모일 때까지 기다립니다. (여러 스레드에서 공유 가능)
+    """
+
+    def __init__(self, capacity, refill_rate):
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_rate)
+        self._updated = now
+
+    def acquire(self, amount=1.0):
+        # 버킷보다 큰 요청은 버킷 크기만큼만 기다림 (영원히 대기하지 않도록)
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.refill_rate
+            time.sleep(wait)
+
+    def drain(self):
+        """429를 받았을 때 버킷을 비워 곧바로 재요청이 몰리지 않게 합니다."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = 0.0
+
+
+# -------------------------------------------------------------------------
+# [클래스 2] 배포(Deployment) 쿼터용 적응형 제한기 (RPM + TPM)
+# -------------------------------------------------------------------------
+class RateLimiter:
+    """
+    Azure OpenAI 배포의 분당 요청 수(RPM)와 분당 토큰 수(TPM) 쿼터를 함께 지킵니다.
+    429 응답을 받으면 penalize()로 모든 워커를 Retry-After 동안 멈춥니다.
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm, rpm / 60.0) if rpm else None
+        self.tokens = TokenBucket(tpm, tpm / 60.0) if tpm else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, token_cost=0):
+        self._wait_pause()
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens and token_cost:
+            self.tokens.acquire(token_cost)
+        # 버킷 대기 도중 다른 워커가 429를 받았을 수 있으므로 한 번 더 확인
+        self._wait_pause()
+
+    def _wait_pause(self):
+        while True:
+            with self._lock:
+                delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def penalize(self, delay):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        if self.requests:
+            self.requests.drain()
+
+
+# -------------------------------------------------------------------------
+# [함수] 429/503 응답의 재시도 대기 시간 계산
+# -------------------------------------------------------------------------
+def get_retry_after(headers, attempt, base_delay=1.0, max_delay=60.0):
+    """
+    Retry-After(초) / retry-after-ms 헤더가 있으면 그 값을, 없으면 지수 백오프 + 지터를 반환합니다.
+    """
+    if headers:
+        retry_ms = headers.get("retry-after-ms")
+        if retry_ms:
+            try:
+                return min(float(retry_ms) / 1000.0, max_delay)
+            except ValueError:
+                pass
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), max_delay)
+            except ValueError:
+                pass
+    delay = min(base_delay * (2 ** attempt), max_delay)
+    return delay * (0.5 + random.random() / 2)
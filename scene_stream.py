@@ -0,0 +1,90 @@
+import json
+
+# -------------------------------------------------------------------------
+# [클래스] 스트리밍 응답에서 장면(scenes 배열의 원소)을 완성되는 대로 꺼내는 파서
+# -------------------------------------------------------------------------
+class SceneStreamParser:
+    """
+    {"title": ..., "scenes": [{...}, {...}]} 형식의 JSON을 조각(delta)으로 받으면서
+    최상위 scenes 배열의 객체가 닫힐 때마다 그 장면을 돌려줍니다.
+    - 문자열 안의 괄호/따옴표(이스케이프 포함)는 무시하고 깊이만 셈 (조각마다 새로 들어온 글자만 훑음)
+    - 최상위 "title" 값이 완성되면 self.title에 기록
+    - 전체 결과는 finish()에서 json.loads로 한 번에 읽음 -> 스트리밍이 아닌 경로와 같은 객체
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._key = None           # 최상위 객체에서 지금 값을 읽고 있는 키
+        self._after_colon = False
+        self._pending_key = None
+        self._in_scenes = False
+        self._scene_start = None
+        self.title = None
+        self.scene_count = 0
+
+    def feed(self, delta):
+        """조각을 추가하고, 이번에 완성된 장면 목록을 반환"""
+        if not delta:
+            return []
+        self._text += delta
+        scenes = []
+        text = self._text
+        for pos in range(self._pos, len(text)):
+            c = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._on_string(text[self._string_start:pos + 1])
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 2 and c == "[" and self._key == "scenes":
+                    self._in_scenes = True
+                elif self._depth == 3 and c == "{" and self._in_scenes:
+                    self._scene_start = pos
+            elif c in "}]":
+                if self._depth == 3 and c == "}" and self._scene_start is not None:
+                    scenes.append(json.loads(text[self._scene_start:pos + 1]))
+                    self._scene_start = None
+                elif self._depth == 2 and c == "]" and self._in_scenes:
+                    self._in_scenes = False
+                self._depth -= 1
+            elif self._depth == 1 and c == ":":
+                self._key = self._pending_key
+                self._after_colon = True
+            elif self._depth == 1 and c == ",":
+                self._key = None
+                self._after_colon = False
+        self._pos = len(text)
+        self.scene_count += len(scenes)
+        return scenes
+
+    def _on_string(self, literal):
+        if self._depth != 1:
+            return
+        value = json.loads(literal)
+        if not self._after_colon:
+            self._pending_key = value
+        elif self._key == "title" and self.title is None:
+            self.title = value
+
+    @property
+    def text(self):
+        return self._text
+
+    def finish(self):
+        """스트림이 끝난 뒤 전체 응답 객체 (형식이 잘못됐으면 json.loads 예외가 그대로 올라감)"""
+        return json.loads(self._text)
@@ -0,0 +1,168 @@
+import os
+import subprocess
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from video_timeline import VIDEO_FPS, build_story_timeline, render_inputs
+from ffmpeg_renderer import (
+    FFMPEG_BIN, RENDITIONS, VIDEO_RENDITIONS, X264_PRESET, parse_renditions, render_timeline, rendition_inputs,
+    rendition_key, rendition_path, rendition_spec
+)
+from asset_manifest import (
+    asset_entry, asset_hash, fresh_asset, load_asset_manifest, segment_key, update_asset_manifest
+)
+import telemetry
+
+# -------------------------------------------------------------------------
+# [설정] 구간 병렬 렌더링
+# -------------------------------------------------------------------------
+# 동시에 렌더링할 구간 수 (기본: CPU 코어 수)
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", str(multiprocessing.cpu_count())))
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 구간 나누기
+# -------------------------------------------------------------------------
+def split_segments(timeline):
+    """
+    타임라인을 인트로/장면별 독립 타임라인으로 나눕니다.
+    장면마다 검은 화면에서 페이드인하므로 구간 경계에서 이어 붙여도 전환 효과가 그대로 유지됩니다.
+    반환: [(구간 이름, 부분 타임라인), ...]
+    """
+    segments = []
+    if timeline["intro"]:
+        segments.append(("seg_000_intro", {**timeline, "scenes": []}))
+    for scene in timeline["scenes"]:
+        name = f"seg_{scene['scene_num']:03d}_scene"
+        segments.append((name, {**timeline, "intro": None, "scenes": [scene]}))
+    return segments
+
+
+def segment_file_name(name, rendition):
+    """구간 파일/자산 이름 (main은 기존 이름 그대로)"""
+    return name if rendition == "main" else f"{name}_{rendition}"
+
+
+def _render_segment(job):
+    """프로세스 풀에서 실행되는 구간 1개 렌더링 (출력본이 여럿이면 같은 합성 결과를 출력본마다 인코딩)"""
+    started = time.time()
+    render_timeline(
+        job["timeline"], job["work_dir"], job["outputs"], name=job["name"],
+        fps=job["fps"], vfr=False,  # 스트림 복사로 이어 붙이므로 고정 프레임레이트로 통일
+        threads=job["threads"]
+    )
+    return job["name"], time.time() - started
+
+
+# -------------------------------------------------------------------------
+# [함수 2] concat demuxer로 스트림 복사 연결 (재인코딩 없음)
+# -------------------------------------------------------------------------
+def concat_segments(segment_paths, output_path, work_dir):
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            safe_path = os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+            f.write(f"file '{safe_path}'\n")
+
+    cmd = [FFMPEG_BIN, "-y", "-hide_banner", "-loglevel", "error",
+           "-f", "concat", "-safe", "0", "-i", list_path,
+           "-c", "copy", "-movflags", "+faststart", os.path.abspath(output_path)]
+    with telemetry.span("encode.concat", segments=len(segment_paths)):
+        subprocess.run(cmd, check=True)
+    return output_path
+
+
+# -------------------------------------------------------------------------
+# [메인 로직] 구간별 병렬 렌더링 후 연결
+# -------------------------------------------------------------------------
+def render_story_segments(story_data, base_dir="output_assets", output_path=None,
+                          workers=SEGMENT_WORKERS, fps=VIDEO_FPS, preset=X264_PRESET, renditions=VIDEO_RENDITIONS):
+    """
+    구간마다 FFmpeg 1회(출력본 전부를 함께 인코딩) -> 출력본별로 구간들을 스트림 복사로 연결
+    반환: main(없으면 첫 출력본)의 경로
+    """
+    title = story_data['title']
+    print(f"🎬 [영상 편집 시작 - 구간 병렬] '{title}'")
+
+    timeline = build_story_timeline(story_data, base_dir)
+    paths = timeline["paths"]
+    segments = split_segments(timeline)
+    if not segments:
+        print("❌ 생성할 클립이 없습니다.")
+        return None
+
+    names = parse_renditions(renditions)
+    specs = {r: rendition_spec(r, preset) for r in names}
+    output_paths = {r: rendition_path(paths, r) for r in names}
+    if output_path and "main" in output_paths:
+        output_paths["main"] = output_path
+    result_path = output_paths.get("main", output_paths[names[0]])
+    work_dir = os.path.join(paths["story_dir"], ".render")
+    os.makedirs(work_dir, exist_ok=True)
+
+    # 자산 매니페스트: 구간별 입력(그림/음성 해시, 자막, 인코더/출력본 설정)이 그대로면 이전 구간 파일을 재사용
+    story_dir = paths["story_dir"]
+    assets = load_asset_manifest(story_dir)
+    segment_inputs, segment_paths = {}, {}
+    for name, seg_timeline in segments:
+        for r in names:
+            settings = {"backend": "segments", "fps": fps, "preset": specs[r]["preset"], "crf": specs[r]["crf"],
+                        **rendition_inputs(r, specs[r])}
+            segment_inputs[name, r] = render_inputs(seg_timeline, **settings)
+            segment_paths[name, r] = os.path.join(work_dir, f"{segment_file_name(name, r)}.mp4")
+
+    final_inputs = {r: {"segments": [asset_hash(segment_inputs[name, r]) for name, _ in segments]} for r in names}
+    stale_renditions = [r for r in names
+                        if not fresh_asset(assets, rendition_key(r), final_inputs[r], story_dir, output_paths[r])]
+    if not stale_renditions:
+        print(f"  👉 바뀐 자산이 없어 렌더링을 건너뜁니다. ({result_path})\n")
+        return result_path
+
+    # 구간마다 다시 만들어야 하는 출력본만 모아 FFmpeg 한 번으로
+    stale = []
+    for name, seg_timeline in segments:
+        outs = [r for r in stale_renditions
+                if not fresh_asset(assets, segment_key(segment_file_name(name, r)), segment_inputs[name, r],
+                                   story_dir, segment_paths[name, r])]
+        if outs:
+            stale.append((name, seg_timeline, outs))
+
+    workers = max(1, min(workers, len(stale) or 1))
+    # x264 스레드는 코어를 구간 수만큼 나눠 씀 (과도한 스레드 경쟁 방지)
+    threads = max(1, multiprocessing.cpu_count() // workers)
+    jobs = [{
+        "timeline": seg_timeline,
+        "work_dir": work_dir,
+        "name": name,
+        "outputs": [(specs[r], segment_paths[name, r]) for r in outs],
+        "renditions": outs,
+        "fps": fps,
+        "threads": threads,
+    } for name, seg_timeline, outs in stale]
+
+    print(f"  💾 렌더링 시작... (구간 {len(segments)}개 중 {len(jobs)}개 다시 렌더링, 프로세스 {workers}개, "
+          f"출력본 {', '.join(stale_renditions)})")
+    started = time.time()
+    entries = {}
+    try:
+        if jobs:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for job, (name, elapsed) in zip(jobs, executor.map(_render_segment, jobs)):
+                    for r in job["renditions"]:
+                        entries[segment_key(segment_file_name(name, r))] = asset_entry(
+                            segment_paths[name, r], segment_inputs[name, r], story_dir)
+                    print(f"    ✅ {name} ({elapsed:.1f}초)")
+        for r in stale_renditions:
+            concat_segments([segment_paths[name, r] for name, _ in segments], output_paths[r], work_dir)
+            entries[rendition_key(r)] = asset_entry(output_paths[r], final_inputs[r], story_dir)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"❌ 렌더링 실패: {e}")
+        return None
+    finally:
+        # 렌더링에 성공한 구간은 실패했더라도 기록 (다음 실행에서 재사용), 빠진 장면의 구간 파일은 지움
+        # (이번에 만들지 않은 출력본의 구간도 남겨 둠)
+        update_asset_manifest(story_dir, entries, prune_prefix="segment/",
+                              keep=[segment_key(segment_file_name(name, r)) for name, _ in segments for r in RENDITIONS])
+
+    print(f"🎉 영상 제작 성공! ({time.time() - started:.1f}초) \n📁 위치: {', '.join(output_paths[r] for r in stale_renditions)}\n")
+    return result_path
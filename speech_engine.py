@@ -0,0 +1,363 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import azure.cognitiveservices.speech as speechsdk
+from dotenv import load_dotenv
+from rate_limiter import get_retry_after
+from content_cache import ContentCache
+import telemetry
+
+load_dotenv()
+
+SPEECH_KEY = os.getenv("SPEECH_KEY")
+SPEECH_REGION = os.getenv("SPEECH_REGION")
+
+# -------------------------------------------------------------------------
+# [설정] 동시 합성 수 / 재시도
+# -------------------------------------------------------------------------
+# Speech 리소스의 동시 요청 한도(F0: 1, S0: 기본 200 TPS) 안에서 조절
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+MAX_RETRIES = 5
+
+# 출력 형식: 이름 -> (SpeechSynthesisOutputFormat 이름, 파일 확장자)
+# wav(24kHz 16비트 PCM)는 손실 압축/복원 과정이 없어 오디오 조립 단계에서 디코딩 없이 바로 읽음
+OUTPUT_FORMATS = {
+    "mp3": ("Audio24Khz48KBitRateMonoMp3", ".mp3"),
+    "wav": ("Riff24Khz16BitMonoPcm", ".wav"),
+    "opus": ("Ogg24Khz16BitMonoOpus", ".ogg"),
+}
+TTS_OUTPUT_FORMAT = os.getenv("TTS_OUTPUT_FORMAT", "mp3")
+
+
+def parse_output_format(name=TTS_OUTPUT_FORMAT):
+    """형식 이름("mp3"/"wav"/"opus") -> SpeechSynthesisOutputFormat"""
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"지원하지 않는 출력 형식입니다: {name} (가능: {', '.join(OUTPUT_FORMATS)})")
+    return getattr(speechsdk.SpeechSynthesisOutputFormat, OUTPUT_FORMATS[name][0])
+
+
+def format_extension(fmt):
+    """SpeechSynthesisOutputFormat -> 파일 확장자"""
+    for sdk_name, extension in OUTPUT_FORMATS.values():
+        if getattr(speechsdk.SpeechSynthesisOutputFormat, sdk_name) == fmt:
+            return extension
+    raise ValueError(f"지원하지 않는 출력 형식입니다: {fmt}")
+
+
+DEFAULT_OUTPUT_FORMAT = parse_output_format()
+
+# 합성 결과 캐시 (보이스 + 텍스트 + 출력 형식이 같으면 재사용, 오래 안 쓴 것부터 정리)
+# 파일 확장자는 엔진이 자기 출력 형식에 맞춰 정함 (SpeechEngine.cache)
+AUDIO_CACHE = ContentCache(
+    os.getenv("TTS_CACHE_DIR", os.path.join(".cache", "tts")),
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_MB", "2048")) * 1024 * 1024,
+)
+
+# 대사별 재생 시간 / 단어 타이밍 캐시 (오디오 캐시와 같은 키)
+TIMING_CACHE = ContentCache(
+    os.getenv("TTS_TIMING_CACHE_DIR", os.path.join(".cache", "tts_timing")),
+    suffix=".json",
+)
+
+# SSML 요청은 문서 안의 <voice>가 목소리를 정하므로 풀 키를 따로 둠
+SSML_POOL_KEY = "__ssml__"
+
+# 잠깐 기다렸다 다시 보내면 되는 실패 (요청 한도 초과, 연결 문제)
+_RETRYABLE_ERRORS = {
+    speechsdk.CancellationErrorCode.TooManyRequests,
+    speechsdk.CancellationErrorCode.ConnectionFailure,
+    speechsdk.CancellationErrorCode.ServiceTimeout,
+    speechsdk.CancellationErrorCode.ServiceUnavailable,
+}
+
+
+class SynthesisError(Exception):
+    pass
+
+
+# -------------------------------------------------------------------------
+# [클래스 1] 풀에 보관되는 합성기 (연결을 미리 열어둠)
+# -------------------------------------------------------------------------
+class _PooledSynthesizer:
+    def __init__(self, speech_config, prewarm=True):
+        self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        self.connection = speechsdk.Connection.from_speech_synthesizer(self.synthesizer)
+        if prewarm:
+            # 첫 요청 때 TLS/웹소켓 핸드셰이크를 기다리지 않도록 미리 연결
+            self.connection.open(True)
+        # 이벤트는 한 번만 연결하고, 호출마다 콜백만 바꿔 끼움
+        self.on_bookmark = None
+        self.on_word_boundary = None
+        self.synthesizer.bookmark_reached.connect(self._dispatch_bookmark)
+        self.synthesizer.synthesis_word_boundary.connect(self._dispatch_word_boundary)
+
+    def _dispatch_bookmark(self, evt):
+        if self.on_bookmark:
+            self.on_bookmark(evt)
+
+    def _dispatch_word_boundary(self, evt):
+        if self.on_word_boundary:
+            self.on_word_boundary(evt)
+
+
+# -------------------------------------------------------------------------
+# [클래스 2] 공용 합성 엔진
+# -------------------------------------------------------------------------
+class SpeechEngine:
+    """
+    보이스별 합성기를 풀로 재사용하고, max_concurrency개까지 동시에 합성합니다.
+    - 합성 결과는 메모리(result.audio_data)로 받아 원하는 위치에 저장하거나 바이트 그대로 돌려줍니다.
+    - output_format은 SpeechSynthesisOutputFormat 또는 OUTPUT_FORMATS의 이름("mp3"/"wav"/"opus")
+    - 요청 한도 초과(429) 등은 지수 백오프로 재시도합니다.
+    """
+
+    def __init__(self, key=None, region=None, max_concurrency=TTS_CONCURRENCY,
+                 output_format=DEFAULT_OUTPUT_FORMAT, max_retries=MAX_RETRIES, cache=AUDIO_CACHE,
+                 timing_cache=TIMING_CACHE):
+        self.key = key or SPEECH_KEY
+        self.region = region or SPEECH_REGION
+        self.max_concurrency = max(1, max_concurrency)
+        if isinstance(output_format, str) and output_format in OUTPUT_FORMATS:
+            output_format = parse_output_format(output_format)
+        self.output_format = output_format
+        self.extension = format_extension(self.output_format)
+        self.max_retries = max_retries
+        # 캐시 파일 확장자는 환경변수가 아니라 실제 출력 형식을 따름
+        self.cache = cache.with_suffix(self.extension) if cache is not None else None
+        self.timing_cache = timing_cache
+        self._pools = {}
+        self._created = {}
+        self._prewarmed = set()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+    def _make_config(self, voice):
+        speech_config = speechsdk.SpeechConfig(subscription=self.key, region=self.region)
+        speech_config.set_speech_synthesis_output_format(self.output_format)
+        if voice != SSML_POOL_KEY:
+            speech_config.speech_synthesis_voice_name = voice
+        return speech_config
+
+    def _acquire(self, voice):
+        with self._lock:
+            pool = self._pools.setdefault(voice, queue.Queue())
+            try:
+                return pool.get_nowait()
+            except queue.Empty:
+                pass
+            create = self._created.get(voice, 0) < self.max_concurrency
+            if create:
+                self._created[voice] = self._created.get(voice, 0) + 1
+        if create:
+            try:
+                return _PooledSynthesizer(self._make_config(voice))
+            except Exception:
+                with self._lock:
+                    self._created[voice] -= 1
+                raise
+        return pool.get()
+
+    def _release(self, voice, pooled, broken=False):
+        pooled.on_bookmark = None
+        pooled.on_word_boundary = None
+        if broken:
+            # 연결이 끊긴 합성기는 버리고 다음에 새로 만듦
+            with self._lock:
+                self._created[voice] -= 1
+            try:
+                pooled.connection.close()
+            except Exception:
+                pass
+            return
+        self._pools[voice].put(pooled)
+
+    def prewarm(self, voices):
+        """
+        자주 쓰는 보이스의 합성기를 미리 만들어 연결을 열어둡니다.
+        보이스마다 엔진당 한 번만 (이미 쓰는 중인 합성기를 기다리지 않도록)
+        """
+        with self._lock:
+            voices = set(voices) - self._prewarmed
+            self._prewarmed |= voices
+        for voice in voices:
+            self._release(voice, self._acquire(voice))
+
+    # ---------------------------------------------------------------------
+    # 합성
+    # ---------------------------------------------------------------------
+    def synthesize(self, text=None, voice=None, ssml=None, on_bookmark=None, on_word_boundary=None):
+        """
+        텍스트(voice 지정) 또는 SSML을 합성해 SpeechSynthesisResult를 반환합니다.
+        재시도로도 실패하면 SynthesisError를 던집니다.
+        """
+        pool_key = SSML_POOL_KEY if ssml is not None else voice
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            with self._slots, telemetry.span("api.tts", voice=pool_key, attempt=attempt) as s:
+                pooled = self._acquire(pool_key)
+                pooled.on_bookmark = on_bookmark
+                pooled.on_word_boundary = on_word_boundary
+                try:
+                    if ssml is not None:
+                        result = pooled.synthesizer.speak_ssml_async(ssml).get()
+                    else:
+                        result = pooled.synthesizer.speak_text_async(text).get()
+                except Exception:
+                    self._release(pool_key, pooled, broken=True)
+                    raise
+                self._release(pool_key, pooled, broken=result_is_connection_error(result))
+                s.set(reason=str(result.reason))
+
+            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+                return result
+
+            details = result.cancellation_details
+            last_error = f"{details.reason} / {details.error_details}"
+            if details.error_code not in _RETRYABLE_ERRORS or attempt == self.max_retries:
+                break
+            delay = get_retry_after(None, attempt)
+            telemetry.count("api_retries_total", service="tts", reason=str(details.error_code))
+            print(f"  ⏳ TTS 재시도 {attempt+1}/{self.max_retries} ({delay:.1f}초 후): {details.error_code}")
+            time.sleep(delay)
+
+        raise SynthesisError(last_error)
+
+    def cache_key(self, text, voice, settings=None):
+        """보이스, 텍스트, 합성 설정(출력 형식/운율 등)의 해시"""
+        return ContentCache.make_key("tts", voice, text, str(self.output_format), settings or {})
+
+    def synthesize_timed(self, text, voice):
+        """
+        텍스트를 합성하면서 단어 경계 이벤트로 타이밍을 함께 모읍니다.
+        반환: (오디오 바이트, {"duration": 초, "words": [{"text", "offset", "duration"}]})
+        """
+        words = []
+        result = self.synthesize(text=text, voice=voice, on_word_boundary=lambda evt: words.append(word_timing(evt)))
+        timing = {
+            "duration": result.audio_duration.total_seconds(),
+            "words": [w for w in words if w is not None],
+        }
+        return result.audio_data, timing
+
+    def get_timing(self, key):
+        if self.timing_cache is None:
+            return None
+        return self.timing_cache.get_json(key)
+
+    def store_audio(self, key, audio_data, output_path, timing=None):
+        """합성된 오디오(와 타이밍)를 캐시에 넣고 output_path에 연결합니다."""
+        if timing is not None and self.timing_cache is not None:
+            self.timing_cache.put_json(key, timing)
+        telemetry.count("bytes_written_total", len(audio_data), stage="tts")
+        if self.cache is None:
+            tmp_path = f"{output_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(audio_data)
+            os.replace(tmp_path, output_path)
+            return
+        ContentCache.link_file(self.cache.put_bytes(key, audio_data), output_path)
+
+    def synthesize_to_file(self, text, voice, output_path):
+        """
+        합성 결과를 output_path에 저장합니다. 성공하면 True
+        같은 (보이스, 텍스트, 설정)을 이미 합성한 적이 있으면 캐시 파일을 연결만 합니다.
+        """
+        key = self.cache_key(text, voice)
+        if self.cache is not None and self.cache.materialize(key, output_path):
+            telemetry.count("cache_hits_total", cache="tts")
+            return True
+        try:
+            audio_data, timing = self.synthesize_timed(text, voice)
+        except SynthesisError as e:
+            print(f"  ❌ 취소됨: {os.path.basename(output_path)} - {e}")
+            return False
+        self.store_audio(key, audio_data, output_path, timing=timing)
+        return True
+
+    def submit(self, fn, *args, **kwargs):
+        """엔진의 작업 스레드에서 fn을 실행합니다. (동시 합성 수는 엔진이 제한)"""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+            self._created = {}
+            self._prewarmed = set()
+        for pool in pools:
+            while not pool.empty():
+                try:
+                    pool.get_nowait().connection.close()
+                except Exception:
+                    pass
+
+
+def word_timing(evt, base_offset=0.0):
+    """단어 경계 이벤트 -> {"text", "offset", "duration"} (문장 부호/문장 경계는 None)"""
+    boundary_type = getattr(evt, "boundary_type", None)
+    if boundary_type is not None and boundary_type != speechsdk.SpeechSynthesisBoundaryType.Word:
+        return None
+    return {
+        "text": evt.text,
+        # audio_offset 단위는 100ns(tick)
+        "offset": evt.audio_offset / 10_000_000 - base_offset,
+        "duration": evt.duration.total_seconds(),
+    }
+
+
+def result_is_connection_error(result):
+    if result.reason != speechsdk.ResultReason.Canceled:
+        return False
+    return result.cancellation_details.error_code in (
+        speechsdk.CancellationErrorCode.ConnectionFailure,
+        speechsdk.CancellationErrorCode.ServiceTimeout,
+    )
+
+
+# -------------------------------------------------------------------------
+# [함수] 프로세스 공용 엔진
+# -------------------------------------------------------------------------
+_shared_engine = None
+_shared_lock = threading.Lock()
+
+
+def get_engine():
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            if not SPEECH_KEY or not SPEECH_REGION:
+                raise SynthesisError(".env 파일에 SPEECH_KEY 또는 SPEECH_REGION이 없습니다.")
+            _shared_engine = SpeechEngine()
+        return _shared_engine
+
+
+def output_extension():
+    """지금 쓰는(또는 설정된) 출력 형식의 파일 확장자 (엔진을 만들지 않음)"""
+    engine = _shared_engine
+    return engine.extension if engine is not None else OUTPUT_FORMATS[TTS_OUTPUT_FORMAT][1]
+
+
+def output_format():
+    """지금 쓰는(또는 설정된) SpeechSynthesisOutputFormat (엔진을 만들지 않음, 자산 입력 해시용)"""
+    engine = _shared_engine
+    return engine.output_format if engine is not None else DEFAULT_OUTPUT_FORMAT
+
+
+def audio_cache():
+    """지금 쓰는 엔진의 오디오 캐시 (엔진이 아직 없으면 설정된 캐시, 엔진을 만들지 않음)"""
+    engine = _shared_engine
+    return engine.cache if engine is not None else AUDIO_CACHE
+
+
+def set_engine(engine):
+    """프로세스 공용 엔진을 교체합니다. (로컬 가짜 TTS로 벤치마크할 때 등)"""
+    global _shared_engine
+    with _shared_lock:
+        previous, _shared_engine = _shared_engine, engine
+    if previous is not None and previous is not engine:
+        previous.close()
@@ -1,8 +1,15 @@
 import json
 import os
+import threading
 import time
-from openai import AzureOpenAI
+from concurrent.futures import ThreadPoolExecutor
+from openai import AzureOpenAI, RateLimitError
 from dotenv import load_dotenv
+from rate_limiter import RateLimiter, get_retry_after
+from story_store import CRAWLED_STORE, PROCESSED_STORE, crawled_store, processed_store, select_seqs, story_text
+from content_cache import ContentCache
+from scene_stream import SceneStreamParser
+import telemetry
 
 # 1. .env 파일 로드
 load_dotenv()
@@ -13,21 +20,38 @@ load_dotenv()
 client = AzureOpenAI(
     api_key=os.getenv("AZURE_API_KEY"),  
     api_version=os.getenv("AZURE_API_VERSION"), 
-    azure_endpoint=os.getenv("AZURE_ENDPOINT")
+    azure_endpoint=os.getenv("AZURE_ENDPOINT"),
+    max_retries=0  # 429 재시도는 아래 RateLimiter가 직접 처리
 )
 
 # -------------------------------------------------------------------------
-# [함수 1] GPT-5 시나리오 분석 (프롬프트 대폭 수정)
+# [설정] 동시 처리 및 배포 쿼터 (Azure Portal > 배포 > 분당 요청/토큰 한도)
 # -------------------------------------------------------------------------
-def analyze_story_with_gpt(story_data):
-    sorted_keys = sorted(story_data['pages'].keys(), key=int)
-    full_text = " ".join([story_data['pages'][k] for k in sorted_keys])
-    title = story_data['title']
+STORY_WORKERS = int(os.getenv("STORY_WORKERS", "4"))
+AZURE_OPENAI_RPM = int(os.getenv("AZURE_OPENAI_RPM", "60"))
+AZURE_OPENAI_TPM = int(os.getenv("AZURE_OPENAI_TPM", "100000"))
+MAX_RETRIES = 5
+# TPM 계산용 응답 토큰 예상치 (장면 6~10개 분량의 시나리오)
+EXPECTED_COMPLETION_TOKENS = 4000
+TEMPERATURE = 0.7 # 창의적인 각색을 위해 온도를 약간 높게 유지
+# 장면을 받을 곳(on_scene)이 있으면 응답을 스트리밍으로 받아 완성된 장면부터 바로 넘김 (0이면 끄기)
+LLM_STREAM = os.getenv("LLM_STREAM", "1") != "0"
 
-    print(f"▶️ [분석 시작] '{title}' (텍스트 길이: {len(full_text)}자)")
+# -------------------------------------------------------------------------
+# [설정] LLM 응답 캐시 (원문 + 시스템 프롬프트 + 배포 + 온도가 같으면 재사용)
+# -------------------------------------------------------------------------
+LLM_CACHE = ContentCache(
+    os.getenv("LLM_CACHE_DIR", os.path.join(".cache", "llm")),
+    suffix=".json",
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024,
+    max_age=float(os.getenv("LLM_CACHE_MAX_DAYS", "90")) * 24 * 3600,
+)
 
-    # ★ 핵심 수정: 화자 제한 및 해설 확장 지시 강화
-    system_prompt = """
+# -------------------------------------------------------------------------
+# [설정] 시나리오 각색 시스템 프롬프트
+# -------------------------------------------------------------------------
+# ★ 핵심 수정: 화자 제한 및 해설 확장 지시 강화
+SYSTEM_PROMPT = """
     당신은 어린이 유튜브 채널을 위한 '전래동화 시나리오 전문 각색가'입니다.
     제공된 동화를 바탕으로 영상 제작용 JSON 데이터를 생성하세요.
 
@@ -61,66 +85,233 @@ def analyze_story_with_gpt(story_data):
     }
     """
 
-    try:
-        response = client.chat.completions.create(
-            model=os.getenv("AZURE_DEPLOYMENT_NAME"), 
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"동화 내용:\n{full_text}"}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.7 # 창의적인 각색을 위해 온도를 약간 높게 유지
-        )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        print(f"❌ 오류 발생 ({title}): {e}")
-        return None
+# -------------------------------------------------------------------------
+# [함수 1] GPT-5 시나리오 분석 (프롬프트 대폭 수정)
+# -------------------------------------------------------------------------
+def estimate_tokens(text):
+    # 한글은 대략 1~2자당 1토큰 -> 넉넉하게 글자 수로 계산
+    return len(text) + EXPECTED_COMPLETION_TOKENS
+
+
+def llm_cache_key(full_text, deployment=None):
+    deployment = deployment or os.getenv("AZURE_DEPLOYMENT_NAME")
+    return ContentCache.make_key("chat.completions", SYSTEM_PROMPT, full_text, deployment, TEMPERATURE)
+
+
+def build_chat_request(full_text, deployment=None):
+    """chat.completions 요청 본문 (동기 호출과 배치 API 요청 파일이 같은 본문을 씀)"""
+    return {
+        "model": deployment or os.getenv("AZURE_DEPLOYMENT_NAME"),
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"동화 내용:\n{full_text}"}
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": TEMPERATURE,
+    }
+
+
+def _stream_completion(full_text, title, on_scene, s):
+    """
+    스트리밍으로 응답을 받으면서 scenes 배열의 장면이 완성될 때마다 on_scene(제목, 장면)을 호출합니다.
+    제목이 장면보다 늦게 나오면 제목이 나올 때까지 모아 뒀다가 넘김
+    반환: 전체 응답 객체 (스트리밍이 아닌 경로와 같은 json.loads 결과)
+    """
+    response = client.chat.completions.create(
+        **build_chat_request(full_text), stream=True, stream_options={"include_usage": True})
+    parser = SceneStreamParser()
+    waiting = []
+    first_scene_at = None
+    started = time.perf_counter()
+    for chunk in response:
+        if getattr(chunk, "usage", None) is not None:
+            s.set(prompt_tokens=chunk.usage.prompt_tokens, completion_tokens=chunk.usage.completion_tokens)
+            telemetry.count("llm_tokens_total", chunk.usage.total_tokens)
+        if not chunk.choices or chunk.choices[0].delta is None:
+            continue  # 사용량 조각, 콘텐츠 필터 결과 조각 등
+        waiting.extend(parser.feed(getattr(chunk.choices[0].delta, "content", None)))
+        if waiting and parser.title is not None:
+            if first_scene_at is None:
+                first_scene_at = time.perf_counter() - started
+                telemetry.observe("llm_first_scene_seconds", first_scene_at)
+            for scene in waiting:
+                on_scene(parser.title, scene)
+            waiting = []
+
+    analyzed = parser.finish()
+    for scene in waiting:
+        on_scene(analyzed.get('title', title), scene)
+    s.set(stream=True, scenes=parser.scene_count, first_scene_seconds=first_scene_at)
+    return analyzed
+
+
+def _once_per_scene(on_scene):
+    """같은 장면 번호는 한 번만 넘김 (스트림 도중 실패해 재시도한 응답이 앞 장면을 다시 보내도 중복 작업이 없게)"""
+    emitted = set()
+    lock = threading.Lock()
+
+    def emit(title, scene):
+        key = scene.get('scene_num', json.dumps(scene, ensure_ascii=False, sort_keys=True))
+        with lock:
+            if key in emitted:
+                return
+            emitted.add(key)
+        on_scene(title, scene)
+    return emit
+
+
+def analyze_story_with_gpt(story_data, limiter=None, cache=LLM_CACHE, on_scene=None):
+    """
+    on_scene(제목, 장면)을 주면 응답을 스트리밍으로 받아 장면이 완성되는 대로 넘깁니다. (LLM_STREAM=0이면 끝난 뒤 한꺼번에)
+    반환값은 어느 경로든 같은 전체 시나리오 객체
+    """
+    full_text = story_text(story_data)
+    title = story_data['title']
+
+    # 같은 입력으로 이미 받은 응답이 있으면 API 호출 없이 바로 반환
+    cache_key = llm_cache_key(full_text)
+    if cache is not None:
+        cached = cache.get_json(cache_key)
+        if cached is not None:
+            telemetry.count("cache_hits_total", cache="llm")
+            print(f"⚡ [캐시 사용] '{title}'")
+            if on_scene:
+                for scene in cached.get('scenes', []):
+                    on_scene(cached.get('title', title), scene)
+            return cached
+        telemetry.count("cache_misses_total", cache="llm")
+
+    print(f"▶️ [분석 시작] '{title}' (텍스트 길이: {len(full_text)}자)")
+    if on_scene:
+        on_scene = _once_per_scene(on_scene)
+
+    token_cost = estimate_tokens(SYSTEM_PROMPT + full_text)
+
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter:
+            limiter.acquire(token_cost)
+        try:
+            with telemetry.span("api.llm", story=title, attempt=attempt) as s:
+                if on_scene and LLM_STREAM:
+                    analyzed = _stream_completion(full_text, title, on_scene, s)
+                else:
+                    response = client.chat.completions.create(**build_chat_request(full_text))
+                    if response.usage is not None:
+                        s.set(prompt_tokens=response.usage.prompt_tokens,
+                              completion_tokens=response.usage.completion_tokens)
+                        telemetry.count("llm_tokens_total", response.usage.total_tokens)
+                    analyzed = json.loads(response.choices[0].message.content)
+                    if on_scene:
+                        for scene in analyzed.get('scenes', []):
+                            on_scene(analyzed.get('title', title), scene)
+            if cache is not None:
+                cache.put_json(cache_key, analyzed)
+            return analyzed
+        except RateLimitError as e:
+            if attempt == MAX_RETRIES:
+                break  # 마지막 시도였으면 더 기다리지 않고 포기
+            # 429: Retry-After 만큼 모든 워커를 쉬게 한 뒤 재시도
+            delay = get_retry_after(e.response.headers if e.response is not None else None, attempt)
+            telemetry.count("api_retries_total", service="llm", reason="429")
+            print(f"⏳ 요청 한도 초과 ({title}) - {delay:.1f}초 후 재시도 [{attempt+1}/{MAX_RETRIES}]")
+            if limiter:
+                limiter.penalize(delay)
+            else:
+                time.sleep(delay)
+        except Exception as e:
+            print(f"❌ 오류 발생 ({title}): {e}")
+            return None
+
+    print(f"❌ 재시도 횟수 초과 ({title})")
+    return None
+
+def is_adapted(source, target, seq):
+    """각색 저장소에 지금 원문으로 각색한 결과가 있는지"""
+    done = target.entry(seq)
+    if done is None:
+        return False
+    # 원문 해시를 모르는 항목(기존 JSON에서 옮겨 온 것)은 최신으로 간주
+    return done.get('source_hash') in (None, source.entry(seq).get('source_hash'))
+
+
+def save_adapted(source, target, seq, analyzed):
+    """각색 결과를 원문 해시와 함께 각색 저장소에 기록 (동기/배치 공용)"""
+    analyzed['original_seq'] = seq
+    target.put(seq, analyzed, source_hash=source.entry(seq).get('source_hash'))
+    return analyzed
 
 # -------------------------------------------------------------------------
 # [함수 2] 메인 실행
 # -------------------------------------------------------------------------
-def process_crawled_data(input_file, output_file, limit=None):
-    if not os.path.exists(input_file):
-        print("❌ 크롤링 된 json 파일을 찾을 수 없습니다.")
+def process_crawled_data(input_store=CRAWLED_STORE, output_store=PROCESSED_STORE, limit=None,
+                         workers=STORY_WORKERS, rpm=AZURE_OPENAI_RPM, tpm=AZURE_OPENAI_TPM, on_story=None,
+                         ids=None, titles=None, since=None, on_scene=None, on_discard=None):
+    """
+    크롤링 저장소의 동화를 각색해 각색 저장소에 한 편씩 저장합니다.
+    - ids("12,40-45"), titles, since("6h", "2026-10-01")로 처리할 동화만 고를 수 있습니다.
+    - 이미 각색된 동화는 원문이 바뀌었을 때만 다시 각색합니다. (원문 해시 비교)
+    on_story가 있으면 각색이 끝난 동화(이미 처리돼 있던 것 포함)를 한 편씩 바로 넘깁니다.
+    on_scene이 있으면 각색 중인 동화의 장면이 완성될 때마다 {"title", "original_seq", "scenes": [장면]}을 넘깁니다.
+    on_discard가 있으면 장면을 넘긴 뒤 각색에 실패한 동화를 {"title", "original_seq"}로 알려줍니다. (미리 시작한 작업 정리용)
+    """
+    source = crawled_store(input_store)
+    target = processed_store(output_store)
+    if not len(source):
+        print("❌ 크롤링 된 동화가 없습니다. (먼저 crawl.py 실행)")
         return
 
-    with open(input_file, 'r', encoding='utf-8') as f:
-        crawled_data = json.load(f) 
+    selected = select_seqs(source, ids=ids, titles=titles, since=since, limit=limit, changed_in=[target])
+    print(f"📚 크롤링 저장소: 총 {len(source)}편 중 {len(selected)}편을 처리합니다.\n")
 
-    # 딕셔너리 아이템을 리스트로 변환
-    all_items = list(crawled_data.items())
-    total_count = len(all_items)
-    
-    # limit 적용
-    if limit is not None:
-        target_items = all_items[:limit]
-        print(f"📚 크롤링 데이터 로드 완료: 총 {total_count}개 중 {limit}개만 처리합니다.\n")
-    else:
-        target_items = all_items
-        print(f"📚 크롤링 데이터 로드 완료: 총 {total_count}개 전체를 처리합니다.\n")
-    
-    final_results = []
-
-    # 순회 및 처리
-    for index, (seq_id, story_content) in enumerate(target_items):
-        print(f"[{index+1}/{len(target_items)}] 처리 중...")
-        
-        analyzed = analyze_story_with_gpt(story_content)
-        
+    # 각색 결과는 한 편씩 저장소에 바로 기록 -> 중간에 멈춰도 이어서 처리
+    pending_seqs = [seq for seq in selected if not is_adapted(source, target, seq)]
+    if len(pending_seqs) < len(selected):
+        print(f"⏭️ 이미 처리된 {len(selected) - len(pending_seqs)}편은 건너뜁니다.\n")
+        if on_story:
+            # 이미 각색된 동화도 다음 단계로 넘김
+            pending = set(pending_seqs)
+            for story in target.iter_stories([seq for seq in selected if seq not in pending]):
+                on_story(story)
+
+    # 고정 sleep 대신 배포 쿼터(RPM/TPM)에 맞춘 토큰 버킷으로 속도 조절
+    limiter = RateLimiter(rpm=rpm, tpm=tpm)
+
+    def process_one(index, seq_id):
+        story_content = source.get(seq_id)
+        print(f"[{index+1}/{len(pending_seqs)}] 처리 중...")
+        with telemetry.span("story.adapt", story=story_content.get('title'), seq=seq_id) as s:
+            scene_hook = None
+            if on_scene:
+                scene_hook = lambda title, scene: on_scene({"title": title, "original_seq": seq_id, "scenes": [scene]})
+            analyzed = analyze_story_with_gpt(story_content, limiter=limiter, on_scene=scene_hook)
+            s.set(ok=analyzed is not None)
         if analyzed:
-            analyzed['original_seq'] = seq_id 
-            final_results.append(analyzed)
+            save_adapted(source, target, seq_id, analyzed)
             print(f"✅ '{analyzed['title']}' 처리 완료!\n")
-        
-        time.sleep(1) 
+            if on_story:
+                on_story(analyzed)
+        elif on_scene and on_discard:
+            # 저장되지도 다음 단계로 넘어가지도 않는 동화 -> 미리 넘긴 장면의 작업을 버림
+            on_discard({"title": story_content.get('title'), "original_seq": seq_id})
+        return analyzed
 
-    # 결과 저장
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(final_results, f, ensure_ascii=False, indent=2)
+    # 순회 및 처리 (workers개 동시 진행)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [
+                executor.submit(process_one, index, seq_id)
+                for index, seq_id in enumerate(pending_seqs)
+            ]
+            for future in futures:
+                future.result()
+    finally:
+        LLM_CACHE.evict()
+        stats = LLM_CACHE.stats()
+        print(f"🗃️ LLM 캐시: 적중 {stats['hits']} / 미스 {stats['misses']} (항목 {stats['entries']}개)")
     
-    print(f"🎉 작업 완료! 결과 파일: {output_file}")
+    print(f"🎉 작업 완료! 결과 저장소: {target.root}")
 
 # --- 실행 ---
 if __name__ == "__main__":
     # 테스트를 위해 2개만 실행
-    process_crawled_data("fairy_tales.json", "processed_stories.json", limit=2)
\ No newline at end of file
+    process_crawled_data(limit=2)
\ No newline at end of file
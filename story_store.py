@@ -0,0 +1,296 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from story_stream import iter_stories as iter_legacy_stories
+
+# -------------------------------------------------------------------------
+# [설정] 동화 저장소 (동화 1편 = 파일 1개 + 색인 index.json)
+# -------------------------------------------------------------------------
+STORE_ROOT = os.getenv("STORY_STORE_DIR", "stories")
+CRAWLED_STORE = os.path.join(STORE_ROOT, "crawled")      # 크롤링 원문 (기존 fairy_tales.json)
+PROCESSED_STORE = os.path.join(STORE_ROOT, "processed")  # 각색 결과 (기존 processed_stories.json)
+LEGACY_CRAWLED_FILE = "fairy_tales.json"
+LEGACY_PROCESSED_FILE = "processed_stories.json"
+INDEX_FILE = "index.json"
+
+
+def story_text(crawled_story):
+    """크롤링 원문의 페이지들을 순서대로 이어 붙인 본문 (각색 입력과 같은 텍스트)"""
+    pages = crawled_story.get('pages', {})
+    return " ".join(pages[k] for k in sorted(pages, key=int))
+
+
+def source_hash(crawled_story):
+    return hashlib.sha256(story_text(crawled_story).encode('utf-8')).hexdigest()
+
+
+def _write_json_atomic(path, data, indent=None):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# -------------------------------------------------------------------------
+# [클래스] 동화 저장소
+# -------------------------------------------------------------------------
+class StoryStore:
+    """
+    동화를 seq별 파일(root/{seq}.json)로 저장하고, 작은 색인(index.json)으로 찾습니다.
+    - 색인: seq -> {title, source_hash, scenes, file, bytes, updated}
+    - 전체 파일을 읽지 않고 seq/제목으로 한 편만 꺼내거나, 필요한 것만 차례로 읽을 수 있습니다.
+    - 동화 파일과 색인은 각각 임시 파일에 쓴 뒤 교체하므로 중간에 죽어도 깨지지 않습니다.
+    legacy_file이 있고 저장소가 비어 있으면 기존 JSON 파일을 한 번 옮겨 옵니다.
+    """
+
+    def __init__(self, root, legacy_file=None):
+        self.root = root
+        self._lock = threading.Lock()
+        self._index = None
+        os.makedirs(root, exist_ok=True)
+        if legacy_file and not os.path.exists(self.index_path) and os.path.exists(legacy_file):
+            count = self.import_legacy(legacy_file)
+            print(f"📦 {legacy_file}의 {count}편을 저장소({root})로 옮겼습니다.")
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_FILE)
+
+    def path_for(self, seq):
+        return os.path.join(self.root, f"{seq}.json")
+
+    # ---------------------------------------------------------------------
+    # 색인
+    # ---------------------------------------------------------------------
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f).get("stories", {})
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        ordered = dict(sorted(self._index.items(), key=lambda item: _seq_sort_key(item[0])))
+        self._index = ordered
+        _write_json_atomic(self.index_path, {"stories": ordered}, indent=1)
+
+    def entries(self):
+        """seq 순서의 (seq, 색인 항목) 목록"""
+        with self._lock:
+            return list(self._load_index().items())
+
+    def entry(self, seq):
+        with self._lock:
+            return self._load_index().get(str(seq))
+
+    def seqs(self):
+        return [seq for seq, _ in self.entries()]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load_index())
+
+    def __contains__(self, seq):
+        return self.entry(seq) is not None
+
+    def find(self, title):
+        """제목(또는 파일 이름용으로 정리한 제목)이 같은 동화의 seq"""
+        for seq, entry in self.entries():
+            if entry.get('title') == title or _safe_title(entry.get('title', '')) == _safe_title(title):
+                return seq
+        return None
+
+    # ---------------------------------------------------------------------
+    # 읽기 / 쓰기
+    # ---------------------------------------------------------------------
+    def get(self, seq):
+        try:
+            with open(self.path_for(seq), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def iter_stories(self, seqs=None):
+        """seqs(없으면 전체)를 한 편씩 읽어서 돌려줌"""
+        for seq in (self.seqs() if seqs is None else seqs):
+            story = self.get(seq)
+            if story is not None:
+                yield story
+
+    def put(self, seq, story, source_hash=None, _save_index=True):
+        """동화 한 편을 원자적으로 저장하고 색인을 갱신합니다."""
+        seq = str(seq)
+        path = self.path_for(seq)
+        _write_json_atomic(path, story, indent=2)
+        entry = {
+            "title": story.get('title'),
+            "source_hash": source_hash,
+            "scenes": len(story.get('scenes', [])),
+            "file": os.path.basename(path),
+            "bytes": os.path.getsize(path),
+            "updated": time.time(),
+        }
+        with self._lock:
+            self._load_index()[seq] = entry
+            if _save_index:
+                self._save_index()
+        return entry
+
+    def import_legacy(self, path):
+        """fairy_tales.json(seq -> 원문) 또는 processed_stories.json/.jsonl(각색 결과 배열)을 옮겨 옴"""
+        count = 0
+        if path.endswith(".jsonl") or _is_json_array(path):
+            for story in iter_legacy_stories(path):
+                self.put(story.get('original_seq'), story, _save_index=False)
+                count += 1
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                crawled = json.load(f)
+            for seq, story in crawled.items():
+                self.put(seq, story, source_hash=source_hash(story), _save_index=False)
+                count += 1
+        with self._lock:
+            self._save_index()
+        return count
+
+
+def _seq_sort_key(seq):
+    return (0, int(seq), "") if str(seq).isdigit() else (1, 0, str(seq))
+
+
+def _safe_title(title):
+    return "".join([c for c in title if c.isalnum() or c in (' ', '_')]).strip()
+
+
+def _is_json_array(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(64).lstrip()
+    return head.startswith("[")
+
+
+def crawled_store(root=CRAWLED_STORE):
+    return StoryStore(root, legacy_file=LEGACY_CRAWLED_FILE if root == CRAWLED_STORE else None)
+
+
+def processed_store(root=PROCESSED_STORE):
+    return StoryStore(root, legacy_file=LEGACY_PROCESSED_FILE if root == PROCESSED_STORE else None)
+
+
+# -------------------------------------------------------------------------
+# [함수] 처리할 동화 고르기 (seq 목록/범위, 제목, 변경 시각)
+# -------------------------------------------------------------------------
+def parse_ids(spec):
+    """
+    "12,40-45,101" -> [(12, 12), (40, 45), (101, 101)]
+    리스트/튜플도 받음 (각 항목은 seq 또는 "시작-끝")
+    """
+    if spec is None:
+        return None
+    items = spec.split(",") if isinstance(spec, str) else [str(s) for s in spec]
+    ranges = []
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+        match = re.fullmatch(r"(\d+)\s*-\s*(\d+)", item)
+        if match:
+            ranges.append((int(match.group(1)), int(match.group(2))))
+        elif item.isdigit():
+            ranges.append((int(item), int(item)))
+        else:
+            raise ValueError(f"seq 형식이 아닙니다: {item!r} (예: 12,40-45)")
+    return ranges
+
+
+def parse_since(value):
+    """
+    변경 기준 시각 -> epoch 초
+    - 숫자: epoch 초, "2026-10-01" / "2026-10-01T09:00": 날짜(로컬 시각)
+    - "30m", "6h", "2d": 지금으로부터 그만큼 전
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    value = value.strip()
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([smhd])", value)
+    if match:
+        unit = {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+        return time.time() - float(match.group(1)) * unit
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def select_seqs(store, ids=None, titles=None, since=None, limit=None, changed_in=()):
+    """
+    store에서 조건에 맞는 seq를 seq 순서대로 고릅니다. (조건이 없으면 전체)
+    - ids: "12,40-45" 형식 또는 목록, titles: 제목 목록
+    - since: 이 시각 이후 store(또는 changed_in의 다른 저장소)에서 바뀐 동화만
+    - limit: 앞에서부터 N편
+    """
+    ranges = parse_ids(ids)
+    since = parse_since(since)
+    title_seqs = None
+    if titles:
+        title_seqs = set()
+        for title in ([titles] if isinstance(titles, str) else titles):
+            seq = store.find(title)
+            if seq is None:
+                print(f"⚠️ 제목으로 동화를 찾지 못했습니다: {title}")
+            else:
+                title_seqs.add(seq)
+
+    selected = []
+    for seq, entry in store.entries():
+        if ranges is not None or title_seqs is not None:
+            in_ranges = ranges is not None and seq.isdigit() and any(lo <= int(seq) <= hi for lo, hi in ranges)
+            in_titles = title_seqs is not None and seq in title_seqs
+            if not (in_ranges or in_titles):
+                continue
+        if since is not None:
+            updated = [entry.get('updated', 0)]
+            updated += [(other.entry(seq) or {}).get('updated', 0) for other in changed_in]
+            if max(updated) < since:
+                continue
+        selected.append(seq)
+        if limit is not None and len(selected) >= limit:
+            break
+    return selected
+
+
+def iter_selected(source=PROCESSED_STORE, ids=None, titles=None, since=None, limit=None):
+    """
+    각 단계 main()용: 각색 저장소에서 고른 동화만 한 편씩 읽어서 돌려줌
+    source가 기존 .json/.jsonl 파일이면 파일을 차례로 읽으면서 ids/titles/limit로 거름
+    (파일에는 동화별 변경 시각이 없어서 since는 저장소에서만 쓸 수 있음)
+    """
+    if os.path.isfile(source):
+        if since is not None:
+            raise ValueError(f"since는 동화 저장소에서만 쓸 수 있습니다. ({source}는 파일)")
+        ranges = parse_ids(ids)
+        title_set = {_safe_title(t) for t in ([titles] if isinstance(titles, str) else titles)} if titles else None
+        count = 0
+        for story in iter_legacy_stories(source):
+            if limit is not None and count >= limit:
+                return
+            if ranges is not None or title_set is not None:
+                seq = str(story.get('original_seq', ''))
+                in_ranges = ranges is not None and seq.isdigit() and any(lo <= int(seq) <= hi for lo, hi in ranges)
+                in_titles = title_set is not None and _safe_title(story.get('title', '')) in title_set
+                if not (in_ranges or in_titles):
+                    continue
+            count += 1
+            yield story
+        return
+    store = processed_store(source)
+    seqs = select_seqs(store, ids=ids, titles=titles, since=since, limit=limit)
+    print(f"📚 {store.root}: {len(store)}편 중 {len(seqs)}편 선택")
+    yield from store.iter_stories(seqs)
@@ -0,0 +1,74 @@
+import json
+import os
+
+
+# -------------------------------------------------------------------------
+# [함수 1] JSONL 읽기 (예전 각색 저널 processed_stories.jsonl)
+# -------------------------------------------------------------------------
+def iter_jsonl(path):
+    """한 줄에 동화 하나씩 읽습니다. 쓰는 도중 강제 종료되어 잘린 줄은 건너뜀"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 증분 읽기 (파일 전체를 json.load 하지 않음)
+# -------------------------------------------------------------------------
+def iter_json_array(path, chunk_size=1 << 16):
+    """JSON 배열 파일을 조금씩 읽으면서 원소를 하나씩 돌려줍니다."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        started = False
+        eof = False
+        while True:
+            # 앞쪽 공백/구분자 정리
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer and not eof:
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buffer += chunk
+                    continue
+                if not buffer.startswith('['):
+                    raise ValueError(f"JSON 배열 파일이 아닙니다: {path}")
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer.startswith(','):
+                buffer = buffer[1:]
+                continue
+            if buffer.startswith(']'):
+                return
+            try:
+                obj, end = decoder.raw_decode(buffer)
+                # 숫자/true 같은 값은 "12" + "3.5"처럼 잘려 읽힐 수 있으므로 뒤에 , 또는 ]가 보일 때까지 더 읽음
+                complete = eof or buffer[end:].lstrip()[:1] in (',', ']')
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield obj
+            buffer = buffer[end:]
+
+
+def iter_stories(path):
+    """.jsonl이든 .json 배열이든 동화를 하나씩 읽어옵니다."""
+    if path.endswith(".jsonl"):
+        yield from iter_jsonl(path)
+    else:
+        yield from iter_json_array(path)
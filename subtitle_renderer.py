@@ -0,0 +1,120 @@
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# -------------------------------------------------------------------------
+# [설정] 자막 스프라이트 기본값
+# -------------------------------------------------------------------------
+STROKE_WIDTH = 2       # 글자 테두리 두께
+STROKE_COLOR = "black"
+BOX_PADDING = 20       # 배경 박스 여백
+LINE_SPACING = 10      # 줄 간격 여유분
+BOTTOM_MARGIN = 100    # pos='bottom'일 때 바닥에서 띄우는 거리
+TOP_MARGIN = 100
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 폰트 / 글자 폭 캐시
+# -------------------------------------------------------------------------
+@lru_cache(maxsize=32)
+def load_font(font_path, font_size):
+    try:
+        return ImageFont.truetype(font_path, font_size)
+    except OSError:
+        print(f"⚠️ 폰트 로드 실패({font_path}). 기본 폰트를 사용합니다.")
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=8192)
+def text_width(font_path, font_size, text):
+    """단어/줄의 픽셀 폭 (같은 단어는 한 번만 측정)"""
+    return load_font(font_path, font_size).getlength(text)
+
+
+def wrap_text(text, font_path, font_size, max_width_px):
+    """
+    화면 폭을 넘지 않게 어절 단위로 줄바꿈합니다.
+    줄 전체를 매번 다시 재지 않고, 캐시된 단어 폭을 더해가며 판단합니다.
+    """
+    space_w = text_width(font_path, font_size, " ")
+    visual_lines = []
+
+    # 입력된 텍스트가 이미 줄바꿈이 되어 있을 수도 있으므로 split('\n') 처리
+    for paragraph in text.split('\n'):
+        current_line = []
+        current_w = 0.0
+        for word in paragraph.split():
+            word_w = text_width(font_path, font_size, word)
+            test_w = current_w + (space_w if current_line else 0) + word_w
+            if test_w <= max_width_px or not current_line:
+                current_line.append(word)
+                current_w = test_w
+            else:
+                # 넘치면 현재 줄 저장하고 다음 줄로 이동
+                visual_lines.append(" ".join(current_line))
+                current_line = [word]
+                current_w = word_w
+        if current_line:
+            visual_lines.append(" ".join(current_line))
+    return visual_lines
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 자막 스프라이트 (글자가 있는 영역만 잘라낸 RGBA 이미지)
+# -------------------------------------------------------------------------
+@lru_cache(maxsize=512)
+def render_text_sprite(text, font_path, font_size, color, bg_color=None, max_width_px=1305):
+    """
+    텍스트를 딱 맞는 크기의 RGBA 스프라이트로 그립니다. (같은 텍스트/스타일은 재사용)
+    반환: (RGBA numpy 배열, 텍스트 블록 높이)
+    """
+    font = load_font(font_path, font_size)
+    visual_lines = wrap_text(text, font_path, font_size, max_width_px)
+
+    ascent, descent = font.getmetrics()
+    line_height = ascent + descent + LINE_SPACING
+    total_text_h = line_height * len(visual_lines)
+    line_widths = [font.getbbox(line)[2] if line else 0 for line in visual_lines]
+    max_line_w = max(line_widths, default=0)
+
+    has_box = bool(bg_color) and bool(text.strip())
+    pad = BOX_PADDING if has_box else STROKE_WIDTH + 2
+    sprite_w = int(max_line_w + pad * 2) + 1
+    sprite_h = int(total_text_h + pad * 2) + 1
+
+    img = Image.new('RGBA', (sprite_w, sprite_h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+
+    # 배경 박스 (텍스트가 있을 경우만)
+    if has_box:
+        draw.rectangle([0, 0, max_line_w + pad * 2, total_text_h + pad * 2 - 5], fill=bg_color)
+
+    # 텍스트 그리기: PIL 내장 stroke로 테두리까지 한 번에
+    cur_y = pad
+    for line, w in zip(visual_lines, line_widths):
+        x = pad + (max_line_w - w) / 2  # ★ 중앙 정렬
+        draw.text((x, cur_y), line, font=font, fill=color,
+                  stroke_width=STROKE_WIDTH, stroke_fill=STROKE_COLOR)
+        cur_y += line_height
+
+    sprite = np.array(img)
+    sprite.setflags(write=False)  # 캐시에서 공유하므로 읽기 전용
+    return sprite, total_text_h
+
+
+def sprite_position(sprite, total_text_h, frame_size, pos='center'):
+    """프레임 안에서 스프라이트 좌상단 좌표 (기존 전체 화면 레이어와 같은 위치)"""
+    W, H = frame_size
+    sprite_h, sprite_w = sprite.shape[:2]
+    pad_y = (sprite_h - 1 - total_text_h) / 2
+
+    # Y 좌표 결정 (텍스트 첫 줄 기준)
+    if pos == 'center':
+        y = (H - total_text_h) / 2
+    elif pos == 'bottom':
+        y = H - total_text_h - BOTTOM_MARGIN
+    else:
+        y = TOP_MARGIN
+
+    x = (W - (sprite_w - 1)) / 2
+    return int(round(x)), int(round(y - pad_y))
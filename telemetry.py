@@ -0,0 +1,267 @@
+import atexit
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# -------------------------------------------------------------------------
+# [설정] 계측 (구간 기록 / 지표 내보내기 / 샘플링 프로파일러)
+# -------------------------------------------------------------------------
+TELEMETRY_ENABLED = os.getenv("TELEMETRY", "1") != "0"
+TELEMETRY_DIR = os.getenv("TELEMETRY_DIR", ".telemetry")
+TRACE_FILE = os.path.join(TELEMETRY_DIR, "trace.jsonl")      # 구간(span) 기록, 한 줄에 하나
+METRICS_FILE = os.path.join(TELEMETRY_DIR, "metrics.prom")   # Prometheus 텍스트 형식
+METRIC_PREFIX = "fairy_"
+
+# 샘플링 프로파일러를 켤 단계 (예: TELEMETRY_PROFILE=video,subtitles), 기본은 꺼짐
+PROFILE_STAGES = {s.strip() for s in os.getenv("TELEMETRY_PROFILE", "").split(",") if s.strip()}
+PROFILE_INTERVAL = float(os.getenv("TELEMETRY_PROFILE_INTERVAL", "0.005"))
+
+# 지연 시간 히스토그램 구간(초): API 호출(수백 ms ~ 수 분)과 인코딩을 함께 담을 수 있게
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_lock = threading.Lock()
+_local = threading.local()
+_span_ids = itertools.count(1)
+_counters = {}     # (이름, 라벨) -> 값
+_histograms = {}   # (이름, 라벨) -> [구간별 개수..., 합계, 개수]
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+# -------------------------------------------------------------------------
+# [함수 1] 카운터 / 히스토그램
+# -------------------------------------------------------------------------
+def count(name, value=1, **labels):
+    """누적 카운터 (재시도 횟수, 저장한 바이트 수 등)"""
+    if not TELEMETRY_ENABLED:
+        return
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """지연 시간 히스토그램에 값(초)을 추가"""
+    if not TELEMETRY_ENABLED:
+        return
+    key = (name, _labels_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                hist[i] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+# -------------------------------------------------------------------------
+# [함수 2] 구간(span) 기록
+# -------------------------------------------------------------------------
+class Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_span_ids)
+        self.parent_id = None
+        self.status = "ok"
+
+    def set(self, **attrs):
+        """구간이 끝나기 전에 속성 추가 (응답 크기, 재시도 횟수 등)"""
+        self.attrs.update(attrs)
+
+
+def _write_trace(event):
+    line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        os.makedirs(TELEMETRY_DIR, exist_ok=True)
+        with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    with span("api.image", story=title, scene=3) as s: ...
+    끝나면 trace.jsonl에 한 줄을 남기고, span_seconds{span=name} 히스토그램에 소요 시간을 더합니다.
+    같은 스레드 안에서 중첩된 구간은 parent_id로 연결됩니다.
+    """
+    current = Span(name, attrs)
+    if not TELEMETRY_ENABLED:
+        yield current
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    current.parent_id = stack[-1].span_id if stack else None
+    stack.append(current)
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attrs.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        stack.pop()
+        observe("span_seconds", duration, span=name)
+        _write_trace({
+            "name": name,
+            "span_id": f"{os.getpid()}-{current.span_id}",
+            "parent_id": f"{os.getpid()}-{current.parent_id}" if current.parent_id else None,
+            "start": started_at,
+            "duration": duration,
+            "status": current.status,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "attrs": current.attrs,
+        })
+
+
+def traced(name, attrs=None):
+    """
+    함수 전체를 구간으로 기록하는 데코레이터.
+    attrs(*args, **kwargs)가 있으면 그 반환값(딕셔너리)을 구간 속성으로 씀
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **(attrs(*args, **kwargs) if attrs else {})):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def story_attrs(story_data, *args, **kwargs):
+    """traced()용: 첫 번째 인자(동화 데이터)의 제목/번호"""
+    return {"story": story_data.get('title'), "seq": story_data.get('original_seq')}
+
+
+# -------------------------------------------------------------------------
+# [함수 3] Prometheus 텍스트 형식으로 내보내기
+# -------------------------------------------------------------------------
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (extra or [])
+    if not items:
+        return ""
+    escaped = (f'{k}="{_escape_label(v)}"' for k, v in items)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_metrics():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+
+    lines = []
+    for metric in sorted({name for name, _ in counters}):
+        full = f"{METRIC_PREFIX}{metric}"
+        lines.append(f"# TYPE {full} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{full}{_format_labels(labels)} {value}")
+
+    for metric in sorted({name for name, _ in histograms}):
+        full = f"{METRIC_PREFIX}{metric}"
+        lines.append(f"# TYPE {full} histogram")
+        for (name, labels), hist in sorted(histograms.items()):
+            if name != metric:
+                continue
+            for bound, bucket_count in zip(LATENCY_BUCKETS, hist):
+                lines.append(f"{full}_bucket{_format_labels(labels, [('le', bound)])} {bucket_count}")
+            lines.append(f"{full}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+            lines.append(f"{full}_sum{_format_labels(labels)} {hist[-2]}")
+            lines.append(f"{full}_count{_format_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(path=METRICS_FILE):
+    """현재까지의 카운터/히스토그램을 path에 원자적으로 저장 (node_exporter textfile 수집기 등에서 읽음)"""
+    if not TELEMETRY_ENABLED:
+        return None
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_metrics())
+    os.replace(tmp_path, path)
+    return path
+
+
+def _export_at_exit():
+    # 프로세스 풀의 작업 프로세스는 부모의 지표 파일을 덮어쓰지 않음 (구간 기록은 trace.jsonl에 함께 남음)
+    if multiprocessing.parent_process() is None and (_counters or _histograms):
+        export_metrics()
+
+
+atexit.register(_export_at_exit)
+
+
+# -------------------------------------------------------------------------
+# [함수 4] 샘플링 프로파일러 (CPU 단계용, TELEMETRY_PROFILE로 켬)
+# -------------------------------------------------------------------------
+class _Sampler(threading.Thread):
+    """대상 스레드의 호출 스택을 주기적으로 찍어 접힌 스택(flamegraph 입력) 개수를 모읍니다."""
+
+    def __init__(self, target_thread_id, interval):
+        super().__init__(name="telemetry-sampler", daemon=True)
+        self.target = target_thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                key = ";".join(reversed(names))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def profile(stage, label=None):
+    """
+    TELEMETRY_PROFILE에 stage가 있을 때만 현재 스레드를 샘플링해서
+    .telemetry/profile_{stage}_{label}.folded 로 저장합니다. (없으면 아무 일도 하지 않음)
+    """
+    if stage not in PROFILE_STAGES:
+        yield None
+        return
+
+    sampler = _Sampler(threading.get_ident(), PROFILE_INTERVAL)
+    sampler.start()
+    try:
+        yield sampler
+    finally:
+        sampler.stop()
+        safe_label = "".join(c for c in str(label or os.getpid()) if c.isalnum() or c in "-_")
+        path = os.path.join(TELEMETRY_DIR, f"profile_{stage}_{safe_label}.folded")
+        os.makedirs(TELEMETRY_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, samples in sorted(sampler.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {samples}\n")
+        print(f"  🔬 프로파일 저장: {path} (샘플 {sum(sampler.stacks.values())}개)")
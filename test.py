@@ -1,6 +1,6 @@
 import os
-import azure.cognitiveservices.speech as speechsdk
 from dotenv import load_dotenv
+from speech_engine import SpeechEngine
 
 # 1. .env 파일 로드 (키 보안)
 load_dotenv()
@@ -15,33 +15,19 @@ def text_to_speech_hyunsu(text, output_filename):
         print("❌ .env 파일에 SPEECH_KEY 또는 SPEECH_REGION이 없습니다.")
         return
 
-    # 2. 스피치 설정
-    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=service_region)
-    
+    # 2. 공용 합성 엔진 생성 (합성기 풀 + 미리 열어둔 연결, 재시도 포함)
+    engine = SpeechEngine(key=speech_key, region=service_region, max_concurrency=1)
+
     # ★ 핵심: 목소리를 '현수'로 설정
     # 현수는 차분한 남성 톤이라 내레이션(해설)에 아주 적합해
-    speech_config.speech_synthesis_voice_name = "ko-KR-HyunsuNeural" 
-
-    # 3. 오디오 출력 설정 (스피커가 아니라 파일로 저장!)
-    # 이걸 안 하면 그냥 컴퓨터 스피커로 말하고 끝남
-    audio_config = speechsdk.audio.AudioOutputConfig(filename=output_filename)
-
-    # 4. 합성기 생성
-    speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
+    voice_name = "ko-KR-HyunsuNeural"
 
     print(f"🎙️ '현수'가 녹음을 시작합니다: {output_filename}")
 
-    # 5. 텍스트 -> 음성 변환 (비동기 호출 후 대기)
-    result = speech_synthesizer.speak_text_async(text).get()
-
-    # 6. 결과 확인
-    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+    # 3. 텍스트 -> 음성 변환 후 파일로 저장 (스피커가 아니라 파일로!)
+    if engine.synthesize_to_file(text, voice_name, output_filename):
         print(f"✅ 녹음 성공! 파일 저장됨: [{output_filename}]")
-    elif result.reason == speechsdk.ResultReason.Canceled:
-        cancellation_details = result.cancellation_details
-        print(f"❌ 취소됨: {cancellation_details.reason}")
-        if cancellation_details.reason == speechsdk.CancellationReason.Error:
-            print(f"❌ 에러 상세: {cancellation_details.error_details}")
+    engine.close()
 
 # --- 실행 ---
 if __name__ == "__main__":
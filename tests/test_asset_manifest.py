@@ -0,0 +1,69 @@
+import os
+from asset_manifest import (
+    asset_entry, changed_inputs, fresh_asset, line_key, load_asset_manifest, update_asset_manifest
+)
+
+INPUTS = {"text": "옛날 옛적에", "voice": "ko-KR-SunHiNeural", "format": "mp3"}
+
+
+def _write(path, data=b"audio"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def _recorded(story_dir, key, path, inputs=INPUTS):
+    update_asset_manifest(story_dir, {key: asset_entry(path, inputs, story_dir)})
+    return load_asset_manifest(story_dir)
+
+
+def test_fresh_when_inputs_and_file_match(tmp_path):
+    story_dir = str(tmp_path)
+    path = _write(tmp_path / "audio" / "S01_000.mp3")
+    manifest = _recorded(story_dir, line_key(1, 0), path)
+    assert fresh_asset(manifest, line_key(1, 0), dict(INPUTS), story_dir, path) == path
+    assert fresh_asset(manifest, line_key(1, 0), INPUTS, story_dir) == path
+
+
+def test_stale_when_any_input_changes(tmp_path):
+    story_dir = str(tmp_path)
+    path = _write(tmp_path / "audio" / "S01_000.mp3")
+    manifest = _recorded(story_dir, line_key(1, 0), path)
+    changed = {**INPUTS, "voice": "ko-KR-InJoonNeural"}
+    assert fresh_asset(manifest, line_key(1, 0), changed, story_dir, path) is None
+    assert changed_inputs(manifest, line_key(1, 0), changed) == ["voice"]
+
+
+def test_stale_when_file_is_missing_or_renamed(tmp_path):
+    story_dir = str(tmp_path)
+    path = _write(tmp_path / "audio" / "S01_000.mp3")
+    manifest = _recorded(story_dir, line_key(1, 0), path)
+    # 파일 이름 규칙이 바뀌면 (예: 확장자) 다시 만듦
+    assert fresh_asset(manifest, line_key(1, 0), INPUTS, story_dir, str(tmp_path / "audio" / "S01_000.wav")) is None
+    os.remove(path)
+    assert fresh_asset(manifest, line_key(1, 0), INPUTS, story_dir, path) is None
+
+
+def test_unknown_key_is_not_fresh(tmp_path):
+    assert fresh_asset({}, line_key(1, 0), INPUTS, str(tmp_path)) is None
+    assert changed_inputs({}, line_key(1, 0), INPUTS) == ["new"]
+
+
+def test_update_removes_replaced_and_pruned_files(tmp_path):
+    story_dir = str(tmp_path)
+    old = _write(tmp_path / "audio" / "S01_000_해설.mp3")
+    dropped = _write(tmp_path / "audio" / "S01_001_소녀.mp3")
+    update_asset_manifest(story_dir, {
+        line_key(1, 0): asset_entry(old, INPUTS, story_dir),
+        line_key(1, 1): asset_entry(dropped, INPUTS, story_dir),
+    })
+
+    # 대사 0의 화자가 바뀌어 파일 이름이 달라지고, 대사 1은 대본에서 빠짐
+    new = _write(tmp_path / "audio" / "S01_000_소년.mp3")
+    update_asset_manifest(story_dir, {line_key(1, 0): asset_entry(new, INPUTS, story_dir)},
+                          prune_prefix="line/", keep=[line_key(1, 0)])
+
+    assert set(load_asset_manifest(story_dir)) == {line_key(1, 0)}
+    assert os.path.exists(new)
+    assert not os.path.exists(old) and not os.path.exists(dropped)
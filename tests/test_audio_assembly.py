@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+import audio_assembly
+from audio_assembly import _db_to_gain, _open_wav, _read_pcm, analyze_pcm, apply_layout, assemble_story_audio, voice_gains
+from audio_io import parse_wav, wav_bytes
+
+SR = 1000  # 분석 테스트: 프레임 10샘플, TRIM_KEEP 40샘플
+
+
+def _tone(value, n):
+    return np.full(n, value, dtype=np.int16)
+
+
+def _silence(n):
+    return np.zeros(n, dtype=np.int16)
+
+
+def _stats(rms, peak, active=1000):
+    return {"lead": 0, "tail": 0, "energy": rms * rms * active, "active": active, "peak": peak}
+
+
+# ---- 분석 ----
+def test_analyze_trims_lead_and_tail_but_keeps_margin():
+    pcm = np.concatenate([_silence(200), _tone(10000, 300), _silence(500)])
+    s = analyze_pcm(pcm, SR)
+    keep = int(audio_assembly.TRIM_KEEP * SR)
+    assert (s["lead"], s["tail"]) == (200 - keep, 500 - keep)
+    assert s["active"] == 300
+    assert s["energy"] == pytest.approx(300 * (10000 / 32768) ** 2, rel=1e-5)
+    assert s["peak"] == pytest.approx(10000 / 32768)
+
+
+def test_analyze_does_not_trim_past_the_edges():
+    pcm = np.concatenate([_silence(20), _tone(5000, 100), _silence(10)])
+    s = analyze_pcm(pcm, SR)
+    assert (s["lead"], s["tail"]) == (0, 0)
+
+
+def test_analyze_all_silent_keeps_everything():
+    quiet = _tone(50, 400)  # -45dB(약 184)보다 작음
+    s = analyze_pcm(quiet, SR)
+    assert (s["lead"], s["tail"], s["active"], s["energy"]) == (0, 0, 0, 0.0)
+    assert s["peak"] == pytest.approx(50 / 32768)
+    assert analyze_pcm(_silence(5), SR)["active"] == 0  # 프레임 1개도 안 되는 길이
+
+
+# ---- 음량 ----
+def test_voice_gains_reach_target_level():
+    target = _db_to_gain(audio_assembly.TARGET_LOUDNESS_DB)
+    gains = voice_gains([("a", _stats(target / 2, 0.2)), ("b", _stats(target, 0.2)), ("c", _stats(0, 0, active=0))])
+    assert gains["a"] == pytest.approx(2.0)
+    assert gains["b"] == pytest.approx(1.0)
+    assert gains["c"] == 1.0
+
+
+def test_voice_gains_are_clamped_to_12_db():
+    gains = voice_gains([("quiet", _stats(0.001, 0.002)), ("loud", _stats(0.9, 0.9))])
+    assert gains["quiet"] == pytest.approx(_db_to_gain(12.0))
+    assert gains["loud"] == pytest.approx(_db_to_gain(-12.0))
+
+
+def test_voice_gains_respect_peak_ceiling():
+    target = _db_to_gain(audio_assembly.TARGET_LOUDNESS_DB)
+    gains = voice_gains([("a", _stats(target / 2, 0.8))])
+    assert gains["a"] == pytest.approx(_db_to_gain(audio_assembly.PEAK_CEILING_DB) / 0.8)
+    assert gains["a"] * 0.8 <= _db_to_gain(audio_assembly.PEAK_CEILING_DB) + 1e-9
+
+
+def test_voice_gains_pool_lines_of_the_same_voice():
+    target = _db_to_gain(audio_assembly.TARGET_LOUDNESS_DB)
+    # 같은 보이스의 대사는 합쳐서 RMS 계산 (대사마다 따로 맞추지 않음)
+    gains = voice_gains([("a", _stats(target, 0.2)), ("a", _stats(target, 0.2))])
+    assert gains == {"a": pytest.approx(1.0)}
+
+
+# ---- WAV ----
+def test_open_wav_and_read_pcm_round_trip(tmp_path):
+    path = tmp_path / "track.wav"
+    track = _open_wav(str(path), 100, 24000)
+    track[:] = np.arange(100, dtype=np.int16) * 3
+    track.flush()
+    del track
+    data = path.read_bytes()
+    info = parse_wav(data)
+    assert (info["sample_rate"], info["channels"], info["bits"], info["size"]) == (24000, 1, 16, 200)
+
+    out = np.zeros(150, dtype=np.int16)
+    assert _read_pcm(data, out, 24000) == 100
+    assert np.array_equal(out[:100], np.arange(100) * 3) and not out[100:].any()
+    assert _read_pcm(data, out, 48000) is None  # 샘플레이트가 다르면 FFmpeg 경로로
+
+
+def test_read_pcm_warns_on_overflow(capsys):
+    data = wav_bytes(_tone(7, 50).tobytes(), 24000)
+    out = np.zeros(30, dtype=np.int16)
+    assert _read_pcm(data, out, 24000, "S01_000.wav") == 30
+    assert "20샘플을 버렸습니다: S01_000.wav" in capsys.readouterr().out
+
+
+# ---- 레이아웃 적용 ----
+def test_apply_layout_retimes_subtitles_after_trim(tmp_path):
+    timeline = {
+        "paths": {"story_dir": str(tmp_path)}, "intro": None,
+        "scenes": [{
+            "scene_num": 1, "duration": 5.0,
+            "lines": [{"start": 0.0, "duration": 2.0, "voice": "a"}, {"start": 2.15, "duration": 1.0, "voice": "b"}],
+            "subtitles": [
+                {"text": "앞 무음 안", "start": 0.0, "duration": 0.2, "line": 0},
+                {"text": "첫 대사", "start": 0.5, "duration": 1.0, "line": 0},
+                {"text": "두 번째", "start": 2.15, "duration": 1.0, "line": 1},
+            ],
+        }],
+    }
+    layout = {"track": "audio/story_track.wav", "settings": {}, "gains": {"a": 0.0, "b": 3.0, "c": 1.0},
+              "segments": [{"start": 0.0, "duration": 2.5, "lines": [
+                  {"start": 0.0, "duration": 1.0, "trim": 0.3}, {"start": 1.15, "duration": 0.85, "trim": 0.0}]}]}
+    scene = apply_layout(timeline, layout)["scenes"][0]
+    subs = [(s["text"], round(s["start"], 4), round(s["duration"], 4)) for s in scene["subtitles"]]
+    # 앞 무음에만 걸친 자막은 빠지고, 나머지는 자른 만큼 당긴 뒤 대사 길이 안으로 자름
+    assert subs == [("첫 대사", 0.2, 0.8), ("두 번째", 1.15, 0.85)]
+    assert [(l["start"], l["duration"]) for l in scene["lines"]] == [(0.0, 1.0), (1.15, 0.85)]
+    assert (scene["duration"], scene["audio_start"]) == (2.5, 0.0)
+    assert scene["gains"] == {"a": 0.0, "b": 3.0}
+    assert timeline["audio_track"].endswith("story_track.wav")
+
+
+# ---- 조립 (FFmpeg 없이 decode 주입) ----
+def test_assemble_story_audio_with_injected_decode(tmp_path, monkeypatch):
+    sr = audio_assembly.AUDIO_SAMPLE_RATE
+    keep = int(audio_assembly.TRIM_KEEP * sr)
+    pad = sr // 10
+    target = int(round(_db_to_gain(audio_assembly.TARGET_LOUDNESS_DB) * 32768))
+    sources = {
+        "a1.wav": np.concatenate([_silence(pad), _tone(target, sr // 5), _silence(pad)]),
+        "b1.wav": _tone(target // 2, sr // 5),
+        "a2.wav": _tone(target, sr // 10),
+    }
+
+    def decode(source, out, sample_rate):
+        pcm = sources[source]
+        out[:len(pcm)] = pcm
+        return len(pcm)
+
+    monkeypatch.setattr(audio_assembly, "DECODE_WORKERS", 2)
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    line = lambda name, voice: {"audio": name, "voice": voice, "duration": len(sources[name]) / sr}
+    timeline = {"title": "해님 달님", "intro": None,
+                "paths": {"story_dir": str(tmp_path), "audio_dir": str(audio_dir)},
+                "scenes": [{"scene_num": 1, "lines": [line("a1.wav", "a"), line("b1.wav", "b")]},
+                           {"scene_num": 2, "lines": [line("a2.wav", "a")]}]}
+    layout = assemble_story_audio(timeline, decode=decode)
+
+    gap, tail = int(audio_assembly.AUDIO_LINE_GAP * sr), int(audio_assembly.AUDIO_SCENE_GAP * sr)
+    kept_a1 = sr // 5 + 2 * keep
+    scene1 = kept_a1 + gap + sr // 5 + tail
+    s1, s2 = layout["segments"]
+    assert s1["lines"][0] == {"start": 0.0, "duration": kept_a1 / sr, "trim": (pad - keep) / sr}
+    assert s1["lines"][1]["start"] == pytest.approx((kept_a1 + gap) / sr)
+    assert s1["duration"] == pytest.approx(scene1 / sr)
+    assert s2["start"] == pytest.approx(scene1 / sr)
+    assert layout["duration"] == pytest.approx((scene1 + sr // 10 + tail) / sr)
+    assert layout["gains"]["a"] == pytest.approx(0.0, abs=0.01)
+    assert layout["gains"]["b"] == pytest.approx(6.02, abs=0.01)
+
+    track = np.frombuffer((audio_dir / "story_track.wav").read_bytes()[44:], dtype="<i2")
+    assert len(track) == int(round(layout["duration"] * sr))
+    assert track[keep - 1] == 0 and track[keep] == target          # 남겨 둔 앞 여유 뒤에 말소리
+    b_start = kept_a1 + gap
+    assert abs(int(track[b_start]) - target) <= 1                   # b는 2배로 맞춰짐
+    assert not track[b_start + sr // 5:scene1].any()                 # 장면 끝 여유는 무음
+    assert not (tmp_path / ".render" / "decode_buffer.pcm").exists()
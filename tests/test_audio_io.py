@@ -0,0 +1,73 @@
+import struct
+import pytest
+from audio_io import AudioBufferPool, audio_duration, can_split, is_wav, parse_wav, split_audio, split_wav, wav_bytes, wav_duration
+from content_cache import ContentCache
+from fake_services import FakeSpeechEngine, ServiceProfile
+
+RATE = 24000
+
+
+def _pcm(seconds, rate=RATE):
+    # 샘플마다 값이 달라야 잘린 위치를 확인할 수 있음
+    return b"".join(struct.pack("<h", i % 32000) for i in range(int(seconds * rate)))
+
+
+def test_wav_round_trip():
+    pcm = _pcm(0.5)
+    data = wav_bytes(pcm, RATE)
+    assert is_wav(data) and not is_wav(b"\xff\xf3" + data[2:])
+    info = parse_wav(data)
+    assert (info["sample_rate"], info["channels"], info["bits"], info["size"]) == (RATE, 1, 16, len(pcm))
+    assert data[info["offset"]:] == pcm
+    assert wav_duration(data) == pytest.approx(0.5)
+    assert audio_duration(data, ".wav") == pytest.approx(0.5)
+
+
+def test_split_wav_cuts_on_sample_boundaries():
+    pcm = _pcm(1.0)
+    pieces = split_wav(wav_bytes(pcm, RATE), [0.25, 0.6])
+    assert [round(wav_duration(p), 3) for p in pieces] == [0.25, 0.35, 0.4]
+    # 조각을 이어 붙이면 원래 PCM과 같음 (빠지거나 겹치는 샘플 없음)
+    assert b"".join(p[parse_wav(p)["offset"]:] for p in pieces) == pcm
+
+
+def test_split_wav_clamps_boundaries_past_the_end():
+    pieces = split_wav(wav_bytes(_pcm(0.2), RATE), [0.1, 5.0])
+    assert wav_duration(pieces[0]) == pytest.approx(0.1)
+    assert wav_duration(pieces[1]) == pytest.approx(0.1)
+    assert pieces[2] == b""
+
+
+def test_split_audio_by_extension():
+    assert can_split(".wav") and can_split(".mp3") and not can_split(".ogg")
+    assert len(split_audio(wav_bytes(_pcm(0.2), RATE), [0.1], ".wav")) == 2
+    with pytest.raises(ValueError):
+        split_audio(b"OggS", [0.1], ".ogg")
+
+
+def test_buffer_pool_evicts_least_recently_used():
+    pool = AudioBufferPool(max_bytes=10)
+    pool.put("a", b"1234")
+    pool.put("b", b"5678")
+    assert pool.get("a") == b"1234"  # a를 최근에 씀 -> b가 먼저 비워짐
+    pool.put("c", b"9012")
+    assert pool.get("b") is None
+    assert pool.get("a") == b"1234" and pool.get("c") == b"9012"
+    pool.put("big", b"x" * 11)  # 한도보다 큰 항목은 넣지 않음
+    assert pool.get("big") is None and pool.get("a") == b"1234"
+
+
+def test_engine_cache_suffix_follows_output_format(tmp_path):
+    cache = ContentCache(str(tmp_path), suffix=".mp3")
+    engine = FakeSpeechEngine(ServiceProfile(latency=0, jitter=0), output_format="wav", cache=cache)
+    try:
+        assert engine.extension == ".wav"
+        assert engine.cache.suffix == ".wav" and engine.cache.root == cache.root
+        out = tmp_path / "line.wav"
+        assert engine.synthesize_to_file("안녕", "ko-KR-SunHiNeural", str(out))
+        assert is_wav(out.read_bytes())
+        cached = engine.cache.path_for(engine.cache_key("안녕", "ko-KR-SunHiNeural"))
+        assert cached.endswith(".wav")
+    finally:
+        engine.close()
+    assert cache.with_suffix(".mp3") is cache
@@ -0,0 +1,91 @@
+import json
+import os
+import pytest
+import batch_adapter
+from batch_adapter import BatchItemError, ingest_batch_results, parse_batch_item
+from fake_services import LocalBatchClient, fake_chat_completion
+from story_store import crawled_store, processed_store, source_hash
+
+SCENARIOS = [{"title": "흥부전", "scenes": [{"scene_num": 1, "visual_prompt": "초가집", "scripts": []}]}]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # 저장소/배치/LLM 캐시 경로가 모두 상대 경로라 임시 폴더에서 실행
+    monkeypatch.chdir(tmp_path)
+    store = crawled_store()
+    for seq in ("1", "2", "3"):
+        story = {"title": f"동화 {seq}", "pages": {"1": f"옛날 옛적 {seq}번째 이야기"}}
+        store.put(seq, story, source_hash=source_hash(story))
+    return tmp_path
+
+
+def _ok_item(seq, content=None):
+    body = fake_chat_completion(SCENARIOS, {"messages": [{"content": seq}]})
+    if content is not None:
+        body["choices"][0]["message"]["content"] = content
+    return {"custom_id": seq, "response": {"status_code": 200, "body": body}, "error": None}
+
+
+def test_parse_batch_item_accepts_scenario():
+    analyzed = parse_batch_item(_ok_item("1"))
+    assert analyzed["title"].startswith("흥부전") and analyzed["scenes"]
+
+
+@pytest.mark.parametrize("item, reason", [
+    ({"custom_id": "1", "error": {"code": "Timeout", "message": "x"}}, "Timeout"),
+    ({"custom_id": "1", "response": {"status_code": 500, "body": {"error": {"message": "Fake 500"}}}}, "HTTP 500"),
+    (_ok_item("1", content="{\"title\": "), "JSON"),
+    (_ok_item("1", content="{\"title\": \"흥부전\"}"), "title/scenes"),
+    ({"custom_id": "1", "response": {"status_code": 200, "body": {}}}, "choices"),
+])
+def test_parse_batch_item_rejects_bad_items(item, reason):
+    with pytest.raises(BatchItemError, match=reason):
+        parse_batch_item(item)
+
+
+def test_parse_batch_item_rejects_truncated_response():
+    item = _ok_item("1")
+    item["response"]["body"]["choices"][0]["finish_reason"] = "length"
+    with pytest.raises(BatchItemError, match="잘렸"):
+        parse_batch_item(item)
+
+
+def test_ingest_keeps_good_items_and_reports_failures(workdir):
+    results = workdir / "results.jsonl"
+    lines = [_ok_item("1"), _ok_item("2", content="not json"), _ok_item("99")]
+    results.write_text("".join(json.dumps(l, ensure_ascii=False) + "\n" for l in lines) + "{broken\n",
+                       encoding="utf-8")
+    result = ingest_batch_results(str(results))
+    assert result["ingested"] == ["1"]
+    assert set(result["failed"]) == {"2", "99", "results.jsonl:4"}
+    assert processed_store().get("1")["original_seq"] == "1"
+
+
+def test_ingest_drops_results_for_changed_sources(workdir):
+    results = workdir / "results.jsonl"
+    results.write_text(json.dumps(_ok_item("1"), ensure_ascii=False) + "\n", encoding="utf-8")
+    result = ingest_batch_results(str(results), sources={"1": "old-hash"})
+    assert result["ingested"] == [] and "원문" in result["failed"]["1"]
+
+
+def test_run_batch_with_local_client(workdir):
+    client = LocalBatchClient(SCENARIOS)
+    result = batch_adapter.run_batch(client, poll_seconds=0.01)
+    assert sorted(result["ingested"]) == ["1", "2", "3"]
+    assert len(processed_store()) == 3
+    assert batch_adapter.load_state() is None
+    # 같은 동화는 다시 보내지 않음
+    assert batch_adapter.run_batch(client, poll_seconds=0.01) is None
+
+
+def test_ingest_command_clears_submitted_batch(workdir):
+    client = LocalBatchClient(SCENARIOS)
+    sources = batch_adapter.export_batch_requests()
+    state = batch_adapter.submit_batch(client, batch_adapter.BATCH_REQUESTS_FILE, sources)
+    status = batch_adapter.wait_for_batch(client, state["batch_id"], poll_seconds=0.01)
+    client.download(status["output_file_id"], batch_adapter.BATCH_RESULTS_FILE)
+
+    batch_adapter.main(["ingest"])
+    assert len(processed_store()) == 3
+    assert not os.path.exists(batch_adapter.BATCH_STATE_FILE)
@@ -0,0 +1,42 @@
+import pytest
+from benchmark import StageTimer, percentile
+from pipeline_scheduler import StoryScheduler
+
+
+def test_percentile_nearest_rank():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile([3, 1, 2, 4], 95) == 4
+
+
+def test_stage_timer_counts_exceptions_and_predicate_failures():
+    timer = StageTimer()
+    video = timer.wrap("video", lambda path: path, succeeded=lambda path: path is not None)
+    assert video("a.mp4") == "a.mp4"
+    assert video(None) is None
+
+    def tts(story):
+        raise RuntimeError("대사 2/2개 합성 실패")
+
+    with pytest.raises(RuntimeError):
+        timer.wrap("tts", tts)({})
+    report = timer.report()
+    assert (report["video"]["count"], report["video"]["failed"]) == (2, 1)
+    assert (report["tts"]["count"], report["tts"]["failed"]) == (1, 1)
+
+
+def test_failed_tts_shows_up_in_the_report():
+    # 모든 TTS 요청이 실패하면 보고서에도 실패로 나오고 영상 단계는 돌지 않음
+    timer = StageTimer()
+
+    def tts(story):
+        raise RuntimeError("대사 1/1개 합성 실패")
+
+    scheduler = StoryScheduler(tts_fn=timer.wrap("tts", tts), image_fn=timer.wrap("images", lambda s: None),
+                               video_fn=timer.wrap("video", lambda s: "x.mp4", succeeded=lambda p: p is not None))
+    for seq in (1, 2):
+        scheduler.submit({"title": f"동화 {seq}", "original_seq": str(seq)})
+    summary = scheduler.finish()
+    report = timer.report()
+    assert report["tts"]["failed"] == 2 and report["images"]["failed"] == 0
+    assert "video" not in report and summary["completed"] == 0
@@ -0,0 +1,71 @@
+import os
+import time
+from content_cache import ContentCache
+
+
+def _age(path, seconds):
+    t = time.time() - seconds
+    os.utime(path, (t, t))
+
+
+def test_make_key_is_stable_and_order_sensitive():
+    assert ContentCache.make_key("a", {"x": 1, "y": 2}) == ContentCache.make_key("a", {"y": 2, "x": 1})
+    assert ContentCache.make_key("a", "b") != ContentCache.make_key("b", "a")
+
+
+def test_put_get_roundtrip(tmp_path):
+    cache = ContentCache(str(tmp_path), suffix=".json")
+    key = ContentCache.make_key("chat", "흥부전")
+    cache.put_json(key, {"title": "흥부전", "scenes": []})
+    assert cache.get_json(key) == {"title": "흥부전", "scenes": []}
+    assert cache.path_for(key).endswith(os.path.join(key[:2], f"{key}.json"))
+    assert cache.get_bytes(ContentCache.make_key("missing")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_put_file_and_materialize(tmp_path):
+    cache = ContentCache(str(tmp_path / "cache"), suffix=".mp3")
+    src = tmp_path / "line.mp3"
+    src.write_bytes(b"ID3audio")
+    key = ContentCache.make_key("tts", "안녕")
+    cache.put_file(key, str(src))
+
+    dest = tmp_path / "out.mp3"
+    assert cache.materialize(key, str(dest))
+    assert dest.read_bytes() == b"ID3audio"
+    assert not cache.materialize(ContentCache.make_key("other"), str(tmp_path / "none.mp3"))
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = ContentCache(str(tmp_path), max_age=60)
+    key = ContentCache.make_key("old")
+    path = cache.put_bytes(key, b"x")
+    _age(path, 120)
+    assert cache.get_bytes(key) is None
+    assert not os.path.exists(path)
+
+
+def test_evict_removes_least_recently_used_first(tmp_path):
+    cache = ContentCache(str(tmp_path), max_bytes=250)
+    keys = [ContentCache.make_key(i) for i in range(3)]
+    paths = [cache.put_bytes(key, b"x" * 100) for key in keys]
+    for age, path in zip((300, 200, 100), paths):
+        _age(path, age)
+    # 가장 오래된 항목을 읽으면 최근 사용으로 갱신되어 살아남음
+    assert cache.get_bytes(keys[0]) is not None
+
+    assert cache.evict() == 1
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])
+    assert os.path.exists(paths[2])
+    assert cache.stats()["bytes"] == 200
+
+
+def test_evict_drops_expired_entries(tmp_path):
+    cache = ContentCache(str(tmp_path), max_age=60)
+    old = cache.put_bytes(ContentCache.make_key("old"), b"x")
+    new = cache.put_bytes(ContentCache.make_key("new"), b"y")
+    _age(old, 120)
+    assert cache.evict() == 1
+    assert not os.path.exists(old) and os.path.exists(new)
+    assert cache.stats()["entries"] == 1
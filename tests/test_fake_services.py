@@ -0,0 +1,63 @@
+import json
+import urllib.request
+import pytest
+from audio_io import audio_duration, wav_duration
+from fake_services import (
+    FakeAzureServer, FakeSpeechEngine, ServiceProfile, make_silent_audio, parse_ssml
+)
+from tts_generator import build_multivoice_ssml
+
+SCENARIOS = [{"title": "흥부전", "scenes": [{"scene_num": 1, "visual_prompt": "초가집", "scripts": []}]}]
+FAST = ServiceProfile(latency=0, jitter=0, realtime_factor=0)
+
+
+def _post(url, payload):
+    request = urllib.request.Request(url, json.dumps(payload).encode("utf-8"),
+                                     {"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return response.status, json.loads(response.read())
+
+
+def test_silent_audio_has_requested_length():
+    assert audio_duration(make_silent_audio(2.0, ".mp3"), ".mp3") == pytest.approx(2.0, abs=0.03)
+    assert wav_duration(make_silent_audio(1.5, ".wav")) == pytest.approx(1.5)
+
+
+def test_parse_ssml_reads_bookmarked_lines():
+    ssml = build_multivoice_ssml([
+        {"mark": "S01_000", "voice": "ko-KR-SunHiNeural", "text": "옛날 옛적에"},
+        {"mark": "S01_001", "voice": "ko-KR-InJoonNeural", "text": "형님 & 아우"},
+    ])
+    assert parse_ssml(ssml) == [("S01_000", "옛날 옛적에"), ("S01_001", "형님 & 아우")]
+
+
+def test_fake_engine_emits_bookmarks_and_words():
+    engine = FakeSpeechEngine(FAST, chars_per_second=10)
+    marks, words = {}, []
+    ssml = build_multivoice_ssml([
+        {"mark": "a", "voice": "ko-KR-SunHiNeural", "text": "하나 둘"},
+        {"mark": "b", "voice": "ko-KR-InJoonNeural", "text": "셋"},
+    ])
+    try:
+        result = engine.synthesize(ssml=ssml, on_bookmark=lambda e: marks.__setitem__(e.text, e.audio_offset),
+                                   on_word_boundary=lambda e: words.append(e.text))
+    finally:
+        engine.close()
+    assert words == ["하나", "둘", "셋"]
+    # 두 번째 대사는 첫 대사(0.3초) + 화자 전환 쉼(0.15초) 뒤에 시작
+    assert marks["a"] == 0
+    assert marks["b"] / 10_000_000 == pytest.approx(0.45)
+    assert result.audio_duration.total_seconds() == pytest.approx(0.55, abs=0.03)
+
+
+def test_fake_server_answers_chat_and_images():
+    with FakeAzureServer(FAST, SCENARIOS) as server:
+        status, chat = _post(f"{server.url}/openai/deployments/gpt/chat/completions",
+                             {"messages": [{"role": "user", "content": "동화 내용:\n흥부"}]})
+        assert status == 200
+        scenario = json.loads(chat["choices"][0]["message"]["content"])
+        assert scenario["title"].startswith("흥부전") and scenario["scenes"]
+
+        status, image = _post(f"{server.url}/openai/deployments/img/images/generations", {"prompt": "초가집"})
+        assert status == 200 and image["data"][0]["b64_json"]
+        assert server.counts == {"chat": 1, "images": 1}
@@ -0,0 +1,73 @@
+import json
+import os
+import ffmpeg_renderer
+import telemetry
+
+
+def _timeline(tmp_path):
+    image = tmp_path / "scene.png"
+    audio = tmp_path / "line.mp3"
+    image.write_bytes(b"")
+    audio.write_bytes(b"")
+    return {
+        "title": "해와 달이 된 오누이",
+        "intro": None,
+        "scenes": [{
+            "duration": 2.0,
+            "image": str(image),
+            "lines": [{"audio": str(audio)}],
+            "subtitles": [{"start": 0.0, "duration": 1.5, "text": "떡 하나 주면 안 잡아먹지"}],
+        }],
+    }
+
+
+def test_render_timeline_records_encode_span(tmp_path, monkeypatch):
+    # FFmpeg 대신 출력 파일만 만드는 가짜 실행 (구간 기록까지 가는지만 확인)
+    calls = []
+
+    def fake_run(cmd, cwd=None, check=False):
+        calls.append(cmd)
+        for arg in cmd:
+            if arg.endswith(".mp4"):
+                with open(arg, "wb") as f:
+                    f.write(b"\0" * 128)
+
+    trace_dir = tmp_path / "telemetry"
+    monkeypatch.setattr(ffmpeg_renderer.subprocess, "run", fake_run)
+    monkeypatch.setattr(telemetry, "TELEMETRY_ENABLED", True)
+    monkeypatch.setattr(telemetry, "TELEMETRY_DIR", str(trace_dir))
+    monkeypatch.setattr(telemetry, "TRACE_FILE", str(trace_dir / "trace.jsonl"))
+
+    outputs = [(ffmpeg_renderer.rendition_spec(name), str(tmp_path / f"story_{name}.mp4"))
+               for name in ("main", "preview")]
+    paths = ffmpeg_renderer.render_timeline(_timeline(tmp_path), str(tmp_path), outputs, name="seg_001")
+
+    # 출력본이 여러 개여도 FFmpeg는 한 번만 실행
+    assert len(calls) == 1
+    assert paths == [path for _, path in outputs]
+    assert all(os.path.getsize(path) == 128 for path in paths)
+    events = [json.loads(line) for line in (trace_dir / "trace.jsonl").read_text(encoding="utf-8").splitlines()]
+    encode = [e for e in events if e["name"] == "encode.ffmpeg"]
+    assert encode and encode[0]["status"] == "ok"
+    assert encode[0]["attrs"]["segment"] == "seg_001"
+    assert encode[0]["attrs"]["renditions"] == 2
+    assert encode[0]["attrs"]["output_bytes"] == 256
+
+
+def test_span_accepts_segment_attrs(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry, "TELEMETRY_ENABLED", True)
+    monkeypatch.setattr(telemetry, "TELEMETRY_DIR", str(tmp_path))
+    monkeypatch.setattr(telemetry, "TRACE_FILE", str(tmp_path / "trace.jsonl"))
+    with telemetry.span("encode.ffmpeg", segment="intro", vfr=True, preset="ultrafast", threads=2) as s:
+        s.set(output_bytes=1)
+    event = json.loads((tmp_path / "trace.jsonl").read_text(encoding="utf-8"))
+    assert event["name"] == "encode.ffmpeg"
+    assert event["attrs"] == {"segment": "intro", "vfr": True, "preset": "ultrafast", "threads": 2, "output_bytes": 1}
+
+
+def test_extra_renditions_reads_env_default(monkeypatch):
+    # --renditions 없이 불러도 VIDEO_RENDITIONS에서 더 요청한 출력본을 알려 줌
+    monkeypatch.setattr(ffmpeg_renderer, "VIDEO_RENDITIONS", "main,shorts")
+    assert ffmpeg_renderer.extra_renditions() == ["shorts"]
+    assert ffmpeg_renderer.extra_renditions("main") == []
+    assert ffmpeg_renderer.extra_renditions(["preview", "main"]) == ["preview"]
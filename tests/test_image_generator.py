@@ -0,0 +1,99 @@
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import image_generator
+from content_cache import ContentCache
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+    content = b"{}"
+
+    def json(self):
+        return {"data": [{"b64_json": base64.b64encode(b"PNG").decode()}]}
+
+
+class CountingSession:
+    """
+    동시에 진행 중인 요청 수의 최댓값을 기록하는 가짜 세션
+    요청은 동시 요청이 overlap개가 될 때까지 응답하지 않음 (스레드 타이밍과 관계없이 겹침을 만듦)
+    """
+
+    def __init__(self, overlap):
+        self.overlap = overlap
+        self.active = 0
+        self.peak = 0
+        self.cond = threading.Condition()
+
+    def post(self, *args, **kwargs):
+        with self.cond:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.cond.notify_all()
+            self.cond.wait_for(lambda: self.peak >= self.overlap, timeout=5)
+            self.active -= 1
+        return FakeResponse()
+
+
+def test_concurrency_limit_is_shared_across_calls(tmp_path, monkeypatch):
+    session = CountingSession(overlap=2)
+    monkeypatch.setattr(image_generator, "get_session", lambda: session)
+    monkeypatch.setattr(image_generator, "_slots", image_generator._slots)
+    image_generator.set_concurrency(2)
+
+    # 여러 동화의 이미지 작업이 각자 스레드 풀을 만들어도 전체 동시 요청은 2개까지
+    paths = [str(tmp_path / f"S{i:02d}.png") for i in range(12)]
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        results = list(executor.map(
+            lambda path: image_generator.request_scene_image("http://local", {}, {}, path), paths))
+
+    assert all(results)
+    # 한도를 넘지 않고, 한도만큼은 실제로 겹침
+    assert session.peak <= 2
+    assert session.peak == 2
+    assert (tmp_path / "S00.png").read_bytes() == b"PNG"
+
+
+def test_select_style_is_deterministic():
+    story = {"title": "흥부전", "original_seq": 12}
+    assert image_generator.select_style(story) == image_generator.select_style(dict(story))
+    assert image_generator.select_style(story) in image_generator.STYLE_OPTIONS
+    styles = {image_generator.select_style({"title": "t", "original_seq": seq}) for seq in range(50)}
+    assert len(styles) > 1
+
+
+class FailingSession:
+    """visual_prompt에 "실패"가 들어간 장면만 500을 돌려주는 가짜 세션"""
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        if "실패" in json["prompt"]:
+            response = FakeResponse()
+            response.status_code = 500
+            response.text = "server error"
+            return response
+        return FakeResponse()
+
+
+@pytest.fixture
+def image_env(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(image_generator, "API_KEY", "fake")
+    monkeypatch.setattr(image_generator, "ENDPOINT", "http://local")
+    monkeypatch.setattr(image_generator, "IMAGE_CACHE", ContentCache(str(tmp_path / "cache"), suffix=".png"))
+    monkeypatch.setattr(image_generator, "get_session", lambda: FailingSession())
+
+
+def test_failed_scene_raises(image_env):
+    story = {"title": "해님 달님", "original_seq": 7, "scenes": [
+        {"scene_num": 1, "visual_prompt": "호랑이"}, {"scene_num": 2, "visual_prompt": "실패하는 장면"}]}
+    with pytest.raises(image_generator.ImageGenerationError, match="1/2"):
+        image_generator.generate_images_for_story(story)
+    assert sorted(image_generator.load_asset_manifest("output_assets/해님 달님")) == ["image/S01"]
+
+
+def test_missing_credentials_raise(image_env, monkeypatch):
+    monkeypatch.setattr(image_generator, "API_KEY", None)
+    with pytest.raises(image_generator.ImageGenerationError):
+        image_generator.generate_images_for_story({"title": "해님 달님", "scenes": []})
@@ -0,0 +1,37 @@
+import pytest
+import main
+from story_store import PROCESSED_STORE
+
+
+def test_no_arguments_runs_all():
+    args = main.parse_args([])
+    assert args.command == "all"
+    assert (args.ids, args.titles, args.limit, args.skip_crawl, args.no_video) == (None, None, None, False, False)
+
+
+def test_options_without_command_run_all():
+    # python main.py --limit 1 --no-video -> 전체 파이프라인
+    args = main.parse_args(["--limit", "1", "--no-video"])
+    assert (args.command, args.limit, args.no_video) == ("all", 1, True)
+
+
+def test_subcommands_parse_their_own_options():
+    args = main.parse_args(["tts", "--ids", "12,40-45", "--concurrency", "3"])
+    assert (args.command, args.ids, args.concurrency, args.source) == ("tts", "12,40-45", 3, PROCESSED_STORE)
+
+    args = main.parse_args(["render", "--title", "해님 달님", "--title", "흥부와 놀부", "--backend", "ffmpeg"])
+    assert (args.command, args.titles, args.backend) == ("render", ["해님 달님", "흥부와 놀부"], "ffmpeg")
+
+    args = main.parse_args(["crawl", "--refresh"])
+    assert (args.command, args.refresh) == ("crawl", True)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(SystemExit):
+        main.parse_args(["render", "--backend", "blender"])
+
+
+def test_help_is_not_rewritten_to_all(capsys):
+    with pytest.raises(SystemExit):
+        main.parse_args(["--help"])
+    assert "crawl" in capsys.readouterr().out
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from PIL import Image
+from motion import MOTION_KINDS, KenBurns, motion_windows, summed_area_table
+
+SRC = (1536, 1024)
+OUT = (1536, 1024)
+
+
+@pytest.mark.parametrize("kind", MOTION_KINDS)
+def test_windows_stay_inside_source_and_keep_aspect(kind):
+    windows = motion_windows(SRC, (1080, 1920), 48, kind=kind, zoom=1.1)
+    assert windows.shape == (48, 4)
+    x0, y0, w, h = windows.T
+    assert np.all(x0 >= -1e-9) and np.all(y0 >= -1e-9)
+    assert np.all(x0 + w <= SRC[0] + 1e-6) and np.all(y0 + h <= SRC[1] + 1e-6)
+    assert np.allclose(w / h, 1080 / 1920)
+
+
+def test_zoom_in_goes_from_full_frame_to_zoomed_center():
+    x0, y0, w, h = motion_windows(SRC, OUT, 24, kind="zoom_in", zoom=1.25).T
+    assert (w[0], h[0]) == pytest.approx(SRC)
+    assert (w[-1], h[-1]) == pytest.approx((SRC[0] / 1.25, SRC[1] / 1.25))
+    assert np.all(np.diff(w) <= 1e-9)
+    # 확대 중에도 가운데 고정
+    assert np.allclose(x0 + w / 2, SRC[0] / 2) and np.allclose(y0 + h / 2, SRC[1] / 2)
+
+
+def test_zoom_out_mirrors_zoom_in():
+    zoom_in = motion_windows(SRC, OUT, 24, kind="zoom_in")
+    zoom_out = motion_windows(SRC, OUT, 24, kind="zoom_out")
+    assert np.allclose(zoom_out, zoom_in[::-1])
+
+
+def test_pans_cross_the_image_at_fixed_zoom():
+    right = motion_windows(SRC, OUT, 30, kind="pan_right", zoom=1.2)
+    left = motion_windows(SRC, OUT, 30, kind="pan_left", zoom=1.2)
+    assert np.allclose(right[:, 2], SRC[0] / 1.2)
+    assert right[0, 0] == pytest.approx(0.0)
+    assert right[-1, 0] + right[-1, 2] == pytest.approx(SRC[0])
+    assert np.all(np.diff(right[:, 0]) >= 0)
+    assert np.allclose(left, right[::-1])
+
+
+def test_motion_eases_in_and_out():
+    x0 = motion_windows(SRC, OUT, 101, kind="pan_right")[:, 0]
+    steps = np.diff(x0)
+    # 처음/끝은 천천히, 가운데가 가장 빠름
+    assert steps[0] < steps[50] and steps[-1] < steps[50]
+
+
+def test_single_frame():
+    assert motion_windows(SRC, OUT, 0).shape == (1, 4)
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    # 가로/세로 방향으로 값이 바뀌는 작은 합성 이미지 (64x48)
+    rng = np.random.default_rng(7)
+    pixels = rng.integers(0, 256, size=(48, 64, 3), dtype=np.uint8)
+    path = tmp_path / "scene.png"
+    Image.fromarray(pixels).save(path)
+    summed_area_table.cache_clear()
+    yield str(path), pixels
+    summed_area_table.cache_clear()
+
+
+def test_frame_matches_pil_box_downscale(image_path):
+    path, pixels = image_path
+    motion = KenBurns(path, duration=1.0, out_size=(32, 24), fps=4, kind="zoom_in", zoom=1.0)
+    expected = np.asarray(Image.fromarray(pixels).resize((32, 24), Image.BOX), dtype=np.int16)
+    frame = motion.frame(0)
+    assert frame.shape == (24, 32, 3) and frame.dtype == np.uint8
+    # 누적합 면적 평균 = 2x2 박스 평균 (반올림 차이만 허용)
+    assert np.abs(frame.astype(np.int16) - expected).max() <= 1
+
+
+def test_zoom_endpoints(image_path):
+    path, pixels = image_path
+    # 1:1 출력 크기로 2배 확대 -> 첫 프레임은 전체 2x 축소, 마지막 프레임은 가운데 절반을 그대로
+    motion = KenBurns(path, duration=1.0, out_size=(32, 24), fps=8, kind="zoom_in", zoom=2.0)
+    first = np.asarray(Image.fromarray(pixels).resize((32, 24), Image.BOX), dtype=np.int16)
+    assert np.abs(motion.frame(0).astype(np.int16) - first).max() <= 1
+    assert np.array_equal(motion.frame(motion.n_frames - 1), pixels[12:36, 16:48])
+    # 범위를 벗어난 번호는 처음/끝 프레임
+    assert np.array_equal(motion.frame(10_000), pixels[12:36, 16:48])
+
+
+def test_pan_endpoints(image_path):
+    path, pixels = image_path
+    motion = KenBurns(path, duration=1.0, out_size=(32, 24), fps=8, kind="pan_right", zoom=2.0)
+    assert np.array_equal(motion.frame(0), pixels[12:36, 0:32])
+    assert np.array_equal(motion.frame(motion.n_frames - 1), pixels[12:36, 32:64])
+    assert np.array_equal(motion.frame_at(0.0), motion.frame(0))
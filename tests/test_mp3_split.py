@@ -0,0 +1,67 @@
+import pytest
+from mp3_split import iter_frames, mp3_duration, split_mp3
+
+# MPEG-2 Layer III, 48kbps, 24kHz (Azure TTS 기본 MP3 형식): 프레임 144바이트, 576샘플 = 24ms
+HEADER = bytes([0xFF, 0xF3, 0x64, 0xC4])
+FRAME_BYTES = 144
+FRAME_SECONDS = 576 / 24000
+
+
+def _frame(marker):
+    return HEADER + bytes([marker]) * (FRAME_BYTES - 4)
+
+
+def _mp3(n, id3=False):
+    data = b"".join(_frame(i % 200 + 1) for i in range(n))
+    if id3:
+        # 태그 크기 10바이트 (syncsafe 정수)
+        data = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + b"\0" * 10 + data
+    return data
+
+
+def test_iter_frames_reads_headers():
+    frames = list(iter_frames(_mp3(3)))
+    assert [(start, length) for start, length, _ in frames] == [(0, 144), (144, 144), (288, 144)]
+    assert frames[0][2] == pytest.approx(FRAME_SECONDS)
+
+
+def test_iter_frames_skips_id3_and_garbage():
+    data = _mp3(2, id3=True)
+    assert [start for start, _, _ in iter_frames(data)] == [20, 164]
+    # 싱크 앞의 쓰레기 바이트는 건너뜀
+    assert [start for start, _, _ in iter_frames(b"\x00\x12" + _mp3(1))] == [2]
+
+
+def test_mpeg1_frame_length():
+    # MPEG-1, 128kbps, 44.1kHz -> 144 * 128000 / 44100 = 417바이트
+    header = bytes([0xFF, 0xFB, 0x90, 0x00])
+    data = (header + b"\0" * 413) * 2
+    frames = list(iter_frames(data))
+    assert [length for _, length, _ in frames] == [417, 417]
+    assert frames[0][2] == pytest.approx(1152 / 44100)
+
+
+def test_duration():
+    assert mp3_duration(_mp3(50)) == pytest.approx(50 * FRAME_SECONDS)
+
+
+def test_split_at_nearest_frame_boundary():
+    data = _mp3(100)
+    # 0.5초 = 20.8프레임 -> 21번째 프레임 경계 / 1.2초 = 50프레임
+    pieces = split_mp3(data, [0.5, 1.2])
+    assert [len(p) // FRAME_BYTES for p in pieces] == [21, 29, 50]
+    assert b"".join(pieces) == data
+    assert all(p[:4] == HEADER for p in pieces)
+
+
+def test_split_boundaries_past_end_give_empty_pieces():
+    data = _mp3(10)
+    pieces = split_mp3(data, [0.1, 5.0, 6.0])
+    assert len(pieces) == 4
+    assert b"".join(pieces) == data
+    assert pieces[2:] == [b"", b""]
+
+
+def test_split_without_boundaries_keeps_whole_stream():
+    data = _mp3(5, id3=True)
+    assert split_mp3(data, []) == [data[20:]]
@@ -0,0 +1,88 @@
+import threading
+import pytest
+from pipeline_scheduler import Stage, StoryScheduler
+
+
+def _story(seq):
+    return {"title": f"동화 {seq}", "original_seq": str(seq), "scenes": []}
+
+
+def _run(stories, tts_fn=lambda s: None, image_fn=lambda s: None, video_fn=None):
+    videos = []
+
+    def video(story):
+        videos.append(story["original_seq"])
+        return video_fn(story) if video_fn else f"{story['original_seq']}.mp4"
+
+    scheduler = StoryScheduler(tts_fn=tts_fn, image_fn=image_fn, video_fn=video, queue_size=2)
+    for story in stories:
+        scheduler.submit(story)
+    summary = scheduler.finish()
+    return scheduler, summary, sorted(videos)
+
+
+def test_video_runs_only_when_both_asset_stages_succeed():
+    def tts(story):
+        if story["original_seq"] == "1":
+            raise RuntimeError("대사 1/3개 합성 실패")
+
+    def images(story):
+        if story["original_seq"] == "2":
+            raise RuntimeError("장면 1/2개 생성 실패")
+
+    scheduler, summary, videos = _run([_story(n) for n in (1, 2, 3)], tts_fn=tts, image_fn=images)
+    assert videos == ["3"]
+    assert (summary["submitted"], summary["completed"]) == (3, 1)
+    assert (scheduler.tts.failed, scheduler.images.failed, scheduler.video.failed) == (1, 1, 0)
+    assert scheduler._pending == {}
+
+
+def test_failed_video_is_not_counted_as_completed():
+    scheduler, summary, videos = _run([_story(1), _story(2)],
+                                      video_fn=lambda story: None if story["original_seq"] == "1" else "ok.mp4")
+    assert videos == ["1", "2"]
+    assert summary["completed"] == 1
+    assert scheduler.video.failed == 1
+
+
+def test_without_video_stage_asset_success_completes():
+    scheduler = StoryScheduler(tts_fn=lambda s: None, image_fn=lambda s: 1 / 0 if s["original_seq"] == "2" else None)
+    for n in (1, 2):
+        scheduler.submit(_story(n))
+    summary = scheduler.finish()
+    assert summary["completed"] == 1 and scheduler.images.failed == 1
+
+
+def test_stage_succeeded_predicate_and_summary():
+    done = []
+    stage = Stage("video", lambda story: story.get("path"), on_done=lambda story, ok: done.append(ok),
+                  succeeded=lambda path: path is not None)
+    stage.put({"title": "a", "path": "a.mp4"})
+    stage.put({"title": "b"})
+    stage.close()
+    assert done == [True, False]
+    assert stage.failed == 1 and stage.summary().startswith("video: 2편 (실패 1)")
+
+
+def test_full_queue_blocks_the_producer():
+    started, release = threading.Event(), threading.Event()
+
+    def slow(story):
+        started.set()
+        release.wait(5)
+
+    stage = Stage("tts", slow, workers=1, queue_size=1)
+    try:
+        stage.put(_story(1))
+        assert started.wait(5)        # 작업 스레드가 1편을 잡고 멈춤
+        stage.put(_story(2))          # 대기열 1칸을 채움
+        producer = threading.Thread(target=stage.put, args=(_story(3),), daemon=True)
+        producer.start()
+        producer.join(0.2)
+        assert producer.is_alive()    # 자리가 날 때까지 기다림 (역압)
+    finally:
+        release.set()
+    producer.join(5)
+    assert not producer.is_alive()
+    stage.close()
+    assert len(stage.durations) == 3
@@ -0,0 +1,94 @@
+import pytest
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket, get_retry_after
+
+
+class FakeClock:
+    """time.monotonic/time.sleep 대신 쓰는 가짜 시계 (sleep하면 시간만 흐름)"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", fake.sleep)
+    return fake
+
+
+def test_bucket_serves_capacity_without_waiting(clock):
+    bucket = TokenBucket(capacity=3, refill_rate=1)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == []
+
+
+def test_bucket_waits_for_refill(clock):
+    bucket = TokenBucket(capacity=2, refill_rate=0.5)
+    bucket.acquire(2)
+    bucket.acquire(1)
+    # 빈 버킷에서 토큰 1개 = 2초
+    assert clock.slept == [pytest.approx(2.0)]
+
+
+def test_bucket_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(capacity=2, refill_rate=1)
+    bucket.acquire(2)
+    clock.now += 100
+    bucket.acquire(2)
+    bucket.acquire(1)
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+def test_bucket_oversized_request_waits_for_full_bucket_only(clock):
+    bucket = TokenBucket(capacity=10, refill_rate=5)
+    bucket.acquire(1)
+    bucket.acquire(50)
+    assert sum(clock.slept) == pytest.approx(0.2)
+
+
+def test_drain_empties_bucket(clock):
+    bucket = TokenBucket(capacity=5, refill_rate=1)
+    bucket.drain()
+    bucket.acquire(1)
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+def test_limiter_penalize_pauses_acquire(clock):
+    limiter = RateLimiter(rpm=600, tpm=None)
+    limiter.penalize(3.0)
+    limiter.acquire()
+    assert sum(clock.slept) >= 3.0
+
+
+def test_retry_after_ms_header_wins():
+    assert get_retry_after({"retry-after-ms": "1500", "retry-after": "9"}, 0) == 1.5
+
+
+def test_retry_after_seconds_header():
+    assert get_retry_after({"retry-after": "7"}, 3) == 7.0
+
+
+def test_retry_after_is_capped():
+    assert get_retry_after({"retry-after": "3600"}, 0, max_delay=60.0) == 60.0
+
+
+@pytest.mark.parametrize("headers", [None, {}, {"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"}])
+def test_backoff_with_jitter_without_usable_header(headers):
+    for attempt in range(4):
+        delay = get_retry_after(headers, attempt, base_delay=1.0)
+        assert 0.5 * 2 ** attempt <= delay <= 2 ** attempt
+
+
+def test_backoff_respects_max_delay():
+    assert get_retry_after(None, 20, base_delay=1.0, max_delay=60.0) <= 60.0
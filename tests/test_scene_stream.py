@@ -0,0 +1,61 @@
+import json
+import pytest
+from scene_stream import SceneStreamParser
+
+STORY = {
+    "title": "해와 \"달\"이 된 오누이 {1}",
+    "scenes": [
+        {"scene_num": 1, "visual_prompt": "산 고개 [밤]", "scripts": [{"role": "해설", "text": "옛날 {옛적}에\\n"}]},
+        {"scene_num": 2, "visual_prompt": "초가집", "scripts": [{"role": "악당", "text": "떡 하나 주면 안 잡아먹지~ }]"}]},
+        {"scene_num": 3, "visual_prompt": "동아줄", "scripts": []},
+    ],
+}
+
+
+def _feed(parser, text, size):
+    scenes = []
+    for i in range(0, len(text), size):
+        scenes.extend(parser.feed(text[i:i + size]))
+    return scenes
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_scenes_come_out_whole_for_any_chunking(size):
+    text = json.dumps(STORY, ensure_ascii=False, indent=2)
+    parser = SceneStreamParser()
+    assert _feed(parser, text, size) == STORY["scenes"]
+    assert parser.title == STORY["title"]
+    assert parser.scene_count == 3
+    assert parser.finish() == STORY
+
+
+def test_scene_is_emitted_as_soon_as_it_closes():
+    text = json.dumps(STORY, ensure_ascii=False)
+    end_of_first = text.index('"scene_num": 2') - 2
+    parser = SceneStreamParser()
+    assert parser.feed(text[:end_of_first]) == [STORY["scenes"][0]]
+    assert parser.feed(text[end_of_first:]) == STORY["scenes"][1:]
+
+
+def test_escaped_quotes_and_backslashes_split_across_chunks():
+    story = {"title": "따옴표 \\\" 테스트", "scenes": [{"scene_num": 1, "text": "\\\\\"}{\\\\"}]}
+    text = json.dumps(story, ensure_ascii=False)
+    parser = SceneStreamParser()
+    # 이스케이프 문자(\) 바로 뒤에서 끊긴 조각
+    assert _feed(parser, text, 1) == story["scenes"]
+    assert parser.title == story["title"]
+
+
+def test_title_after_scenes_and_nested_scenes_key():
+    story = {"meta": {"scenes": [{"x": 1}]}, "scenes": [{"scene_num": 1}], "title": "늦은 제목"}
+    parser = SceneStreamParser()
+    assert _feed(parser, json.dumps(story, ensure_ascii=False), 5) == [{"scene_num": 1}]
+    assert parser.title == "늦은 제목"
+
+
+def test_empty_delta_and_truncated_stream():
+    parser = SceneStreamParser()
+    assert parser.feed(None) == [] and parser.feed("") == []
+    assert parser.feed('{"title": "잘린 응답", "scenes": [{"scene_num": 1}, {"scene_') == [{"scene_num": 1}]
+    with pytest.raises(ValueError):
+        parser.finish()
@@ -0,0 +1,97 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import segment_renderer
+from segment_renderer import split_segments
+
+
+def _scene(tmp_path, num, text):
+    image = tmp_path / f"S{num:02d}.png"
+    audio = tmp_path / f"S{num:02d}_000.mp3"
+    image.write_bytes(b"")
+    audio.write_bytes(b"")
+    return {"scene_num": num, "duration": 2.0, "image": str(image), "deps": [f"img{num}", f"line{num}"],
+            "lines": [{"audio": str(audio), "start": 0.0, "duration": 1.5}],
+            "subtitles": [{"start": 0.0, "duration": 1.5, "text": text}]}
+
+
+@pytest.fixture
+def render(tmp_path, monkeypatch):
+    """FFmpeg 대신 출력 파일만 만들고, 구간 렌더링/연결 호출을 기록하는 가짜 실행"""
+    story_dir = tmp_path / "story"
+    story_dir.mkdir()
+    state = {"timeline": None, "encoded": [], "concats": []}
+
+    def fake_run(cmd, cwd=None, check=False):
+        if "concat" in cmd:
+            with open(cmd[cmd.index("-i") + 1], encoding="utf-8") as f:
+                listed = [os.path.basename(line.strip()[6:-1]) for line in f if line.strip()]
+            state["concats"].append((os.path.basename(cmd[-1]), listed))
+        else:
+            state["encoded"].extend(os.path.basename(arg) for arg in cmd if arg.endswith(".mp4"))
+        for arg in cmd:
+            if arg.endswith(".mp4"):
+                with open(arg, "wb") as f:
+                    f.write(b"\0" * 16)
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    # 프로세스 풀 대신 스레드 (가짜 subprocess.run이 그대로 쓰이도록)
+    monkeypatch.setattr(segment_renderer, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(segment_renderer, "build_story_timeline", lambda story, base_dir: state["timeline"])
+
+    def run(scenes, renditions="main,preview"):
+        state["timeline"] = {"title": "해님 달님", "intro": None, "scenes": scenes,
+                             "paths": {"story_dir": str(story_dir), "safe_title": "해님 달님"}}
+        state["encoded"], state["concats"] = [], []
+        result = segment_renderer.render_story_segments({"title": "해님 달님"}, str(tmp_path), workers=2,
+                                                        renditions=renditions)
+        return result, sorted(state["encoded"]), state["concats"]
+
+    run.work_dir = story_dir / ".render"
+    return run
+
+
+def test_split_segments_keeps_scene_order():
+    timeline = {"title": "t", "intro": {"duration": 1.0}, "scenes": [{"scene_num": 2}, {"scene_num": 10}]}
+    names = [name for name, _ in split_segments(timeline)]
+    assert names == ["seg_000_intro", "seg_002_scene", "seg_010_scene"]
+    intro, scene = split_segments(timeline)[:2]
+    assert intro[1]["scenes"] == [] and scene[1]["intro"] is None and scene[1]["scenes"] == [{"scene_num": 2}]
+
+
+def test_only_stale_segments_are_rerendered(tmp_path, render):
+    scenes = [_scene(tmp_path, n, f"대사 {n}") for n in (1, 2, 3)]
+    result, encoded, concats = render(scenes)
+    assert result.endswith("해님 달님_final.mp4")
+    assert encoded == sorted(f"seg_00{n}_scene{s}.mp4" for n in (1, 2, 3) for s in ("", "_preview"))
+    # 출력본마다 구간을 장면 순서대로 연결
+    lists = dict(concats)
+    assert lists[os.path.basename(result)] == ["seg_001_scene.mp4", "seg_002_scene.mp4", "seg_003_scene.mp4"]
+    assert len(lists) == 2
+
+    # 바뀐 것이 없으면 FFmpeg를 실행하지 않음
+    assert render(scenes)[1:] == ([], [])
+
+    # 장면 2의 자막만 바뀌면 그 구간만 다시 렌더링하고 연결은 다시
+    scenes[1] = _scene(tmp_path, 2, "바뀐 대사")
+    _, encoded, concats = render(scenes)
+    assert encoded == ["seg_002_scene.mp4", "seg_002_scene_preview.mp4"]
+    assert [names for _, names in concats][0] == ["seg_001_scene.mp4", "seg_002_scene.mp4", "seg_003_scene.mp4"]
+
+
+def test_pruning_keeps_other_renditions_segments(tmp_path, render):
+    scenes = [_scene(tmp_path, n, f"대사 {n}") for n in (1, 2)]
+    render(scenes)
+    # main만 다시 만들어도 preview 구간 파일은 남겨 둠
+    scenes[0] = _scene(tmp_path, 1, "바뀐 대사")
+    _, encoded, concats = render(scenes, renditions="main")
+    assert encoded == ["seg_001_scene.mp4"] and len(concats) == 1
+    assert (render.work_dir / "seg_001_scene_preview.mp4").exists()
+    assert (render.work_dir / "seg_002_scene_preview.mp4").exists()
+
+    # 대본에서 빠진 장면의 구간은 모든 출력본에서 지움
+    render(scenes[:1], renditions="main")
+    assert not (render.work_dir / "seg_002_scene.mp4").exists()
+    assert not (render.work_dir / "seg_002_scene_preview.mp4").exists()
+    assert (render.work_dir / "seg_001_scene_preview.mp4").exists()
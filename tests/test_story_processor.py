@@ -0,0 +1,91 @@
+import json
+import threading
+from types import SimpleNamespace
+import pytest
+import story_processor
+from pipeline_scheduler import StoryScheduler
+from story_store import crawled_store, processed_store, source_hash
+
+SCENES = [{"scene_num": n, "visual_prompt": f"장면 {n}", "scripts": []} for n in (1, 2, 3)]
+
+
+def _chunk(content):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def _stream(text, fail_after=None, size=8):
+    """text를 조각으로 보내다가 fail_after 글자 뒤에 연결이 끊기는 가짜 스트림"""
+    for i in range(0, len(text), size):
+        if fail_after is not None and i >= fail_after:
+            raise ConnectionError("stream closed")
+        yield _chunk(text[i:i + size])
+
+
+def _client(create):
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(story_processor, "LLM_STREAM", True)
+    story = {"title": "해님 달님", "pages": {"1": "옛날 옛적에"}}
+    crawled_store().put("7", story, source_hash=source_hash(story))
+    return tmp_path
+
+
+def test_failed_stream_discards_prefetched_scenes(workdir, monkeypatch):
+    text = json.dumps({"title": "해님 달님", "scenes": SCENES}, ensure_ascii=False)
+    cut = text.index('"scene_num": 3')
+    monkeypatch.setattr(story_processor, "client", _client(lambda **kw: _stream(text, fail_after=cut)))
+
+    scenes, discarded, stories = [], [], []
+    story_processor.process_crawled_data(workers=1, on_story=stories.append, on_scene=scenes.append,
+                                         on_discard=discarded.append)
+
+    assert [s["scenes"][0]["scene_num"] for s in scenes] == [1, 2]
+    assert discarded == [{"title": "해님 달님", "original_seq": "7"}]
+    assert stories == [] and len(processed_store()) == 0
+
+
+def test_successful_stream_is_not_discarded(workdir, monkeypatch):
+    text = json.dumps({"title": "해님 달님", "scenes": SCENES}, ensure_ascii=False)
+    monkeypatch.setattr(story_processor, "client", _client(lambda **kw: _stream(text)))
+
+    scenes, discarded, stories = [], [], []
+    story_processor.process_crawled_data(workers=1, on_story=stories.append, on_scene=scenes.append,
+                                         on_discard=discarded.append)
+    assert len(scenes) == 3 and discarded == []
+    assert [s["original_seq"] for s in stories] == ["7"]
+
+
+def test_retried_attempt_does_not_emit_scenes_again():
+    seen = []
+    emit = story_processor._once_per_scene(lambda title, scene: seen.append(scene["scene_num"]))
+    for scene in SCENES[:2] + SCENES:  # 두 번째 시도가 처음부터 다시 보냄
+        emit("해님 달님", scene)
+    assert seen == [1, 2, 3]
+
+
+def test_scheduler_discard_cancels_queued_prefetch():
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_prefetch(partial):
+        started.set()
+        release.wait(5)
+
+    scheduler = StoryScheduler(tts_fn=lambda s: None, image_fn=lambda s: None,
+                               scene_fns=[slow_prefetch], prefetch_workers=1)
+    try:
+        for scene in SCENES:
+            scheduler.submit_scene({"title": "해님 달님", "original_seq": "7", "scenes": [scene]})
+        assert started.wait(5)
+        # 실행 중인 첫 작업을 뺀 나머지 2개는 취소
+        assert scheduler.discard({"title": "해님 달님", "original_seq": "7"}) == 2
+        assert scheduler._prefetch == {}
+        assert scheduler.discard({"title": "해님 달님", "original_seq": "7"}) == 0
+    finally:
+        release.set()
+        summary = scheduler.finish()
+    assert summary["submitted"] == 0
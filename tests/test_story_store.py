@@ -0,0 +1,75 @@
+import json
+import time
+from datetime import datetime
+import pytest
+from story_store import StoryStore, iter_selected, parse_ids, parse_since, select_seqs
+
+
+def _store(tmp_path, stories):
+    store = StoryStore(str(tmp_path / "processed"))
+    for seq, title in stories:
+        store.put(seq, {"title": title, "original_seq": seq, "scenes": []})
+    return store
+
+
+def test_parse_ids():
+    assert parse_ids(None) is None
+    assert parse_ids("12, 40-45,101,") == [(12, 12), (40, 45), (101, 101)]
+    assert parse_ids(["3", "7 - 9", 11]) == [(3, 3), (7, 9), (11, 11)]
+    with pytest.raises(ValueError):
+        parse_ids("12,abc")
+
+
+def test_parse_since():
+    assert parse_since(None) is None
+    assert parse_since(1700000000) == 1700000000
+    assert parse_since("1700000000.5") == 1700000000.5
+    assert parse_since("6h") == pytest.approx(time.time() - 6 * 3600, abs=5)
+    assert parse_since("30m") == pytest.approx(time.time() - 1800, abs=5)
+    assert parse_since("2026-10-01") == datetime(2026, 10, 1).timestamp()
+
+
+def test_select_by_ids_titles_and_limit(tmp_path):
+    store = _store(tmp_path, [(seq, f"동화 {seq}") for seq in (1, 2, 3, 10, 12)])
+    assert select_seqs(store) == ["1", "2", "3", "10", "12"]
+    assert select_seqs(store, ids="2-10") == ["2", "3", "10"]
+    # seq 범위와 제목은 합집합, 결과는 seq 순서
+    assert select_seqs(store, ids="12", titles=["동화 1"]) == ["1", "12"]
+    assert select_seqs(store, titles="없는 동화") == []
+    assert select_seqs(store, limit=2) == ["1", "2"]
+
+
+def test_select_since_checks_other_stores(tmp_path):
+    crawled = _store(tmp_path / "a", [(1, "해님 달님"), (2, "흥부전")])
+    processed = _store(tmp_path / "b", [(1, "해님 달님")])
+    cutoff = time.time() + 1
+    assert select_seqs(crawled, since=cutoff) == []
+
+    entry = processed._load_index()["1"]
+    entry["updated"] = cutoff + 10
+    assert select_seqs(crawled, since=cutoff, changed_in=[processed]) == ["1"]
+
+
+def test_iter_selected_reads_store(tmp_path):
+    store = _store(tmp_path, [(1, "해님 달님"), (2, "흥부전"), (3, "콩쥐팥쥐")])
+    stories = list(iter_selected(store.root, ids="2-3"))
+    assert [s["title"] for s in stories] == ["흥부전", "콩쥐팥쥐"]
+
+
+@pytest.mark.parametrize("suffix", [".json", ".jsonl"])
+def test_iter_selected_filters_legacy_files(tmp_path, suffix):
+    stories = [{"title": title, "original_seq": seq, "scenes": []}
+               for seq, title in ((1, "해님 달님"), (2, "흥부전"), (3, "콩쥐팥쥐"), (4, "토끼전"))]
+    path = tmp_path / f"processed_stories{suffix}"
+    if suffix == ".json":
+        path.write_text(json.dumps(stories, ensure_ascii=False), encoding="utf-8")
+    else:
+        path.write_text("".join(json.dumps(s, ensure_ascii=False) + "\n" for s in stories), encoding="utf-8")
+
+    titles = lambda **kw: [s["title"] for s in iter_selected(str(path), **kw)]
+    assert titles() == ["해님 달님", "흥부전", "콩쥐팥쥐", "토끼전"]
+    assert titles(ids="3") == ["콩쥐팥쥐"]
+    assert titles(ids="2-4", limit=2) == ["흥부전", "콩쥐팥쥐"]
+    assert titles(titles=["토끼전"], ids="1") == ["해님 달님", "토끼전"]
+    with pytest.raises(ValueError):
+        list(iter_selected(str(path), since="6h"))
@@ -0,0 +1,51 @@
+import json
+import pytest
+from story_stream import iter_json_array, iter_jsonl, iter_stories
+
+STORIES = [
+    {"title": "해님 달님", "original_seq": "7", "scenes": [{"scene_num": 1, "text": "떡 하나 주면 \\\"안\\\" 잡아먹지 ]"}]},
+    {"title": "흥부와 놀부", "original_seq": "8", "scenes": []},
+]
+
+
+def _write(tmp_path, text, name="stories.json"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_array_survives_any_chunk_boundary(tmp_path, chunk_size):
+    path = _write(tmp_path, json.dumps(STORIES, ensure_ascii=False, indent=2))
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == STORIES
+
+
+def test_scalars_split_across_chunks_are_not_cut(tmp_path):
+    # "123"이 "12" / "3"으로 나뉘어 읽혀도 12로 끊지 않음
+    path = _write(tmp_path, "[123, true, 4.5e2]")
+    assert list(iter_json_array(path, chunk_size=2)) == [123, True, 450.0]
+
+
+def test_empty_array_and_whitespace(tmp_path):
+    assert list(iter_json_array(_write(tmp_path, "  \n[ ]\n"), chunk_size=1)) == []
+
+
+def test_bare_closing_bracket_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_json_array(_write(tmp_path, "]"), chunk_size=1))
+
+
+def test_truncated_array_raises_after_complete_items(tmp_path):
+    text = json.dumps(STORIES, ensure_ascii=False)
+    path = _write(tmp_path, text[:text.index('{"title": "흥부') + 12])
+    items = iter_json_array(path, chunk_size=4)
+    assert next(items) == STORIES[0]
+    with pytest.raises(json.JSONDecodeError):
+        next(items)
+
+
+def test_jsonl_skips_torn_last_line(tmp_path):
+    lines = [json.dumps(s, ensure_ascii=False) for s in STORIES]
+    path = _write(tmp_path, lines[0] + "\n\n" + lines[1][:10], name="journal.jsonl")
+    assert list(iter_stories(path)) == STORIES[:1]
+    assert list(iter_jsonl(str(tmp_path / "missing.jsonl"))) == []
@@ -0,0 +1,68 @@
+import pytest
+from PIL import Image, ImageFont
+import subtitle_renderer
+from subtitle_renderer import render_text_sprite, sprite_position, text_width, wrap_text
+
+FONT = "default"  # 윈도우 폰트 경로 대신 PIL 기본 폰트
+SIZE = 20
+
+
+@pytest.fixture(autouse=True)
+def default_font(monkeypatch):
+    monkeypatch.setattr(subtitle_renderer, "load_font", lambda path, size: ImageFont.load_default())
+    text_width.cache_clear()
+    render_text_sprite.cache_clear()
+    yield
+    text_width.cache_clear()
+    render_text_sprite.cache_clear()
+
+
+def test_wrap_text_fills_lines_up_to_width():
+    width = text_width(FONT, SIZE, "aa bb")
+    assert wrap_text("aa bb cc dd", FONT, SIZE, width) == ["aa bb", "cc dd"]
+    assert wrap_text("aa bb cc dd", FONT, SIZE, width - 1) == ["aa", "bb", "cc", "dd"]
+    assert wrap_text("aa bb cc dd", FONT, SIZE, 10_000) == ["aa bb cc dd"]
+
+
+def test_wrap_text_keeps_long_words_and_paragraphs():
+    # 한 줄보다 긴 단어는 자르지 않고 혼자 한 줄, 입력의 줄바꿈은 그대로
+    assert wrap_text("abcdefghij k\nxy", FONT, SIZE, text_width(FONT, SIZE, "abc")) == ["abcdefghij", "k", "xy"]
+    assert wrap_text("", FONT, SIZE, 100) == []
+
+
+def test_sprite_is_cropped_to_the_text():
+    sprite, text_h = render_text_sprite("Hello world", FONT, SIZE, "white", max_width_px=1000)
+    font = ImageFont.load_default()
+    ascent, descent = font.getmetrics()
+    assert text_h == ascent + descent + subtitle_renderer.LINE_SPACING
+    pad = subtitle_renderer.STROKE_WIDTH + 2
+    assert sprite.shape == (int(text_h + pad * 2) + 1, int(font.getbbox("Hello world")[2] + pad * 2) + 1, 4)
+    assert not sprite.flags.writeable
+    # 글자(테두리 포함)가 스프라이트 안에 있고, 여백은 pad 이내
+    left, top, right, bottom = Image.fromarray(sprite).getbbox()
+    assert left <= pad and top <= pad + ascent
+    assert right >= sprite.shape[1] - pad - 1 - subtitle_renderer.STROKE_WIDTH
+    assert sprite[0, 0, 3] == 0
+
+
+def test_sprite_box_and_wrapped_height():
+    one, one_h = render_text_sprite("aa bb", FONT, SIZE, "white", bg_color="black", max_width_px=1000)
+    two, two_h = render_text_sprite("aa bb", FONT, SIZE, "white", bg_color="black",
+                                    max_width_px=text_width(FONT, SIZE, "aa"))
+    assert two_h == 2 * one_h
+    assert tuple(one[0, 0]) == (0, 0, 0, 255)  # 배경 박스는 불투명
+    assert one.shape[1] > two.shape[1]
+
+
+@pytest.mark.parametrize("pos", ["center", "bottom", "top"])
+def test_sprite_position_places_the_text_block(pos):
+    sprite, text_h = render_text_sprite("Hello", FONT, SIZE, "white", bg_color="black")
+    W, H = 1792, 1024
+    x, y = sprite_position(sprite, text_h, (W, H), pos)
+    pad_y = (sprite.shape[0] - 1 - text_h) / 2
+    expected_top = {"center": (H - text_h) / 2,
+                    "bottom": H - text_h - subtitle_renderer.BOTTOM_MARGIN,
+                    "top": subtitle_renderer.TOP_MARGIN}[pos]
+    # 텍스트 첫 줄의 위치와 가로 중앙 정렬 (반올림 1픽셀 이내)
+    assert abs(y + pad_y - expected_top) <= 1
+    assert abs(x + (sprite.shape[1] - 1) / 2 - W / 2) <= 1
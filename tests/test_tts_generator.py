@@ -0,0 +1,61 @@
+import pytest
+import speech_engine
+import tts_generator
+from fake_services import FakeSpeechEngine, ServiceProfile
+
+FAST = ServiceProfile(latency=0, jitter=0, realtime_factor=0)
+STORY = {"title": "해님 달님", "original_seq": "7", "scenes": [
+    {"scene_num": 1, "scripts": [{"role": "해설", "text": "옛날 옛적에"}, {"role": "여자아이", "text": "오빠!"}]},
+    {"scene_num": 2, "scripts": [{"role": "해설", "text": "해와 달이 되었어요"}]},
+]}
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tts_generator, "SPEECH_KEY", "fake")
+    monkeypatch.setattr(tts_generator, "SPEECH_REGION", "local")
+    fake = FakeSpeechEngine(FAST, cache=None, timing_cache=None)
+    monkeypatch.setattr(speech_engine, "_shared_engine", fake)
+    yield fake
+    fake.close()
+
+
+def test_line_mode_prewarms_only_the_story_voices(engine):
+    tts_generator.generate_tts_for_story(STORY, batch_mode="line")
+    assert engine._prewarmed == {tts_generator.VOICE_MAPPING["해설"], tts_generator.VOICE_MAPPING["여자아이"]}
+
+
+def test_batch_mode_prewarms_the_ssml_pool(engine):
+    tts_generator.generate_tts_for_story(STORY, batch_mode="scene")
+    assert engine._prewarmed == {speech_engine.SSML_POOL_KEY}
+
+
+def test_nothing_to_synthesize_prewarms_nothing(engine):
+    tts_generator.generate_tts_for_story(STORY, batch_mode="line")
+    engine._prewarmed.clear()
+    # 모든 대사가 매니페스트상 최신 -> 새로 열 연결이 없음
+    tts_generator.generate_tts_for_story(STORY, batch_mode="line")
+    assert engine._prewarmed == set()
+
+
+def test_failed_line_raises_after_saving_the_rest(engine, monkeypatch):
+    synthesize = engine.synthesize_timed
+
+    def flaky(text, voice):
+        if text == "오빠!":
+            raise speech_engine.SynthesisError("TooManyRequests")
+        return synthesize(text, voice)
+
+    monkeypatch.setattr(engine, "synthesize_timed", flaky)
+    with pytest.raises(speech_engine.SynthesisError, match="1/3"):
+        tts_generator.generate_tts_for_story(STORY, batch_mode="line")
+    # 성공한 대사는 기록되어 다음 실행에서 재사용
+    manifest = tts_generator.load_asset_manifest("output_assets/해님 달님")
+    assert sorted(manifest) == ["line/S01_000", "line/S02_000"]
+
+
+def test_missing_credentials_raise(engine, monkeypatch):
+    monkeypatch.setattr(tts_generator, "SPEECH_KEY", None)
+    with pytest.raises(speech_engine.SynthesisError):
+        tts_generator.generate_tts_for_story(STORY, batch_mode="line")
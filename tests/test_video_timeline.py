@@ -0,0 +1,67 @@
+import pytest
+import speech_engine
+import video_timeline
+from asset_manifest import INTRO_AUDIO_KEY, asset_entry, update_asset_manifest
+from video_timeline import split_subtitle_chunks, split_subtitle_chunks_from_words
+
+
+def _words(*pairs):
+    return [{"text": text, "offset": offset, "duration": 0.2} for text, offset in pairs]
+
+
+def test_chunks_start_when_their_first_word_is_spoken():
+    text = "가나다 라마바 사아자"
+    words = _words(("가나다", 0.0), ("라마바", 0.5), ("사아자", 1.3))
+    chunks = split_subtitle_chunks_from_words(text, words, 2.0, max_chars=8)
+    assert [c["text"] for c in chunks] == ["가나다 라마바", "사아자"]
+    assert [c["duration"] for c in chunks] == pytest.approx([1.3, 0.7])
+
+
+def test_punctuation_in_text_is_skipped_when_matching_words():
+    text = "안녕, 친구야! 오늘은 어디 가니?"
+    words = _words(("안녕", 0.1), ("친구야", 0.6), ("오늘은", 1.4), ("어디", 2.0), ("가니", 2.4))
+    chunks = split_subtitle_chunks_from_words(text, words, 3.0, max_chars=11)
+    assert [c["text"] for c in chunks] == ["안녕, 친구야!", "오늘은 어디 가니?"]
+    assert [c["duration"] for c in chunks] == pytest.approx([1.4, 1.6])
+
+
+def test_durations_always_cover_the_line():
+    text = "하나 둘 셋 넷 다섯 여섯"
+    # 단어 시각이 거꾸로 와도 자막 시작 시각은 앞으로만 감
+    words = _words(("하나", 0.0), ("둘", 0.4), ("셋", 0.3), ("넷", 0.2), ("다섯", 1.0), ("여섯", 1.5))
+    chunks = split_subtitle_chunks_from_words(text, words, 2.0, max_chars=5)
+    assert all(c["duration"] >= 0 for c in chunks)
+    assert sum(c["duration"] for c in chunks) == pytest.approx(2.0)
+
+
+def test_without_words_falls_back_to_character_share():
+    text = "가나다 라마바 사아자"
+    assert split_subtitle_chunks_from_words(text, [], 2.0, max_chars=8) == split_subtitle_chunks(text, 2.0, max_chars=8)
+
+
+def test_unmatched_words_fall_back_to_character_share():
+    text = "가나다 라마바 사아자"
+    words = _words(("hello", 0.0), ("world", 1.0))
+    assert split_subtitle_chunks_from_words(text, words, 2.0, max_chars=8) == split_subtitle_chunks(text, 2.0, max_chars=8)
+
+
+def test_empty_text():
+    assert split_subtitle_chunks_from_words("", _words(("a", 0.0)), 1.0) == []
+
+
+def test_fresh_title_audio_needs_no_speech_engine(tmp_path, monkeypatch):
+    # 렌더링만 할 때(Speech 키 없음)도 최신 제목 음성은 그대로 씀
+    monkeypatch.setattr(speech_engine, "_shared_engine", None)
+    monkeypatch.setattr(speech_engine, "SPEECH_KEY", None)
+    story_dir = tmp_path / "해님 달님"
+    audio_dir = story_dir / "audio"
+    audio_dir.mkdir(parents=True)
+    path = audio_dir / "00_intro_title.mp3"
+    path.write_bytes(b"ID3")
+    inputs = {"text": "해님 달님", "voice": video_timeline.NARRATOR_VOICE,
+              "format": str(speech_engine.DEFAULT_OUTPUT_FORMAT)}
+    update_asset_manifest(str(story_dir), {INTRO_AUDIO_KEY: asset_entry(str(path), inputs, str(story_dir))})
+
+    assert video_timeline.generate_title_audio("해님 달님", str(path))
+    # 제목이 바뀌면 다시 합성해야 하는데 엔진을 만들 수 없으므로 실패 (인트로 없이 진행)
+    assert not video_timeline.generate_title_audio("해와 달", str(path))
@@ -0,0 +1,41 @@
+import json
+import os
+import threading
+
+# -------------------------------------------------------------------------
+# [설정] 동화별 오디오 타이밍 매니페스트 (audio/timing.json)
+# -------------------------------------------------------------------------
+# 형식: {"lines": {"S01_000_해설_ko-KR-...mp3": {"duration": 초, "words": [{"text", "offset", "duration"}]}}}
+TIMING_MANIFEST = "timing.json"
+
+_lock = threading.Lock()
+
+
+def manifest_path(audio_dir):
+    return os.path.join(audio_dir, TIMING_MANIFEST)
+
+
+def load_timing_manifest(audio_dir):
+    """파일명 -> 타이밍 딕셔너리 (매니페스트가 없으면 빈 딕셔너리)"""
+    path = manifest_path(audio_dir)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("lines", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def update_timing_manifest(audio_dir, entries):
+    """entries(파일명 -> 타이밍)를 기존 매니페스트에 합쳐서 원자적으로 저장합니다."""
+    if not entries:
+        return
+    path = manifest_path(audio_dir)
+    with _lock:
+        lines = load_timing_manifest(audio_dir)
+        lines.update(entries)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"lines": lines}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
@@ -1,8 +1,12 @@
-import json
 import os
-import time
-import azure.cognitiveservices.speech as speechsdk
+from xml.sax.saxutils import escape, quoteattr
 from dotenv import load_dotenv
+from story_store import PROCESSED_STORE, iter_selected
+from audio_io import AUDIO_BUFFERS, audio_duration, can_split, split_audio
+from speech_engine import SSML_POOL_KEY, SynthesisError, audio_cache, get_engine, word_timing
+from timing_manifest import update_timing_manifest
+from asset_manifest import asset_entry, asset_hash, fresh_asset, line_key, load_asset_manifest, update_asset_manifest
+import telemetry
 
 # 1. 환경변수 로드
 load_dotenv()
@@ -52,89 +56,289 @@ VOICE_MAPPING = {
 
 DEFAULT_VOICE = "ko-KR-SunHiNeural" # 기본값
 
+# 배치 모드: "scene"(장면당 SSML 1회), "story"(동화당 1회), "line"(대사마다 1회, 기존 방식)
+TTS_BATCH_MODE = os.getenv("TTS_BATCH_MODE", "scene")
+SSML_MAX_VOICES = 50
+
+
+def prewarm_voices(engine, pending_by_scene, batch_mode=TTS_BATCH_MODE):
+    """새로 합성할 대사에 쓸 풀 키: 배치 모드는 SSML 합성기 하나, 대사별 모드는 그 대사들의 보이스만"""
+    if not any(pending_by_scene):
+        return set()
+    if batch_mode in ("scene", "story") and can_split(engine.extension):
+        return {SSML_POOL_KEY}
+    return {line['voice'] for pending in pending_by_scene for line in pending}
+
 # -------------------------------------------------------------------------
-# [함수] TTS 생성 및 파일 저장 (Azure Speech SDK 사용)
+# [함수 1] 여러 화자 대사를 하나의 SSML 문서로 묶기
 # -------------------------------------------------------------------------
-def generate_tts_for_story(story_data, output_base_dir="output_assets"):
+def build_multivoice_ssml(lines, lang="ko-KR"):
+    """
+    lines: [{"mark": 북마크 이름, "voice": 보이스, "text": 대사}, ...]
+    각 대사 앞에 <bookmark>를 넣어, 합성 결과에서 대사별 시작 시각을 알 수 있게 합니다.
+    """
+    parts = [
+        f'<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" '
+        f'xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="{lang}">'
+    ]
+    for line in lines:
+        parts.append(
+            f'<voice name={quoteattr(line["voice"])}>'
+            f'<bookmark mark={quoteattr(line["mark"])}/>{escape(line["text"])}</voice>'
+        )
+    parts.append('</speak>')
+    return "".join(parts)
+
+
+def synthesize_lines_batched(engine, lines, save_dir):
+    """
+    lines를 SSML 한 번으로 합성한 뒤, 북마크 시각에 맞춰 대사별 파일로 나눠 저장합니다.
+    (MP3는 프레임 경계, WAV는 샘플 경계에서 자름 / Opus는 자를 수 없어 이 함수를 쓰지 않음)
+    단어 경계 이벤트도 함께 받아 대사별 재생 시간/단어 타이밍을 만듭니다.
+    반환: 저장에 성공한 대사의 {파일명: 타이밍}
+    """
+    if not lines:
+        return {}
+    with telemetry.span("tts.batch", first=lines[0]['mark'], lines=len(lines)):
+        return _synthesize_lines_batched(engine, lines, save_dir)
+
+
+def _synthesize_lines_batched(engine, lines, save_dir):
+    marks = {}
+    words = []
+
+    def on_bookmark(evt):
+        # audio_offset 단위는 100ns(tick)
+        marks[evt.text] = evt.audio_offset / 10_000_000
+
+    try:
+        result = engine.synthesize(ssml=build_multivoice_ssml(lines), on_bookmark=on_bookmark,
+                                   on_word_boundary=lambda evt: words.append(word_timing(evt)))
+    except SynthesisError as e:
+        print(f"  ❌ 취소됨: {lines[0]['filename']} 외 {len(lines)-1}개 - {e}")
+        return {}
+
+    # 두 번째 대사부터의 시작 시각이 자르는 지점
+    boundaries = [marks.get(line['mark'], 0.0) for line in lines[1:]]
+    pieces = split_audio(result.audio_data, boundaries, engine.extension)
+
+    # 실제로 잘린 위치(프레임 경계) 기준으로 대사별 시작 시각 계산
+    durations = [audio_duration(data, engine.extension) if data else 0.0 for data in pieces]
+    starts = [sum(durations[:i]) for i in range(len(durations))]
+    words = [w for w in words if w is not None]
+    # 단어가 어느 대사 것인지는 북마크 시각으로 판단 (자른 위치는 최대 반 프레임 어긋남)
+    mark_times = [0.0] + boundaries + [float("inf")]
+
+    timings = {}
+    for i, (line, data) in enumerate(zip(lines, pieces)):
+        if not data:
+            print(f"  ⚠️ 분할 실패: {line['filename']}")
+            continue
+        timing = {
+            "duration": durations[i],
+            "words": [
+                {**w, "offset": max(0.0, w["offset"] - starts[i])}
+                for w in words if mark_times[i] <= w["offset"] < mark_times[i + 1]
+            ],
+        }
+        store_line(engine, line, data, save_dir, timing)
+        timings[line['filename']] = timing
+    return timings
+
+
+def store_line(engine, line, data, save_dir, timing):
+    """파일/캐시에 저장하고, 같은 프로세스의 오디오 조립 단계가 바로 쓰도록 메모리 버퍼에도 넣음 (키: 자산 해시)"""
+    engine.store_audio(line['cache_key'], data, os.path.join(save_dir, line['filename']), timing=timing)
+    AUDIO_BUFFERS.put(asset_hash(line['inputs']), data)
+
+
+def synthesize_line(engine, line, save_dir):
+    """반환: 타이밍 딕셔너리 (실패하면 None)"""
+    try:
+        audio_data, timing = engine.synthesize_timed(line['text'], line['voice'])
+    except SynthesisError as e:
+        print(f"  ❌ 취소됨: {line['filename']} - {e}")
+        return None
+    store_line(engine, line, audio_data, save_dir, timing)
+    return timing
+
+
+def cached_timing(engine, cache_key, filepath):
+    """캐시에서 가져온 대사의 타이밍 (타이밍 캐시가 없던 항목은 파일 헤더로 길이만 계산)"""
+    timing = engine.get_timing(cache_key)
+    if timing is None:
+        with open(filepath, 'rb') as f:
+            timing = {"duration": audio_duration(f.read(), os.path.splitext(filepath)[1]), "words": []}
+    return timing
+
+
+# -------------------------------------------------------------------------
+# [함수 2] TTS 생성 및 파일 저장 (Azure Speech SDK 사용)
+# -------------------------------------------------------------------------
+@telemetry.traced("story.tts", attrs=telemetry.story_attrs)
+def generate_tts_for_story(story_data, output_base_dir="output_assets", batch_mode=TTS_BATCH_MODE, prune=True):
+    """prune=False: 장면 일부만 담은 동화(각색 스트림에서 미리 받은 장면)라 다른 장면의 음성을 지우지 않음"""
     title = story_data['title']
     safe_title = "".join([c for c in title if c.isalnum() or c in (' ', '_')]).strip()
     
-    save_dir = os.path.join(output_base_dir, safe_title, "audio")
+    story_dir = os.path.join(output_base_dir, safe_title)
+    save_dir = os.path.join(story_dir, "audio")
     os.makedirs(save_dir, exist_ok=True)
     
     print(f"🎙️ [TTS 시작] '{title}' 오디오 생성 중...")
     
     if not SPEECH_KEY or not SPEECH_REGION:
-        print("❌ 오류: .env 파일에 SPEECH_KEY 또는 SPEECH_REGION이 없습니다.")
-        return
+        raise SynthesisError(".env 파일에 SPEECH_KEY 또는 SPEECH_REGION이 없습니다.")
 
-    speech_config = speechsdk.SpeechConfig(subscription=SPEECH_KEY, region=SPEECH_REGION)
+    # 보이스별 합성기 풀을 재사용하는 공용 엔진 (동시 합성 수: TTS_CONCURRENCY)
+    engine = get_engine()
     
     scenes = story_data.get('scenes', [])
     total_scripts = sum(len(scene['scripts']) for scene in scenes)
     current_count = 0
+    # 파일명 -> {재생 시간, 단어 타이밍} (영상 단계에서 오디오를 열지 않고 자막 시간을 잡는 데 사용)
+    timings = {}
+    # 자산 매니페스트: 대사별 (텍스트, 보이스, 출력 형식) 해시 -> 입력이 그대로인 대사는 아무것도 하지 않음
+    manifest = load_asset_manifest(story_dir)
+    line_keys = []
+    entries = {}
+    reused = 0
+    failed = 0
 
+    # 1. 캐시에 없는 대사만 장면별로 모으기
+    #    (파일 존재 여부 대신 보이스+텍스트 해시로 판단 -> 대사가 끼어들어도 번호가 밀려 잘못 재사용되지 않음)
+    pending_by_scene = []
     for scene in scenes:
         scene_num = scene['scene_num']
+        pending = []
         
         for idx, script in enumerate(scene['scripts']):
             role = script['role']
-            text = script['text']
-            
-            # 1. 보이스 선택
             voice_name = VOICE_MAPPING.get(role, DEFAULT_VOICE)
             
-            # 2. 파일명 규칙
-            filename = f"S{scene_num:02d}_{idx:03d}_{role}_{voice_name}.mp3"
+            # 파일명 규칙
+            filename = f"S{scene_num:02d}_{idx:03d}_{role}_{voice_name}{engine.extension}"
             filepath = os.path.join(save_dir, filename)
-            
-            if os.path.exists(filepath):
+            asset_key = line_key(scene_num, idx)
+            inputs = {"text": script['text'], "voice": voice_name, "format": str(engine.output_format)}
+            line_keys.append(asset_key)
+            if fresh_asset(manifest, asset_key, inputs, story_dir, filepath):
+                reused += 1
                 current_count += 1
                 continue
 
-            try:
-                # 3. Azure Speech SDK 설정
-                speech_config.speech_synthesis_voice_name = voice_name
-                audio_config = speechsdk.audio.AudioOutputConfig(filename=filepath)
-                
-                # 합성기 생성
-                synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-                
-                # 4. 합성 실행
-                result = synthesizer.speak_text_async(text).get()
-
-                if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                    current_count += 1
-                    print(f"  ✅ [{current_count}/{total_scripts}] {filename} ({role})")
-                elif result.reason == speechsdk.ResultReason.Canceled:
-                    details = result.cancellation_details
-                    print(f"  ❌ 취소됨: {filename} - {details.reason}")
-                    if details.reason == speechsdk.CancellationReason.Error:
-                        print(f"     에러 상세: {details.error_details}")
+            cache_key = engine.cache_key(script['text'], voice_name)
+            if engine.cache is not None and engine.cache.materialize(cache_key, filepath):
+                telemetry.count("cache_hits_total", cache="tts")
+                timings[filename] = cached_timing(engine, cache_key, filepath)
+                entries[asset_key] = asset_entry(filepath, inputs, story_dir)
+                current_count += 1
+                continue
+
+            pending.append({
+                "mark": f"S{scene_num:02d}_{idx:03d}",
+                "role": role,
+                "voice": voice_name,
+                "text": script['text'],
+                "filename": filename,
+                "cache_key": cache_key,
+                "asset_key": asset_key,
+                "inputs": inputs,
+            })
+        if pending:
+            pending_by_scene.append(pending)
+
+    # 첫 합성 때 TLS/웹소켓 연결을 기다리지 않도록 이번에 쓸 합성기 연결만 미리 열어둠 (보이스마다 엔진당 한 번)
+    engine.prewarm(prewarm_voices(engine, pending_by_scene, batch_mode))
 
+    # 2. 배치 모드: 장면(또는 동화) 단위 SSML 한 번으로 여러 화자를 합성
+    if batch_mode in ("scene", "story") and not can_split(engine.extension):
+        print(f"  ℹ️ {engine.extension} 형식은 대사별로 자를 수 없어 대사마다 따로 합성합니다.")
+        batch_mode = "line"
+    if batch_mode in ("scene", "story"):
+        if batch_mode == "story":
+            all_lines = [line for pending in pending_by_scene for line in pending]
+            # Azure SSML 한 문서당 <voice> 최대 50개
+            batches = [all_lines[i:i + SSML_MAX_VOICES] for i in range(0, len(all_lines), SSML_MAX_VOICES)]
+        else:
+            batches = pending_by_scene
+
+        # 장면별 요청을 엔진의 동시 작업으로 실행 (결과는 장면 순서대로 확인)
+        futures = [(lines, engine.submit(synthesize_lines_batched, engine, lines, save_dir)) for lines in batches]
+        for lines, future in futures:
+            try:
+                saved = future.result()
+                timings.update(saved)
+                for line in lines:
+                    if line['filename'] in saved:
+                        entries[line['asset_key']] = asset_entry(
+                            os.path.join(save_dir, line['filename']), line['inputs'], story_dir)
+                current_count += len(saved)
+                failed += len(lines) - len(saved)
+                print(f"  ✅ [{current_count}/{total_scripts}] {lines[0]['mark']} 외 {len(lines)-1}개 대사 (요청 1회)")
             except Exception as e:
-                print(f"  ❌ 예외 발생: {filename} - {e}")
-                time.sleep(1)
+                failed += len(lines)
+                print(f"  ❌ 예외 발생: {lines[0]['filename']} 외 {len(lines)-1}개 - {e}")
 
-    print(f"🎉 '{title}' 오디오 생성 완료! 위치: {save_dir}\n")
+        update_timing_manifest(save_dir, timings)
+        # 대본에서 빠진 대사의 음성은 매니페스트와 폴더에서 지움
+        update_asset_manifest(story_dir, entries, prune_prefix="line/" if prune else None, keep=line_keys)
+        if failed:
+            raise SynthesisError(f"'{title}' 대사 {failed}/{total_scripts}개 합성 실패")
+        print(f"🎉 '{title}' 오디오 생성 완료! (재사용 {reused}, 갱신 {len(entries)}) 위치: {save_dir}\n")
+        return
+
+    # 3. 대사별 모드 (요청 1회 = 대사 1개, 엔진이 동시에 여러 개 처리)
+    futures = []
+    for pending in pending_by_scene:
+        for line in pending:
+            futures.append((line, engine.submit(synthesize_line, engine, line, save_dir)))
+
+    for line, future in futures:
+        try:
+            timing = future.result()
+            if timing is None:
+                failed += 1
+                continue
+            timings[line['filename']] = timing
+            entries[line['asset_key']] = asset_entry(
+                os.path.join(save_dir, line['filename']), line['inputs'], story_dir)
+            current_count += 1
+            print(f"  ✅ [{current_count}/{total_scripts}] {line['filename']} ({line['role']})")
+        except Exception as e:
+            failed += 1
+            print(f"  ❌ 예외 발생: {line['filename']} - {e}")
+
+    update_timing_manifest(save_dir, timings)
+    update_asset_manifest(story_dir, entries, prune_prefix="line/" if prune else None, keep=line_keys)
+    # 음성이 빠진 대사는 영상에서 조용히 빠지므로 실패로 알림 (스케줄러가 영상 단계를 건너뜀)
+    if failed:
+        raise SynthesisError(f"'{title}' 대사 {failed}/{total_scripts}개 합성 실패")
+    print(f"🎉 '{title}' 오디오 생성 완료! (재사용 {reused}, 갱신 {len(entries)}) 위치: {save_dir}\n")
 
 # -------------------------------------------------------------------------
 # [메인] 실행 로직
 # -------------------------------------------------------------------------
-def main(input_json_file):
-    if not os.path.exists(input_json_file):
-        print("❌ JSON 파일이 없습니다.")
+def main(source=PROCESSED_STORE, ids=None, titles=None, since=None, limit=None):
+    if not os.path.exists(source):
+        print("❌ 각색 저장소(또는 JSON 파일)가 없습니다.")
         return
 
-    with open(input_json_file, 'r', encoding='utf-8') as f:
-        stories = json.load(f)
-
-    print(f"📚 총 {len(stories)}편의 동화 오디오를 생성합니다.")
+    print(f"📚 '{source}'의 동화 오디오를 생성합니다.")
     print(f"✨ 적용된 주요 성우: 서현(아역), 순복(할머니), 현수멀티(해설), 봉진(악당) 등")
 
-    for story in stories:
-        generate_tts_for_story(story)
+    # 고른 동화만 한 편씩 읽어서 처리 (ids="12,40-45", titles=[...], since="6h")
+    for story in iter_selected(source, ids=ids, titles=titles, since=since, limit=limit):
+        try:
+            generate_tts_for_story(story)
+        except SynthesisError as e:
+            print(f"❌ {e}")
+
+    cache = audio_cache()
+    if cache is not None:
+        cache.evict()
+        stats = cache.stats()
+        print(f"🗃️ 오디오 캐시: 적중 {stats['hits']} / 미스 {stats['misses']} ({stats['bytes'] / 1024 / 1024:.1f}MB)")
 
 if __name__ == "__main__":
-    INPUT_FILE = "processed_stories.json"
-    main(INPUT_FILE)
\ No newline at end of file
+    main()
\ No newline at end of file
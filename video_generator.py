@@ -1,31 +1,33 @@
 import json
 import os
-import glob
-import numpy as np
 import multiprocessing
-import azure.cognitiveservices.speech as speechsdk
 from moviepy.editor import *
-from PIL import Image, ImageDraw, ImageFont
 from dotenv import load_dotenv
+from story_store import PROCESSED_STORE, iter_selected
+from timing_manifest import load_timing_manifest
+from asset_manifest import FINAL_VIDEO_KEY, asset_entry, fresh_asset, load_asset_manifest, update_asset_manifest
+import telemetry
+from subtitle_renderer import render_text_sprite, sprite_position
+from motion import MOTION_ZOOM, KenBurns, motion_for_scene
+from video_timeline import (
+    FONT_PATH, SUBTITLE_FONT_SIZE, TITLE_FONT_SIZE, SUBTITLE_COLOR, SUBTITLE_BG_COLOR,
+    MAX_CHARS_PER_SCREEN, VIDEO_SIZE, VIDEO_FPS, INTRO_FADE_IN, SCENE_FADE_IN,
+    split_subtitle_chunks_from_words, generate_title_audio,
+    build_story_timeline, render_inputs, find_line_audio, find_scene_image, intro_audio_path
+)
 
 # -------------------------------------------------------------------------
-# [초기 설정] 환경변수 및 폰트 로드
+# [초기 설정] 환경변수 로드 (폰트/자막 디자인 설정은 video_timeline.py)
 # -------------------------------------------------------------------------
 load_dotenv()
 
-# ★ 폰트 경로 설정 (Windows: 맑은 고딕 / Mac: AppleSDGothicNeo 등)
-# 파일이 실제로 존재하는지 꼭 확인하세요!
-FONT_PATH = "C:/Windows/Fonts/malgun.ttf"  
-# FONT_PATH = "/System/Library/Fonts/AppleSDGothicNeo.ttc" # Mac 예시
+# 렌더링 엔진: "moviepy"(기존 방식), "ffmpeg"(필터 그래프 한 번으로 렌더링, 훨씬 빠름),
+#             "segments"(인트로/장면을 프로세스 풀에서 따로 렌더링한 뒤 스트림 복사로 연결)
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "moviepy")
 
-# 자막 디자인 설정
-SUBTITLE_FONT_SIZE = 45
-TITLE_FONT_SIZE = 80
-SUBTITLE_COLOR = "white"
-SUBTITLE_BG_COLOR = (0, 0, 0, 160) # 반투명 검정 박스 (R, G, B, Alpha)
-
-# 한 화면에 보여줄 최대 글자 수 (이걸 넘으면 다음 자막으로 분할)
-MAX_CHARS_PER_SCREEN = 40  
+# 장면 이미지에 천천히 확대/이동하는 카메라 움직임 넣기 (MoviePy 렌더링, 1이면 켬)
+# 매 프레임을 새로 만들고 인코딩하므로 정지 이미지보다 렌더링이 느림 -> 기본은 정지 이미지
+SCENE_MOTION = os.getenv("SCENE_MOTION", "0") == "1"
 
 # Azure Speech API 키
 SPEECH_KEY = os.getenv("SPEECH_KEY")
@@ -40,190 +42,66 @@ def create_text_clip_pil(text, font_path, font_size, color, bg_color=None, durat
     - 중앙 정렬 완벽 지원
     - 배경 박스 자동 크기 조절
     - 글자 테두리(Stroke) 지원
+    - 화면 전체가 아니라 글자 영역만 잘라낸 스프라이트를 위치 지정해서 반환 (합성 비용 절감)
+    - 같은 텍스트/스타일은 한 번만 그려서 재사용
     """
     W, H = size
-    
-    # 1. 폰트 로드
-    try:
-        font = ImageFont.truetype(font_path, font_size)
-    except OSError:
-        print(f"⚠️ 폰트 로드 실패({font_path}). 기본 폰트를 사용합니다.")
-        font = ImageFont.load_default()
-    
-    # 빈 투명 이미지 생성
-    img = Image.new('RGBA', size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(img)
 
-    # 2. 시각적 줄바꿈 (화면 너비 85% 넘어가면 강제 개행)
-    max_width_px = W * 0.85
-    visual_lines = []
-    
-    # 입력된 텍스트가 이미 줄바꿈이 되어 있을 수도 있으므로 split('\n') 처리
-    for paragraph in text.split('\n'):
-        words = paragraph.split()
-        current_line = []
-        
-        for word in words:
-            # "현재 줄 + 새 단어" 길이를 미리 측정
-            test_line = " ".join(current_line + [word])
-            line_w = font.getbbox(test_line)[2] # getbbox의 3번째 값이 width
-            
-            if line_w <= max_width_px:
-                current_line.append(word)
-            else:
-                # 넘치면 현재 줄 저장하고 다음 줄로 이동
-                visual_lines.append(" ".join(current_line))
-                current_line = [word]
-        
-        if current_line:
-            visual_lines.append(" ".join(current_line))
+    # 화면 너비 85% 넘어가면 강제 개행
+    sprite, total_text_h = render_text_sprite(
+        text, font_path, font_size, color,
+        bg_color=tuple(bg_color) if bg_color else None,
+        max_width_px=W * 0.85
+    )
+    x, y = sprite_position(sprite, total_text_h, size, pos)
 
-    # 3. 텍스트 전체 높이 및 좌표 계산
-    # 한 줄 높이 계산 (한글 기준)
-    ascent, descent = font.getmetrics()
-    line_height = ascent + descent + 10 # 여유분 10px
-    total_text_h = line_height * len(visual_lines)
-    
-    # Y 좌표 결정
-    if pos == 'center':
-        y = (H - total_text_h) / 2
-    elif pos == 'bottom':
-        y = H - total_text_h - 100 # 바닥에서 100px 위
-    else:
-        y = 100
-
-    # 4. 배경 박스 그리기 (텍스트가 있을 경우만)
-    if bg_color and text.strip():
-        max_line_w = 0
-        for line in visual_lines:
-            w = font.getbbox(line)[2]
-            if w > max_line_w: max_line_w = w
-            
-        padding = 20
-        # 박스 좌표 계산 (중앙 정렬 기준)
-        bx1 = (W - max_line_w) / 2 - padding
-        by1 = y - padding
-        bx2 = (W + max_line_w) / 2 + padding
-        by2 = y + total_text_h + padding - 5
-        
-        draw.rectangle([bx1, by1, bx2, by2], fill=bg_color)
-
-    # 5. 텍스트 그리기 (테두리 포함)
-    cur_y = y
-    for line in visual_lines:
-        w = font.getbbox(line)[2]
-        x = (W - w) / 2 # ★ 수동 중앙 정렬 계산
-        
-        # 검은색 테두리 (Stroke) 효과 - 4방향으로 그려서 구현
-        stroke_width = 2
-        for off_x in range(-stroke_width, stroke_width+1):
-            for off_y in range(-stroke_width, stroke_width+1):
-                 draw.text((x+off_x, cur_y+off_y), line, font=font, fill="black")
-        
-        # 메인 텍스트
-        draw.text((x, cur_y), line, font=font, fill=color)
-        cur_y += line_height
-
-    # 6. Numpy 배열로 변환하여 ImageClip 생성
-    return ImageClip(np.array(img)).set_duration(duration)
+    return ImageClip(sprite).set_duration(duration).set_position((x, y))
 
 # -------------------------------------------------------------------------
-# [함수 2] 자막 시간 분배 로직 (어절 단위 분할)
+# [함수 2] 타임라인 -> 클립 (대사 음성은 조립된 동화 트랙 1개로 한 번에 입힘)
 # -------------------------------------------------------------------------
-def split_subtitle_chunks(text, total_duration, max_chars=40):
-    """
-    긴 문장을 어절 단위로 끊어서 max_chars를 넘지 않게 덩어리로 나눔.
-    시간은 글자 수에 비례하여 배분.
-    """
-    words = text.split()
-    chunks = []
-    
-    current_chunk_words = []
-    current_len = 0
-    
-    # 1. 텍스트 덩어리 나누기
-    for word in words:
-        word_len = len(word)
-        if current_len + word_len + 1 <= max_chars:
-            current_chunk_words.append(word)
-            current_len += word_len + 1
-        else:
-            if current_chunk_words:
-                chunks.append(" ".join(current_chunk_words))
-            current_chunk_words = [word]
-            current_len = word_len + 1
-            
-    if current_chunk_words:
-        chunks.append(" ".join(current_chunk_words))
-    
-    if not chunks:
-        return []
-
-    # 2. 시간 배분 (글자 수 비례)
-    total_char_count = sum(len(c.replace(" ", "")) for c in chunks)
-    if total_char_count == 0: total_char_count = 1
-    
-    result = []
-    for chunk_text in chunks:
-        chunk_len = len(chunk_text.replace(" ", ""))
-        chunk_duration = total_duration * (chunk_len / total_char_count)
-        
-        # 너무 짧은 자막 방지 (최소 1초 보장, 단 전체 길이가 충분할 때)
-        if chunk_duration < 1.0 and total_duration > len(chunks):
-             chunk_duration = 1.0
-             
-        result.append({'text': chunk_text, 'duration': chunk_duration})
-        
-    # 마지막 자막 시간 보정 (오차 수정)
-    calc_total = sum(r['duration'] for r in result)
-    if result:
-        result[-1]['duration'] += (total_duration - calc_total)
-        
-    return result
+def _clips_from_timeline(timeline):
+    """인트로/장면 화면과 자막만 만듭니다. 길이와 자막 시각은 트랙 조립 결과(무음 정리/간격)를 따름"""
+    final_clips = []
+    intro = timeline["intro"]
+    if intro:
+        title_clip = create_text_clip_pil(
+            timeline["title"], FONT_PATH, TITLE_FONT_SIZE, "white",
+            duration=intro["duration"], size=VIDEO_SIZE, pos='center'
+        )
+        bg_clip = ColorClip(size=VIDEO_SIZE, color=(0,0,0), duration=intro["duration"])
+        final_clips.append(CompositeVideoClip([bg_clip, title_clip]).fadein(INTRO_FADE_IN))
+        print("  ✅ 인트로 생성 완료")
 
-# -------------------------------------------------------------------------
-# [함수 3] 제목 오디오 생성 (Azure TTS)
-# -------------------------------------------------------------------------
-def generate_title_audio(text, output_path):
-    if os.path.exists(output_path): return True
-    try:
-        speech_config = speechsdk.SpeechConfig(subscription=SPEECH_KEY, region=SPEECH_REGION)
-        speech_config.speech_synthesis_voice_name = "ko-KR-HyunsuMultilingualNeural" # 해설자 톤
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=output_path)
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-        result = synthesizer.speak_text_async(text).get()
-        return result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted
-    except Exception as e:
-        print(f"❌ 제목 TTS 에러: {e}")
-        return False
+    for scene in timeline["scenes"]:
+        scene_num, total_dur = scene["scene_num"], scene["duration"]
+        print(f"  🎞️ 장면 {scene_num} 구성 중...")
+        subtitle_clips = [
+            create_text_clip_pil(
+                sub["text"], FONT_PATH, SUBTITLE_FONT_SIZE, SUBTITLE_COLOR,
+                bg_color=SUBTITLE_BG_COLOR, duration=sub["duration"], size=VIDEO_SIZE, pos='bottom'
+            ).set_start(sub["start"])
+            for sub in scene["subtitles"]
+        ]
+        if SCENE_MOTION:
+            motion = KenBurns(scene["image"], total_dur, VIDEO_SIZE, VIDEO_FPS, motion_for_scene(scene_num))
+            base_img = VideoClip(motion.frame_at, duration=total_dur).crossfadein(SCENE_FADE_IN)
+        else:
+            base_img = ImageClip(scene["image"]).set_duration(total_dur).crossfadein(SCENE_FADE_IN)
+        final_clips.append(CompositeVideoClip([base_img] + subtitle_clips))
+    return final_clips
 
 # -------------------------------------------------------------------------
-# [메인 로직] 비디오 생성
+# [함수 3] 대사 파일마다 오디오 클립을 여는 예전 방식 (AUDIO_ASSEMBLY=0)
 # -------------------------------------------------------------------------
-def create_video_for_story(story_data, base_dir="output_assets"):
+def _clips_from_line_audio(story_data, story_dir, audio_dir, image_dir):
     title = story_data['title']
-    safe_title = "".join([c for c in title if c.isalnum() or c in (' ', '_')]).strip()
-    
-    story_dir = os.path.join(base_dir, safe_title)
-    audio_dir = os.path.join(story_dir, "audio")
-    image_dir = os.path.join(story_dir, "images")
-    output_video_path = os.path.join(story_dir, f"{safe_title}_final.mp4")
-    
-    # 해상도 설정 (이미지 생성 사이즈와 동일하게 맞춤)
-    VIDEO_SIZE = (1536, 1024) 
-
-    print(f"🎬 [영상 편집 시작] '{title}'")
-
-    if not os.path.exists(audio_dir) or not os.path.exists(image_dir):
-        print(f"  ❌ 자산 폴더가 없어 건너뜁니다.")
-        return
-
     final_clips = []
 
     # ==========================================
     # 1. 인트로 (Intro) 제작
     # ==========================================
-    title_audio_path = os.path.join(audio_dir, "00_intro_title.mp3")
+    title_audio_path = intro_audio_path(audio_dir)
     
     # 제목 오디오 생성 시도
     has_intro_audio = generate_title_audio(title, title_audio_path)
@@ -249,6 +127,11 @@ def create_video_for_story(story_data, base_dir="output_assets"):
     # ==========================================
     # 2. 본문 씬(Scene) 루프
     # ==========================================
+    # TTS 단계에서 기록한 단어 타이밍 (있으면 자막을 실제 발음 시각에 맞춤)
+    manifest = load_timing_manifest(audio_dir)
+    # 대사 음성/장면 그림은 자산 매니페스트로 찾음 (지금 대본으로 만든 파일만 기록되어 있음)
+    assets = load_asset_manifest(story_dir)
+
     scenes = story_data.get('scenes', [])
     for scene in scenes:
         scene_num = scene['scene_num']
@@ -258,8 +141,8 @@ def create_video_for_story(story_data, base_dir="output_assets"):
 
         # 이미지 로드
         img_filename = f"S{scene_num:02d}.png"
-        img_path = os.path.join(image_dir, img_filename)
-        if not os.path.exists(img_path):
+        img_path = find_scene_image(assets, story_dir, image_dir, scene_num)
+        if not img_path:
             print(f"    ⚠️ 이미지 없음: {img_filename}")
             continue
 
@@ -269,23 +152,21 @@ def create_video_for_story(story_data, base_dir="output_assets"):
         
         # 스크립트(대사) 루프
         for idx, script in enumerate(scripts):
-            role = script['role']
             text = script['text']
             
-            # 오디오 파일 찾기 (파일명 패턴 매칭)
-            pattern = os.path.join(audio_dir, f"S{scene_num:02d}_{idx:03d}_{role}_*.mp3")
-            matches = glob.glob(pattern)
+            # 오디오 파일 찾기 (자산 매니페스트)
+            audio_path = find_line_audio(assets, story_dir, scene_num, idx)
             
-            if not matches: continue
+            if not audio_path: continue
             
-            audio_path = matches[0]
             try:
                 audio_clip = AudioFileClip(audio_path)
                 total_duration = audio_clip.duration
                 scene_audio_clips.append(audio_clip)
                 
                 # ★ 자막 분할 및 생성 (핵심 로직)
-                subtitle_chunks = split_subtitle_chunks(text, total_duration, MAX_CHARS_PER_SCREEN)
+                words = manifest.get(os.path.basename(audio_path), {}).get("words")
+                subtitle_chunks = split_subtitle_chunks_from_words(text, words, total_duration, MAX_CHARS_PER_SCREEN)
                 
                 for chunk in subtitle_chunks:
                     chunk_text = chunk['text']
@@ -316,43 +197,110 @@ def create_video_for_story(story_data, base_dir="output_assets"):
         total_dur = combined_audio.duration + 0.5 # 0.5초 여유
         
         # 배경 이미지 (크로스페이드 효과 추가)
-        base_img = ImageClip(img_path).set_duration(total_dur).crossfadein(0.5)
+        if SCENE_MOTION:
+            # 이미지는 한 번만 디코딩, 프레임마다 미리 계산한 영역을 면적 샘플링 (PIL resize/crop 없음)
+            motion = KenBurns(img_path, total_dur, VIDEO_SIZE, VIDEO_FPS, motion_for_scene(scene_num))
+            base_img = VideoClip(motion.frame_at, duration=total_dur).crossfadein(0.5)
+        else:
+            base_img = ImageClip(img_path).set_duration(total_dur).crossfadein(0.5)
         
         # CompositeVideoClip은 [배경, 자막1, 자막2...] 순서로 넣어야 함
         final_scene = CompositeVideoClip([base_img] + scene_subtitle_clips).set_audio(combined_audio)
         final_clips.append(final_scene)
 
+    return final_clips
+
+# -------------------------------------------------------------------------
+# [메인 로직] 비디오 생성
+# -------------------------------------------------------------------------
+@telemetry.traced("story.video", attrs=telemetry.story_attrs)
+def create_video_for_story(story_data, base_dir="output_assets", backend=RENDER_BACKEND, renditions=None):
+    """renditions: 함께 만들 출력본 (예: "main,shorts,preview", 기본은 VIDEO_RENDITIONS) - FFmpeg 백엔드 전용"""
+    options = {} if renditions is None else {"renditions": renditions}
+    if backend == "ffmpeg":
+        from ffmpeg_renderer import render_story_ffmpeg
+        with telemetry.profile("video", story_data.get('original_seq')):
+            return render_story_ffmpeg(story_data, base_dir, **options)
+    if backend == "segments":
+        from segment_renderer import render_story_segments
+        with telemetry.profile("video", story_data.get('original_seq')):
+            return render_story_segments(story_data, base_dir, **options)
+    # 환경변수(VIDEO_RENDITIONS)로 요청한 출력본도 여기서는 만들 수 없으므로 알려 줌
+    from ffmpeg_renderer import extra_renditions
+    skipped = extra_renditions(renditions)
+    if skipped:
+        print(f"  ⚠️ MoviePy 렌더링은 main 출력본만 만듭니다. {', '.join(skipped)} 출력본은 건너뜁니다. "
+              f"(여러 출력본은 --backend ffmpeg/segments)")
+
+    title = story_data['title']
+    safe_title = "".join([c for c in title if c.isalnum() or c in (' ', '_')]).strip()
+    
+    story_dir = os.path.join(base_dir, safe_title)
+    audio_dir = os.path.join(story_dir, "audio")
+    image_dir = os.path.join(story_dir, "images")
+    output_video_path = os.path.join(story_dir, f"{safe_title}_final.mp4")
+    
+    print(f"🎬 [영상 편집 시작] '{title}'")
+
+    if not os.path.exists(audio_dir) or not os.path.exists(image_dir):
+        print(f"  ❌ 자산 폴더가 없어 건너뜁니다.")
+        return
+
+    # 그림/음성/자막/카메라 움직임 설정이 지난번과 같으면 다시 렌더링하지 않음
+    timeline = build_story_timeline(story_data, base_dir)
+    inputs = render_inputs(timeline, backend="moviepy", motion=SCENE_MOTION, zoom=MOTION_ZOOM)
+    if fresh_asset(load_asset_manifest(story_dir), FINAL_VIDEO_KEY, inputs, story_dir, output_video_path):
+        print(f"  👉 바뀐 자산이 없어 렌더링을 건너뜁니다. ({output_video_path})\n")
+        return output_video_path
+
+    if timeline.get("audio_track"):
+        # 대사마다 AudioFileClip을 열어 장면별로 잇는 대신, 조립된 트랙 하나를 최종 영상에 입힘
+        final_clips = _clips_from_timeline(timeline)
+        story_audio = AudioFileClip(timeline["audio_track"])
+    else:
+        final_clips = _clips_from_line_audio(story_data, story_dir, audio_dir, image_dir)
+        story_audio = None
+
     # ==========================================
     # 3. 최종 렌더링 (고속 모드)
     # ==========================================
     if final_clips:
         print(f"  💾 렌더링 시작... (설정: Ultrafast, Threads=Max)")
         final_video = concatenate_videoclips(final_clips, method="compose")
+        if story_audio is not None:
+            final_video = final_video.set_audio(story_audio)
         
         # CPU 코어 수 확인
         cpu_count = multiprocessing.cpu_count()
         
         try:
-            final_video.write_videofile(
-                output_video_path, 
-                fps=24, 
-                codec='libx264', 
-                audio_codec='aac',
-                threads=cpu_count,     # 멀티쓰레딩
-                preset='ultrafast',    # 속도 최우선
-                ffmpeg_params=['-tune', 'stillimage'] # 정지 영상 최적화
-            )
+            # 프레임 합성(자막/페이드)과 인코딩이 이 안에서 일어남 -> 인코딩 구간 + 프로파일 대상
+            with telemetry.span("encode.moviepy", story=title), \
+                    telemetry.profile("video", story_data.get('original_seq')):
+                final_video.write_videofile(
+                    output_video_path, 
+                    fps=VIDEO_FPS, 
+                    codec='libx264', 
+                    audio_codec='aac',
+                    threads=cpu_count,     # 멀티쓰레딩
+                    preset='ultrafast',    # 속도 최우선
+                    # 정지 영상 최적화 (카메라 움직임이 있으면 매 프레임이 달라서 쓰지 않음)
+                    ffmpeg_params=[] if SCENE_MOTION else ['-tune', 'stillimage']
+                )
+            telemetry.count("bytes_written_total", os.path.getsize(output_video_path), stage="video")
+            update_asset_manifest(story_dir, {FINAL_VIDEO_KEY: asset_entry(output_video_path, inputs, story_dir)})
             print(f"🎉 영상 제작 성공! \n📁 위치: {output_video_path}\n")
+            return output_video_path
         except Exception as e:
             print(f"❌ 렌더링 실패: {e}")
     else:
         print("❌ 생성할 클립이 없습니다.")
 
-def main(input_file):
-    if os.path.exists(input_file):
-        with open(input_file, 'r', encoding='utf-8') as f:
-            for story in json.load(f):
-                create_video_for_story(story)
+def main(source=PROCESSED_STORE, ids=None, titles=None, since=None, limit=None):
+    if os.path.exists(source):
+        # 고른 동화만 한 편씩 읽어서 처리 (ids="12,40-45", titles=[...], since="6h")
+        for story in iter_selected(source, ids=ids, titles=titles, since=since, limit=limit):
+            create_video_for_story(story)
 
 if __name__ == "__main__":
-    main("processed_stories.json")
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,353 @@
+import os
+import json
+import subprocess
+from speech_engine import get_engine, output_extension, output_format
+from timing_manifest import load_timing_manifest, update_timing_manifest
+from asset_manifest import (
+    INTRO_AUDIO_KEY, asset_entry, asset_path, fresh_asset, image_key, line_key,
+    load_asset_manifest, update_asset_manifest
+)
+
+# -------------------------------------------------------------------------
+# [설정] 영상 / 자막 디자인 (MoviePy, FFmpeg 렌더러 공용)
+# -------------------------------------------------------------------------
+# ★ 폰트 경로 설정 (Windows: 맑은 고딕 / Mac: AppleSDGothicNeo 등)
+# 파일이 실제로 존재하는지 꼭 확인하세요!
+FONT_PATH = "C:/Windows/Fonts/malgun.ttf"  
+# FONT_PATH = "/System/Library/Fonts/AppleSDGothicNeo.ttc" # Mac 예시
+
+# 자막 디자인 설정
+SUBTITLE_FONT_SIZE = 45
+TITLE_FONT_SIZE = 80
+SUBTITLE_COLOR = "white"
+SUBTITLE_BG_COLOR = (0, 0, 0, 160) # 반투명 검정 박스 (R, G, B, Alpha)
+
+# 한 화면에 보여줄 최대 글자 수 (이걸 넘으면 다음 자막으로 분할)
+MAX_CHARS_PER_SCREEN = 40
+
+# 해상도 설정 (이미지 생성 사이즈와 동일하게 맞춤)
+VIDEO_SIZE = (1536, 1024)
+VIDEO_FPS = 24
+
+INTRO_PADDING = 2.0   # 제목 음성 뒤 여유 시간
+INTRO_FADE_IN = 1.5
+SCENE_PADDING = 0.5   # 장면 끝 여유 시간
+SCENE_FADE_IN = 0.5
+
+# 대사 음성을 동화 트랙 1개로 미리 조립 (무음 정리/화자별 음량 맞춤, audio_assembly.py)
+# 0이면 예전처럼 렌더러가 대사 파일을 하나씩 이어 붙임
+AUDIO_ASSEMBLY = os.getenv("AUDIO_ASSEMBLY", "1") != "0"
+
+NARRATOR_VOICE = "ko-KR-HyunsuMultilingualNeural" # 해설자 톤
+
+# -------------------------------------------------------------------------
+# [함수 1] 자막 시간 분배 로직 (어절 단위 분할)
+# -------------------------------------------------------------------------
+def chunk_subtitle_text(text, max_chars=40):
+    """긴 문장을 어절 단위로 끊어서 max_chars를 넘지 않는 덩어리(문자열) 목록으로 나눔"""
+    words = text.split()
+    chunks = []
+    
+    current_chunk_words = []
+    current_len = 0
+    
+    # 1. 텍스트 덩어리 나누기
+    for word in words:
+        word_len = len(word)
+        if current_len + word_len + 1 <= max_chars:
+            current_chunk_words.append(word)
+            current_len += word_len + 1
+        else:
+            if current_chunk_words:
+                chunks.append(" ".join(current_chunk_words))
+            current_chunk_words = [word]
+            current_len = word_len + 1
+            
+    if current_chunk_words:
+        chunks.append(" ".join(current_chunk_words))
+    return chunks
+
+
+def split_subtitle_chunks(text, total_duration, max_chars=40):
+    """
+    긴 문장을 어절 단위로 끊어서 max_chars를 넘지 않게 덩어리로 나눔.
+    시간은 글자 수에 비례하여 배분.
+    """
+    chunks = chunk_subtitle_text(text, max_chars)
+    if not chunks:
+        return []
+
+    # 2. 시간 배분 (글자 수 비례)
+    total_char_count = sum(len(c.replace(" ", "")) for c in chunks)
+    if total_char_count == 0: total_char_count = 1
+    
+    result = []
+    for chunk_text in chunks:
+        chunk_len = len(chunk_text.replace(" ", ""))
+        chunk_duration = total_duration * (chunk_len / total_char_count)
+        
+        # 너무 짧은 자막 방지 (최소 1초 보장, 단 전체 길이가 충분할 때)
+        if chunk_duration < 1.0 and total_duration > len(chunks):
+             chunk_duration = 1.0
+             
+        result.append({'text': chunk_text, 'duration': chunk_duration})
+        
+    # 마지막 자막 시간 보정 (오차 수정)
+    calc_total = sum(r['duration'] for r in result)
+    if result:
+        result[-1]['duration'] += (total_duration - calc_total)
+        
+    return result
+
+
+def split_subtitle_chunks_from_words(text, words, total_duration, max_chars=40):
+    """
+    TTS 단어 경계 타이밍(words)이 있으면 각 자막 덩어리를 실제로 그 첫 단어가 발음되는 시각에 맞춤.
+    타이밍이 없거나 맞춰지지 않으면 글자 수 비례 배분(split_subtitle_chunks)을 사용.
+    """
+    if not words:
+        return split_subtitle_chunks(text, total_duration, max_chars)
+    chunks = chunk_subtitle_text(text, max_chars)
+    if not chunks:
+        return []
+
+    # 공백을 뺀 문장에서 각 단어가 시작하는 글자 위치 찾기 (문장 부호 등은 건너뜀)
+    flat = "".join(text.split())
+    word_positions = []
+    cursor = 0
+    for word in words:
+        token = "".join(word['text'].split())
+        found = flat.find(token, cursor) if token else -1
+        if found < 0:
+            continue
+        word_positions.append((found, word['offset']))
+        cursor = found + len(token)
+    if not word_positions:
+        return split_subtitle_chunks(text, total_duration, max_chars)
+
+    # 덩어리 시작 글자 위치 이후 처음 나오는 단어의 발음 시각이 그 덩어리의 시작
+    starts = [0.0]
+    char_pos = 0
+    for chunk_text in chunks[:-1]:
+        char_pos += len(chunk_text.replace(" ", ""))
+        offset = next((o for p, o in word_positions if p >= char_pos), total_duration)
+        starts.append(min(max(offset, starts[-1]), total_duration))
+
+    ends = starts[1:] + [total_duration]
+    return [{'text': chunk_text, 'duration': end - start}
+            for chunk_text, start, end in zip(chunks, starts, ends)]
+
+# -------------------------------------------------------------------------
+# [함수 2] 제목 오디오 생성 (Azure TTS)
+# -------------------------------------------------------------------------
+def generate_title_audio(text, output_path):
+    try:
+        # 최신 여부는 설정된 출력 형식으로 판단 (렌더링만 할 때는 Speech 키가 없어도 기존 제목 음성을 씀)
+        story_dir = os.path.dirname(os.path.dirname(output_path))
+        inputs = {"text": text, "voice": NARRATOR_VOICE, "format": str(output_format())}
+        if fresh_asset(load_asset_manifest(story_dir), INTRO_AUDIO_KEY, inputs, story_dir, output_path):
+            return True
+        # 다시 만들어야 할 때만 공용 합성 엔진 사용 (같은 제목은 오디오 캐시에서 바로 연결됨)
+        engine = get_engine()
+        if not engine.synthesize_to_file(text, NARRATOR_VOICE, output_path):
+            return False
+        # 대사와 같은 매니페스트에 제목 음성 길이도 기록 (영상 단계에서 오디오를 열지 않음)
+        timing = engine.get_timing(engine.cache_key(text, NARRATOR_VOICE))
+        if timing is not None:
+            update_timing_manifest(os.path.dirname(output_path), {os.path.basename(output_path): timing})
+        update_asset_manifest(story_dir, {INTRO_AUDIO_KEY: asset_entry(output_path, inputs, story_dir)})
+        return True
+    except Exception as e:
+        print(f"❌ 제목 TTS 에러: {e}")
+        return False
+
+# -------------------------------------------------------------------------
+# [함수 3] 오디오 길이 측정 (ffprobe, 디코딩 없이 헤더만 읽음)
+# -------------------------------------------------------------------------
+def probe_duration(path):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+        capture_output=True, text=True, check=True
+    )
+    return float(json.loads(result.stdout)["format"]["duration"])
+
+
+def story_paths(story_data, base_dir="output_assets"):
+    title = story_data['title']
+    safe_title = "".join([c for c in title if c.isalnum() or c in (' ', '_')]).strip()
+    story_dir = os.path.join(base_dir, safe_title)
+    return {
+        "safe_title": safe_title,
+        "story_dir": story_dir,
+        "audio_dir": os.path.join(story_dir, "audio"),
+        "image_dir": os.path.join(story_dir, "images"),
+        "output_video_path": os.path.join(story_dir, f"{safe_title}_final.mp4"),
+    }
+
+
+def intro_audio_path(audio_dir):
+    """제목 음성 파일 경로 (확장자는 TTS 출력 형식을 따름)"""
+    return os.path.join(audio_dir, f"00_intro_title{output_extension()}")
+
+
+def find_line_audio(assets, story_dir, scene_num, idx):
+    """자산 매니페스트에 기록된 대사 음성 (TTS 단계에서 지금 대본으로 만든 파일만 기록됨)"""
+    return asset_path(assets, line_key(scene_num, idx), story_dir)
+
+
+def find_scene_image(assets, story_dir, image_dir, scene_num):
+    """자산 매니페스트의 장면 그림 (매니페스트가 생기기 전에 만든 그림은 정해진 파일 이름으로 찾음)"""
+    path = asset_path(assets, image_key(scene_num), story_dir)
+    if path is None and image_key(scene_num) not in assets:
+        fallback = os.path.join(image_dir, f"S{scene_num:02d}.png")
+        path = fallback if os.path.exists(fallback) else None
+    return path
+
+
+def asset_deps(assets, *keys):
+    """구간 영상이 의존하는 자산들의 입력 해시 (하나라도 바뀌면 그 구간만 다시 렌더링)"""
+    return [assets.get(key, {}).get("hash") for key in keys]
+
+
+def asset_voice(assets, key):
+    """음성 자산을 만든 보이스의 입력 해시 (같은 보이스끼리 음량을 맞출 때 묶는 기준)"""
+    return assets.get(key, {}).get("inputs", {}).get("voice")
+
+
+def line_timing(manifest, audio_path, duration_of=probe_duration):
+    """
+    TTS 단계에서 기록한 타이밍 매니페스트에서 재생 시간/단어 타이밍을 가져옵니다.
+    매니페스트에 없는 파일(이전 버전으로 만든 오디오 등)만 duration_of로 길이를 잽니다.
+    """
+    timing = manifest.get(os.path.basename(audio_path))
+    if timing is not None:
+        return timing
+    return {"duration": duration_of(audio_path), "words": []}
+
+
+# -------------------------------------------------------------------------
+# [함수 4] 동화 타임라인 (렌더러와 무관한 장면/대사/자막 시간표)
+# -------------------------------------------------------------------------
+def build_story_timeline(story_data, base_dir="output_assets", duration_of=probe_duration, assemble_audio=AUDIO_ASSEMBLY):
+    """
+    동화 한 편을 렌더링에 필요한 시간표로 정리합니다.
+    반환 예:
+    {
+      "title", "paths",
+      "intro": {"audio", "duration", "audio_duration", "voice", "dep"} 또는 None,
+      "scenes": [{"scene_num", "image", "duration",
+                  "lines": [{"audio", "start", "duration", "voice", "dep"}],
+                  "subtitles": [{"text", "start", "duration", "line"}], "deps"}]
+    }
+    모든 start는 해당 구간(인트로/장면) 시작 기준 초 단위입니다.
+    deps는 그 구간이 쓰는 자산(그림/음성)의 입력 해시 목록입니다. (render_inputs 참고)
+    assemble_audio면 대사를 동화 트랙 1개로 조립하고 그 결과(무음을 자른 길이/간격)로 시간표를 고칩니다.
+    이때 "audio_track"(트랙 경로)과 구간마다 "audio_start"(트랙에서의 시작 위치)가 추가됩니다.
+    """
+    paths = story_paths(story_data, base_dir)
+    audio_dir, image_dir = paths["audio_dir"], paths["image_dir"]
+    timeline = {"title": story_data['title'], "paths": paths, "intro": None, "scenes": []}
+
+    if not os.path.exists(audio_dir) or not os.path.exists(image_dir):
+        return timeline
+
+    # 1. 인트로 (제목 음성 + 여유 시간)
+    title_audio_path = intro_audio_path(audio_dir)
+    has_intro_audio = generate_title_audio(story_data['title'], title_audio_path)
+    manifest = load_timing_manifest(audio_dir)
+    assets = load_asset_manifest(paths["story_dir"])
+    if has_intro_audio:
+        title_duration = line_timing(manifest, title_audio_path, duration_of)["duration"]
+        timeline["intro"] = {
+            "audio": title_audio_path,
+            "duration": title_duration + INTRO_PADDING,
+            "audio_duration": title_duration,
+            "voice": asset_voice(assets, INTRO_AUDIO_KEY),
+            "dep": assets.get(INTRO_AUDIO_KEY, {}).get("hash"),
+            "deps": asset_deps(assets, INTRO_AUDIO_KEY),
+        }
+
+    # 2. 본문 장면
+    for scene in story_data.get('scenes', []):
+        scene_num = scene['scene_num']
+        img_path = find_scene_image(assets, paths["story_dir"], image_dir, scene_num)
+        if not img_path:
+            print(f"    ⚠️ 이미지 없음: S{scene_num:02d}.png")
+            continue
+
+        lines, subtitles = [], []
+        deps = asset_deps(assets, image_key(scene_num))
+        current_time = 0.0
+        for idx, script in enumerate(scene['scripts']):
+            audio_path = find_line_audio(assets, paths["story_dir"], scene_num, idx)
+            if not audio_path:
+                print(f"    ⚠️ 음성 없음: S{scene_num:02d}_{idx:03d} (TTS 단계를 먼저 실행하세요)")
+                continue
+            deps.extend(asset_deps(assets, line_key(scene_num, idx)))
+            try:
+                timing = line_timing(manifest, audio_path, duration_of)
+            except Exception as e:
+                print(f"    ❌ 오디오 길이 확인 에러: {e}")
+                continue
+            line_duration = timing["duration"]
+
+            lines.append({
+                "audio": audio_path, "start": current_time, "duration": line_duration,
+                "voice": asset_voice(assets, line_key(scene_num, idx)),
+                "dep": assets.get(line_key(scene_num, idx), {}).get("hash"),
+            })
+            chunk_start = current_time
+            chunks = split_subtitle_chunks_from_words(
+                script['text'], timing.get("words"), line_duration, MAX_CHARS_PER_SCREEN)
+            for chunk in chunks:
+                subtitles.append({"text": chunk['text'], "start": chunk_start, "duration": chunk['duration'],
+                                  "line": len(lines) - 1})
+                chunk_start += chunk['duration']
+            current_time += line_duration
+
+        if not lines:
+            continue
+
+        timeline["scenes"].append({
+            "scene_num": scene_num,
+            "image": img_path,
+            "duration": current_time + SCENE_PADDING,
+            "lines": lines,
+            "subtitles": subtitles,
+            "deps": deps,
+        })
+
+    if assemble_audio and timeline["scenes"]:
+        from audio_assembly import story_audio
+        story_audio(timeline)
+    return timeline
+
+
+def render_inputs(timeline, **settings):
+    """
+    렌더링 결과를 결정하는 입력 (자산 매니페스트의 입력 해시용)
+    파일 경로 대신 자산 해시(deps)와 시간표/자막, 영상 디자인 설정을 씀 -> 출력 폴더를 옮겨도 같은 값
+    """
+    def segment(seg):
+        return {
+            "scene_num": seg.get("scene_num"),
+            "duration": round(seg["duration"], 4),
+            "lines": [(round(l["start"], 4), round(l["duration"], 4)) for l in seg.get("lines", [])],
+            "subtitles": seg.get("subtitles", []),
+            "deps": seg.get("deps", []),
+            "gains": seg.get("gains"),  # 조립된 트랙을 쓰면 구간에 나오는 보이스의 음량 보정값 (트랙 위치는 제외)
+        }
+
+    design = {
+        "size": VIDEO_SIZE, "fps": VIDEO_FPS, "font": os.path.basename(FONT_PATH),
+        "subtitle": (SUBTITLE_FONT_SIZE, SUBTITLE_COLOR, SUBTITLE_BG_COLOR, MAX_CHARS_PER_SCREEN),
+        "title": TITLE_FONT_SIZE, "fade": (INTRO_FADE_IN, SCENE_FADE_IN), "padding": (INTRO_PADDING, SCENE_PADDING),
+    }
+    return {
+        "title": timeline["title"],
+        "intro": segment(timeline["intro"]) if timeline["intro"] else None,
+        "scenes": [segment(scene) for scene in timeline["scenes"]],
+        "audio": timeline.get("audio_settings"),
+        "design": design,
+        "settings": settings,
+    }